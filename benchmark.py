@@ -0,0 +1,376 @@
+ #!/usr/bin/python
+ # -*- coding: utf-8 -*-
+ 
+##### Authorship ##############################
+###############################################
+# @name	The X-mu Python Library: benchmarks
+# @author	Daniel Lewis
+# @email	daniel@vanirsystems.com
+# @website	http://vanirsystems.com/
+# @version	alpha-4
+# @license	Apache License, Version 2.0
+""" Copyright 2014 Daniel Lewis
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+###############################################
+
+##### Requirements ############################
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import traceback
+###############################################
+
+# Usage:
+#	python benchmark.py                          run every group, print a table
+#	python benchmark.py --quick --output a.json  smaller sizes, save the results
+#	python benchmark.py --compare a.json         compare against saved results
+#	python benchmark.py --groups import --max-numeric-import 0.5
+#
+# Each case runs in a fresh worker process (forked once the libraries are
+# imported), so cases do not share caches, compiled kernels or memory. A case
+# is timed once cold (first) and then `repeat` more times (best, median).
+# Peak memory is the growth of the worker's maximum resident set size while
+# the case is built and run.
+
+UNIVERSE = (1.0, 10.0)
+
+SHAPES = [
+	("UpwardGradientXmu", (6.0, 8.0)),
+	("DownwardGradientXmu", (3.0, 5.0)),
+	("TriangularXmu", (2.0, 4.0, 6.0)),
+	("TrapezoidalXmu", (3.0, 4.0, 6.0, 8.0)),
+]
+
+ARITHMETIC_OPERATIONS = ["+", "-", "*", "/", "**"]
+
+GRANULARITIES = [100, 1000, 10000]
+
+##### Import Times ############################
+# Each import is timed in a fresh interpreter, so earlier imports (and the
+# interpreter's own module cache) do not hide the cost being measured.
+IMPORT_SCRIPT = """
+import sys, time
+start = time.time()
+import %s
+print("%%r %%r" %% (time.time() - start, "sympy" in sys.modules))
+"""
+
+def time_import(module, repeat=5):
+	""" Times importing a module in fresh interpreters.
+	@param	module	the module name, e.g. "xmu_numeric"
+	@param	repeat	the number of interpreters to start
+	@return	a result dict (see run_case), with whether SymPy was loaded by the import """
+	times = []
+	loads_sympy = False
+	for i in range(repeat):
+		output = subprocess.check_output([sys.executable, "-c", IMPORT_SCRIPT % module], cwd=os.path.dirname(os.path.abspath(__file__)))
+		seconds, sympy_loaded = output.split()
+		times.append(float(seconds))
+		loads_sympy = loads_sympy or sympy_loaded == "True"
+	result = summarise("import", module, {}, times[0], sorted(times), None)
+	result["loads_sympy"] = loads_sympy
+	return result
+
+def import_benchmark(repeat=5, max_numeric=None):
+	""" Compares the import time of the numeric-only entry point (xmu_numeric) with the full library (xmu), and checks that the numeric entry point does not load SymPy.
+	@param	repeat	the number of interpreters to start per module
+	@param	max_numeric	the largest acceptable best import time of xmu_numeric in seconds, or None
+	@return	a tuple of (results, failures), where results is a list of result dicts, and failures a list of strings """
+	results = [time_import("xmu_numeric", repeat), time_import("xmu", repeat)]
+	failures = []
+	if results[0]["loads_sympy"]:
+		failures.append("importing xmu_numeric loaded SymPy")
+	if max_numeric is not None and results[0]["best"] > max_numeric:
+		failures.append("importing xmu_numeric took %.3fs, more than %.3fs" % (results[0]["best"], max_numeric))
+	return results, failures
+
+##### Cases ###################################
+# A case function takes its parameters, does any setup, and returns a
+# function taking no parameters which runs the code being measured.
+
+def build_shapes():
+	""" @return	a list of one instance of each standard shape, over UNIVERSE """
+	import xmu
+	u = xmu.Interval(*UNIVERSE)
+	return [getattr(xmu, name)(u, *parameters) for name, parameters in SHAPES]
+
+def construction_case(shape, count):
+	""" Builds count instances of a shape. """
+	import xmu
+	u = xmu.Interval(*UNIVERSE)
+	cls = getattr(xmu, shape)
+	parameters = dict(SHAPES)[shape]
+	def run():
+		for i in range(count):
+			cls(u, *parameters)
+	return run
+
+def set_chain_case(depth, symbolic):
+	""" Chains depth set operations (cycling through unionX, intersectX and differenceX) and takes a cut of the result, optionally building the SymPy X-mu function too. """
+	shapes = build_shapes()
+	operations = ["unionX", "intersectX", "differenceX"]
+	def run():
+		result = shapes[0]
+		for i in range(depth):
+			result = getattr(result, operations[i % 3])(shapes[(i + 1) % len(shapes)])
+		result.alphaCut(0.5)
+		if symbolic:
+			result.get_xequals()
+	return run
+
+def arithmetic_case(operation, levels):
+	""" Runs arithmeticalOperationX at a number of alphas. """
+	a, b = build_shapes()[2:]
+	alphas = [float(i) / max(levels - 1, 1) for i in range(levels)]
+	def run():
+		for alpha in alphas:
+			a.arithmeticalOperationX(b, alpha, operation)
+	return run
+
+def fuzzy_arithmetic_case(operation, levels):
+	""" Runs fuzzyArithmeticX over the whole alpha range. """
+	import numpy
+	a, b = build_shapes()[2:]
+	alphas = numpy.linspace(0.0, 1.0, levels)
+	def run():
+		a.fuzzyArithmeticX(b, operation, alphas).alphaCut(0.5)
+	return run
+
+def implication_case(points, vectorized):
+	""" Evaluates the Lukasiewicz implication at a number of points, one at a time with implicationAtX or at once with implication. """
+	import numpy
+	a, b = build_shapes()[2:]
+	X = numpy.linspace(UNIVERSE[0], UNIVERSE[1], points)
+	def run():
+		if vectorized:
+			a.implication(b, X)
+		else:
+			for x in X:
+				a.implicationAtX(b, float(x))
+	return run
+
+def graph_case(method, granularity, exact=False):
+	""" Adds a plot to a Graph (without showing it), using the Agg backend. """
+	import matplotlib
+	matplotlib.use("Agg")
+	import xmu
+	shapes = build_shapes()
+	u = xmu.Interval(*UNIVERSE)
+	union = shapes[1].unionX(shapes[0])
+	def run():
+		graph = xmu.Graph(granularity, u, exact)
+		if method == "add_plot":
+			graph.add_plot(union, "union", colour="b")
+		else:
+			graph.add_arithmetic_plot(shapes[2], shapes[3], "addX", "sum", colour="b")
+		graph.plt.close("all")
+	return run
+
+def build_cases(quick=False):
+	""" Lists the benchmark cases.
+	@param	quick	use smaller sizes, for a fast check
+	@return	a list of (group, name, case function, parameters) tuples """
+	count = 20 if quick else 100
+	levels = 11 if quick else 101
+	depths = [1, 4] if quick else [1, 4, 16]
+	granularities = GRANULARITIES[:2] if quick else GRANULARITIES
+	cases = []
+	for shape, parameters in SHAPES:
+		cases.append(("construction", shape, construction_case, {"shape": shape, "count": count}))
+	for depth in depths:
+		cases.append(("setops", "chain-%d" % depth, set_chain_case, {"depth": depth, "symbolic": False}))
+		cases.append(("setops", "chain-%d-sympy" % depth, set_chain_case, {"depth": depth, "symbolic": True}))
+	for operation in ARITHMETIC_OPERATIONS:
+		cases.append(("arithmetic", "alpha " + operation, arithmetic_case, {"operation": operation, "levels": levels}))
+		cases.append(("arithmetic", "whole " + operation, fuzzy_arithmetic_case, {"operation": operation, "levels": levels}))
+	cases.append(("implication", "implicationAtX", implication_case, {"points": levels * 10, "vectorized": False}))
+	cases.append(("implication", "implication", implication_case, {"points": levels * 10, "vectorized": True}))
+	for granularity in granularities:
+		cases.append(("plotting", "add_plot-%d" % granularity, graph_case, {"method": "add_plot", "granularity": granularity}))
+		cases.append(("plotting", "add_arithmetic_plot-%d" % granularity, graph_case, {"method": "add_arithmetic_plot", "granularity": granularity}))
+		cases.append(("plotting", "add_plot-exact-%d" % granularity, graph_case, {"method": "add_plot", "granularity": granularity, "exact": True}))
+		cases.append(("plotting", "add_arithmetic_plot-exact-%d" % granularity, graph_case, {"method": "add_arithmetic_plot", "granularity": granularity, "exact": True}))
+	return cases
+
+##### Running #################################
+
+def peak_memory():
+	""" @return	the maximum resident set size of this process so far, in kilobytes """
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	return peak // 1024 if sys.platform == "darwin" else peak
+
+def summarise(group, name, parameters, first, times, memory):
+	""" Builds a result dict from a list of sorted timings. Primarily used as a private method.
+	@return	a result dict (see run_case) """
+	return {
+		"group": group,
+		"name": name,
+		"parameters": parameters,
+		"first": first,
+		"best": times[0],
+		"median": times[len(times) // 2],
+		"mean": sum(times) / len(times),
+		"runs": len(times),
+		"peak_memory_kb": memory,
+	}
+
+def run_case(case, repeat):
+	""" Runs one benchmark case in this process. Used in a fresh worker process by run_cases.
+	@param	case	a (group, name, case function, parameters) tuple
+	@param	repeat	the number of timed runs after the first
+	@return	a dict of group, name, parameters, first (seconds for the first run), best, median and mean (seconds, over the other runs), runs and peak_memory_kb """
+	group, name, function, parameters = case
+	before = peak_memory()
+	run = function(**parameters)
+	start = time.time()
+	run()
+	first = time.time() - start
+	times = []
+	for i in range(repeat):
+		start = time.time()
+		run()
+		times.append(time.time() - start)
+	times.sort()
+	return summarise(group, name, parameters, first, times or [first], peak_memory() - before)
+
+def run_case_task(task):
+	""" Runs a (case, repeat) task in a worker process. A case which raises is reported with its traceback, rather than stopping the suite.
+	@return	a result dict, or a dict of group, name, parameters and error """
+	case, repeat = task
+	try:
+		return run_case(case, repeat)
+	except Exception:
+		return {"group": case[0], "name": case[1], "parameters": case[3], "error": traceback.format_exc()}
+
+def run_cases(cases, repeat, report=None):
+	""" Runs benchmark cases, each in a fresh worker process.
+	@param	cases	a list from build_cases
+	@param	repeat	the number of timed runs per case, after the first
+	@param	report	a function called with each result as it completes, or None
+	@return	a list of result dicts """
+	import xmu # imported before the workers are forked, so they start with it loaded
+	results = []
+	for case in cases:
+		pool = multiprocessing.Pool(1, maxtasksperchild=1)
+		try:
+			result = pool.apply(run_case_task, ((case, repeat),))
+		finally:
+			pool.close()
+			pool.join()
+		results.append(result)
+		if report is not None:
+			report(result)
+	return results
+
+def environment():
+	""" @return	a dict describing the interpreter, library versions and machine, stored with the results """
+	import numpy
+	import sympy
+	try:
+		import matplotlib
+		matplotlib_version = matplotlib.__version__
+	except ImportError:
+		matplotlib_version = None
+	try:
+		revision = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)), stderr=open(os.devnull, "w")).strip()
+	except (OSError, subprocess.CalledProcessError):
+		revision = None
+	return {
+		"time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+		"revision": revision,
+		"python": platform.python_version(),
+		"numpy": numpy.__version__,
+		"sympy": sympy.__version__,
+		"matplotlib": matplotlib_version,
+		"platform": platform.platform(),
+		"cpus": multiprocessing.cpu_count(),
+	}
+
+def compare(results, baseline, tolerance):
+	""" Compares results against a baseline run, by median time.
+	@param	results	a list of result dicts
+	@param	baseline	a list of result dicts from an earlier run
+	@param	tolerance	the ratio of medians above which a case counts as slower
+	@return	a list of (result, baseline median, ratio) tuples for the cases found in both runs, and a list of the names of slower cases """
+	previous = dict(((r["group"], r["name"]), r) for r in baseline)
+	rows = []
+	slower = []
+	for result in results:
+		old = previous.get((result["group"], result["name"]))
+		if old is None or "error" in result or "error" in old or old["median"] <= 0:
+			continue
+		ratio = result["median"] / old["median"]
+		rows.append((result, old["median"], ratio))
+		if ratio > tolerance:
+			slower.append("%s/%s" % (result["group"], result["name"]))
+	return rows, slower
+
+def format_result(result):
+	""" @return	a result as one line of the report table """
+	if "error" in result:
+		return "%-12s %-32s error: %s" % (result["group"], result["name"], result["error"].strip().splitlines()[-1])
+	memory = "" if result["peak_memory_kb"] is None else "%8d kB" % result["peak_memory_kb"]
+	return "%-12s %-32s first %9.4fs  best %9.4fs  median %9.4fs %s" % (result["group"], result["name"], result["first"], result["best"], result["median"], memory)
+
+def print_result(result):
+	""" Prints a result as it completes. """
+	print format_result(result)
+	sys.stdout.flush()
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Benchmarks for the X-mu library.")
+	parser.add_argument("--groups", default=None, help="comma-separated groups to run: import, construction, setops, arithmetic, implication, plotting (default: all)")
+	parser.add_argument("--repeat", type=int, default=3, help="timed runs per case, after the first")
+	parser.add_argument("--quick", action="store_true", help="use smaller sizes")
+	parser.add_argument("--list", action="store_true", help="list the cases and exit")
+	parser.add_argument("--output", default=None, help="write the results to this JSON file")
+	parser.add_argument("--compare", default=None, help="compare against the results in this JSON file")
+	parser.add_argument("--tolerance", type=float, default=1.25, help="with --compare, fail if a median is this many times slower")
+	parser.add_argument("--max-numeric-import", type=float, default=None, help="fail if importing xmu_numeric takes longer than this many seconds")
+	args = parser.parse_args()
+	
+	groups = None if args.groups is None else set(args.groups.split(","))
+	cases = [case for case in build_cases(args.quick) if groups is None or case[0] in groups]
+	if args.list:
+		for case in cases:
+			print "%-12s %s" % (case[0], case[1])
+		sys.exit(0)
+	
+	results = []
+	failures = []
+	if groups is None or "import" in groups:
+		imports, failures = import_benchmark(max(args.repeat, 1), args.max_numeric_import)
+		for result in imports:
+			print format_result(result) + "  loads sympy: %s" % result["loads_sympy"]
+		results.extend(imports)
+	results.extend(run_cases(cases, args.repeat, print_result))
+	
+	if args.output is not None:
+		with open(args.output, "w") as output:
+			json.dump({"environment": environment(), "results": results}, output, indent=1, sort_keys=True)
+	if args.compare is not None:
+		with open(args.compare) as baseline:
+			rows, slower = compare(results, json.load(baseline)["results"], args.tolerance)
+		for result, median, ratio in rows:
+			print "%-12s %-32s %9.4fs -> %9.4fs  x%.2f" % (result["group"], result["name"], median, result["median"], ratio)
+		failures.extend("slower than %s: %s" % (args.compare, name) for name in slower)
+	for failure in failures:
+		print "FAIL: " + failure
+	sys.exit(1 if failures else 0)
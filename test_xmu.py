@@ -0,0 +1,1027 @@
+ #!/usr/bin/python
+ # -*- coding: utf-8 -*-
+
+##### About ###################################
+# Tests of the X-mu library, one section per feature. Where a feature has a
+# numeric path, it is checked against the eager SymPy path.
+# Run with: python -m pytest test_xmu.py
+###############################################
+
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import warnings
+from fractions import Fraction
+import numpy
+import pytest
+from multiprocessing.pool import ThreadPool
+from sympy import Abs, Basic, EmptySet, Interval, Union, FiniteSet, Piecewise, Not, Or, cos, exp, gamma, lambdify, log, pi, sin, sqrt, symbols
+from xmu import ALPHA, Xmu, BasicXmu, UpwardGradientXmu, DownwardGradientXmu, TrapezoidalXmu, TriangularXmu, LinguisticVariable, RuleBase, XmuInstrumentation, defuzzify, draw_linear_xmu, evaluate_parallel, evaluate_threaded, instrumented_classes, linear_form, render_xmu_images
+from xmu_numeric import IMPLICATIONS, INTERVAL_OPERATIONS, LinearXmuFunction, CompiledXmu, FuzzySetBank, MuInversion, NumericUpwardGradientXmu, NumericDownwardGradientXmu, NumericTrapezoidalXmu, NumericTriangularXmu, DiscreteXmu, StreamingFitter, StreamingHistogram, XmuStore, dump_xmu, load_xmu, extension_cuts, extension_principle, interval_expression, interval_operation, monotone_directions
+
+U = Interval(0.0, 10.0)
+ALPHAS = [0.1, 0.35, 0.6, 0.85]
+OPERATIONS = ["union", "intersect", "difference"]
+
+def shapes():
+	""" @return	a dict of the standard shapes over U, by name """
+	return {
+		"small": DownwardGradientXmu(U, 2.0, 4.0),
+		"large": UpwardGradientXmu(U, 6.0, 8.0),
+		"medium": TrapezoidalXmu(U, 2.0, 4.0, 6.0, 8.0),
+		"triangle": TriangularXmu(U, 1.0, 5.0, 9.0),
+	}
+
+PAIRS = [("small", "large"), ("medium", "triangle"), ("triangle", "small"), ("large", "medium")]
+
+def sympy_cut(expr, alpha):
+	""" Evaluates a sympy X-mu function at an alpha, the way the eager SymPy path does.
+	@return	a sorted list of (inf, sup) tuples, without single points """
+	value = expr.subs(ALPHA, alpha)
+	if value.is_EmptySet:
+		return []
+	parts = value.args if isinstance(value, Union) else [value]
+	cut = []
+	for part in parts:
+		if isinstance(part, FiniteSet):
+			continue
+		cut.append((float(part.inf), float(part.sup)))
+	return sorted(cut)
+
+def sympy_operation(first, second, operation):
+	""" The eager SymPy reference: the set operation on the shapes' own sympy X-mu functions. """
+	a, b = first.get_xequals(), second.get_xequals()
+	return {"union": a.union, "intersect": a.intersect, "difference": a.__sub__}[operation](b)
+
+def assert_cuts_equal(actual, expected):
+	assert len(actual) == len(expected), (actual, expected)
+	if len(expected) > 0:
+		assert numpy.allclose(actual, expected), (actual, expected)
+
+##### Set operations ##########################
+
+@pytest.mark.parametrize("operation", OPERATIONS)
+@pytest.mark.parametrize("pair", PAIRS)
+def test_set_operations_match_sympy(pair, operation):
+	xmus = shapes()
+	first, second = xmus[pair[0]], xmus[pair[1]]
+	expected = sympy_operation(first, second, operation)
+	eager = first.setOperationX(second, operation)
+	for alpha in ALPHAS:
+		reference = sympy_cut(expected, alpha)
+		assert_cuts_equal(eager.alphaCut(alpha), reference)
+		assert_cuts_equal(sympy_cut(eager.get_xequals(), alpha), reference)
+
+def test_linear_set_operations_split_where_endpoints_cross():
+	# the intervals overlap up to alpha = 0.5, where 3 - 2*alpha meets 1 + 2*alpha
+	first = LinearXmuFunction.from_interval((0.0, 0.0), (-2.0, 3.0))
+	second = LinearXmuFunction.from_interval((2.0, 1.0), (0.0, 5.0))
+	union = first.union(second)
+	assert union == LinearXmuFunction([0.0, 0.5, 1.0], [((0.0, 0.0, 0.0, 5.0),), ((0.0, 0.0, -2.0, 3.0), (2.0, 1.0, 0.0, 5.0))])
+	assert first.intersect(second) == LinearXmuFunction([0.0, 0.5, 1.0], [((2.0, 1.0, -2.0, 3.0),), ()])
+	assert first.difference(second) == LinearXmuFunction([0.0, 0.5, 1.0], [((0.0, 0.0, 2.0, 1.0),), ((0.0, 0.0, -2.0, 3.0),)])
+	assert union.cut(0.75) == [(0.0, 1.5), (2.5, 5.0)]
+
+##### Batch membership ########################
+
+@pytest.mark.parametrize("name", ["small", "large", "medium", "triangle"])
+def test_mu_at_matches_sympy(name):
+	xmu = shapes()[name]
+	# past u at both ends, and through every point of every shape
+	X = numpy.concatenate([numpy.linspace(-2.0, 12.0, 57), [1.0, 2.0, 4.0, 5.0, 6.0, 8.0, 9.0]])
+	expected = [float(xmu.get_muequals().subs(Xmu.x, x)) for x in X]
+	assert numpy.allclose(xmu.mu_at(X), expected)
+	assert xmu.mu_at(X.reshape(8, 8)).shape == (8, 8)
+
+def test_mu_at_follows_changes_to_the_shape():
+	medium = TrapezoidalXmu(U, 2.0, 4.0, 6.0, 8.0)
+	assert medium.mu_at([3.0, 5.0, 7.0]).tolist() == [0.5, 1.0, 0.5]
+	medium.setAB(0.0, 1.0, 2.0, 3.0)
+	assert medium.mu_at([0.5, 2.5, 5.0]).tolist() == [0.5, 0.5, 0.0]
+	triangle = TriangularXmu(U, 1.0, 5.0, 9.0)
+	assert triangle.mu_at([3.0]).tolist() == [0.5]
+	triangle.setMuFunction(0.0, 1.0, 3.0)
+	assert triangle.mu_at([2.0]).tolist() == [0.5]
+
+def test_mu_at_of_a_custom_piecewise():
+	x = Xmu.x
+	xmu = BasicXmu(U)
+	xmu.set_muequals(Piecewise(
+		((x - 1.0)**2 / 4.0, (x >= 1.0) & (x < 3.0)),
+		(1.0, (x >= 3.0) & Not(x > 5.0)),
+		(exp(5.0 - x), Or(x > 5.0, x < -5.0)),
+		(0.0, True)
+	))
+	X = numpy.linspace(-7.0, 10.0, 69)
+	expected = [float(xmu.get_muequals().subs(x, value)) for value in X]
+	assert numpy.allclose(xmu.mu_at(X), expected)
+	xmu.set_muequals(Piecewise((0.5, x > 2.0), (0.0, True)))
+	assert xmu.mu_at([1.0, 3.0]).tolist() == [0.0, 0.5]
+
+@pytest.mark.parametrize("protocol", [0, 1, 2])
+def test_pickle_round_trips(protocol):
+	xmus = shapes()
+	xmus["union"] = xmus["medium"].unionX(xmus["small"])
+	X = numpy.linspace(-1.0, 11.0, 49)
+	for name, xmu in sorted(xmus.items()):
+		restored = pickle.loads(pickle.dumps(xmu, protocol))
+		assert restored.mu_at(X).tolist() == xmu.mu_at(X).tolist(), name
+		for alpha in ALPHAS:
+			assert restored.alphaCut(alpha) == xmu.alphaCut(alpha), name
+
+##### Arithmetic ##############################
+
+@pytest.mark.parametrize("operation", ["addX", "subX", "multiplyX"])
+def test_arithmetic_forms_agree(operation):
+	xmus = shapes()
+	result = getattr(xmus["medium"], operation)(xmus["triangle"])
+	for alpha in [0.005, 0.333, 0.5, 0.777]:
+		assert_cuts_equal(sympy_cut(result.get_xequals(), alpha), result.alphaCut(alpha))
+
+def test_linear_forms_round_trip_through_sympy():
+	xmus = shapes()
+	for result in [xmus["small"].unionX(xmus["large"]), xmus["medium"].subX(xmus["triangle"])]:
+		linear = result.get_linear_xequals()
+		assert LinearXmuFunction.from_sympy(linear.to_sympy()) == linear
+
+def test_arithmetic_matches_interval_arithmetic():
+	xmus = shapes()
+	total = xmus["medium"].addX(xmus["triangle"])
+	product = xmus["medium"].multiplyX(xmus["triangle"])
+	# dyadic alphas between the default samples, so the exact endpoints are exact floats too
+	alphas = [0.125, 0.375, 0.625, 0.875]
+	lows, highs = product.alphaCuts(numpy.array(alphas))
+	for i, alpha in enumerate(alphas):
+		(a, b), = xmus["medium"].alphaCut(alpha)
+		(c, d), = xmus["triangle"].alphaCut(alpha)
+		assert_cuts_equal(total.alphaCut(alpha), [(a + c, b + d)])
+		assert product.alphaCut(alpha) == [(a * c, b * d)]
+		assert (lows[0, i], highs[0, i]) == (a * c, b * d)
+		assert product.mu_at([a * c, b * d]).tolist() == [alpha, alpha]
+
+##### Interval arithmetic #####################
+
+def interval_pieces(operation, first, second):
+	""" @return	the pieces of first operation second, for one pair of intervals, without missing ones """
+	pieces = interval_operation(operation, first[0], first[1], second[0], second[1])
+	return [(float(lo), float(hi)) for lo, hi in pieces if not numpy.isnan(lo)]
+
+def assert_encloses(actual, expected):
+	""" Checks that each piece encloses the exact one, widened by at most one unit in the last place. """
+	assert len(actual) == len(expected), (actual, expected)
+	for (lo, hi), (exact_lo, exact_hi) in zip(actual, expected):
+		assert lo <= exact_lo and hi >= exact_hi, (actual, expected)
+		assert lo >= numpy.nextafter(float(exact_lo), -numpy.inf) and hi <= numpy.nextafter(float(exact_hi), numpy.inf), (actual, expected)
+
+def test_division_by_intervals_containing_zero():
+	inf = numpy.inf
+	assert_encloses(interval_pieces("/", (1.0, 2.0), (-1.0, 1.0)), [(-inf, -1.0), (1.0, inf)])
+	assert_encloses(interval_pieces("/", (-2.0, -1.0), (-1.0, 1.0)), [(-inf, -1.0), (1.0, inf)])
+	# half-open divisors give one unbounded piece
+	assert_encloses(interval_pieces("/", (1.0, 2.0), (0.0, 4.0)), [(0.25, inf)])
+	assert_encloses(interval_pieces("/", (1.0, 2.0), (-4.0, 0.0)), [(-inf, -0.25)])
+	assert_encloses(interval_pieces("/", (-2.0, -1.0), (0.0, 4.0)), [(-inf, -0.25)])
+	# a dividend containing zero gives the whole line, except for a divisor away from zero
+	assert interval_pieces("/", (-1.0, 2.0), (-1.0, 1.0)) == [(-inf, inf)]
+	assert interval_pieces("/", (0.0, 2.0), (0.0, 1.0)) == [(-inf, inf)]
+	assert_encloses(interval_pieces("/", (-1.0, 2.0), (2.0, 4.0)), [(-0.5, 1.0)])
+	assert interval_pieces("/", (1.0, 2.0), (0.0, 0.0)) == []
+	assert interval_pieces("/", (-1.0, 2.0), (0.0, 0.0)) == []
+
+def test_integer_powers_of_intervals_containing_zero():
+	inf = numpy.inf
+	square = interval_pieces("**", (-2.0, 3.0), (2.0, 2.0))
+	assert square[0][0] == 0.0
+	assert_encloses(square, [(0.0, 9.0)])
+	assert_encloses(interval_pieces("**", (-2.0, 3.0), (3.0, 3.0)), [(-8.0, 27.0)])
+	assert_encloses(interval_pieces("**", (-2.0, 3.0), (0.0, 0.0)), [(1.0, 1.0)])
+	assert interval_pieces("**", (-2.0, 3.0), (-1.0, -1.0)) == [(-inf, inf)]
+	assert_encloses(interval_pieces("**", (-2.0, 0.0), (-1.0, -1.0)), [(-inf, -0.5)])
+	assert_encloses(interval_pieces("**", (-2.0, 4.0), (-2.0, -2.0)), [(0.0625, inf)])
+	assert_encloses(interval_pieces("**", (-4.0, -2.0), (-1.0, -1.0)), [(-0.5, -0.25)])
+	assert_encloses(interval_pieces("**", (0.0, 2.0), (-1.0, -1.0)), [(0.5, inf)])
+
+def test_non_integer_powers_use_the_non_negative_base():
+	assert_encloses(interval_pieces("**", (-2.0, 4.0), (0.5, 0.5)), [(0.0, 2.0)])
+	assert_encloses(interval_pieces("**", (-1.0, 4.0), (0.5, 1.5)), [(0.0, 8.0)])
+	with pytest.raises(ValueError):
+		interval_pieces("**", (-4.0, -1.0), (0.5, 0.5))
+	u = Interval(-5.0, 10.0)
+	base = TrapezoidalXmu(u, -2.0, -1.0, 2.0, 3.0)
+	root = base.powX(BasicXmu(u, Interval(0.5, 0.5)))
+	for alpha in ALPHAS:
+		(lo, hi), = root.alphaCut(alpha)
+		assert lo == 0.0 and numpy.isclose(hi, numpy.sqrt(3.0 - alpha))
+	assert root.mu_at([1.0]).tolist() == [1.0]
+	cut = base.powX(BasicXmu(u, Interval(0.5, 0.5)), 0.5).get_xequals()
+	assert cut.inf == 0.0 and numpy.isclose(float(cut.sup), numpy.sqrt(2.5))
+
+@pytest.mark.parametrize("operation", ["+", "-", "*", "/", "**"])
+def test_interval_results_enclose_exact_values(operation):
+	values = [-2.7, -1.0 / 3.0, 0.1, 1.0 / 3.0, 0.7, 2.9]
+	exponents = [-3.0, -2.0, -1.0, 0.0, 1.0, 2.0, 3.0]
+	exact = {
+		"+": lambda a, b: a + b,
+		"-": lambda a, b: a - b,
+		"*": lambda a, b: a * b,
+		"/": lambda a, b: a / b,
+		"**": lambda a, b: a ** int(b),
+	}[operation]
+	for i, lo1 in enumerate(values):
+		for hi1 in values[i + 1:]:
+			if operation == "**":
+				seconds = [(n, n) for n in exponents]
+			else:
+				seconds = [(lo2, hi2) for j, lo2 in enumerate(values) for hi2 in values[j + 1:]]
+			for lo2, hi2 in seconds:
+				if (operation == "**" and lo2 < 0 and lo1 < 0.0 < hi1) or (operation == "/" and lo2 < 0.0 < hi2):
+					continue
+				# every function here is monotone in each argument over these intervals, so the extremes are at the corners,
+				# except for an even power of a base containing zero, whose minimum is at zero
+				corners = [exact(Fraction(a), Fraction(b)) for a in (lo1, hi1) for b in (lo2, hi2)]
+				if operation == "**" and lo1 < 0.0 < hi1 and lo2 > 0.0 and lo2 % 2.0 == 0.0:
+					corners.append(Fraction(0))
+				assert_encloses(interval_pieces(operation, (lo1, hi1), (lo2, hi2)), [(min(corners), max(corners))])
+
+def test_unknown_arithmetic_operation():
+	assert sorted(INTERVAL_OPERATIONS) == ["*", "**", "+", "-", "/"]
+	xmus = shapes()
+	with pytest.raises(ValueError):
+		xmus["medium"].arithmeticalOperationX(xmus["triangle"], 0.5, "__import__('os')")
+	with pytest.raises(ValueError):
+		xmus["medium"].fuzzyArithmeticX(xmus["triangle"], "//")
+	with pytest.raises(ValueError):
+		interval_operation("%", 1.0, 2.0, 3.0, 4.0)
+
+##### Memoisation #############################
+
+def test_cache_counts_hits_and_evicts_least_recently_used():
+	xmus = shapes()
+	cache = Xmu.enable_cache(maxsize=2)
+	try:
+		assert xmus["small"].alphaCut(0.5) == [(0.0, 3.0)]
+		assert cache.stats() == {"hits": 0, "misses": 1, "size": 1, "maxsize": 2}
+		assert xmus["small"].alphaCut(0.5) == [(0.0, 3.0)]
+		assert cache.stats()["hits"] == 1
+		first = xmus["small"].unionX(xmus["large"])
+		second = xmus["small"].unionX(xmus["large"])
+		assert second is not first
+		assert second.get_linear_xequals() == first.get_linear_xequals()
+		assert cache.stats() == {"hits": 2, "misses": 2, "size": 2, "maxsize": 2}
+		# the cut of small is now the least recently used entry, so it is evicted
+		xmus["large"].alphaCut(0.5)
+		assert len(cache) == 2
+		xmus["small"].alphaCut(0.5)
+		assert cache.stats()["misses"] == 4
+	finally:
+		Xmu.disable_cache()
+
+def test_cache_follows_changes_to_xmu_objects():
+	xmus = shapes()
+	Xmu.enable_cache()
+	try:
+		medium = TrapezoidalXmu(U, 2.0, 4.0, 6.0, 8.0)
+		assert medium.alphaCut(0.5) == [(3.0, 7.0)]
+		assert_cuts_equal(medium.unionX(xmus["large"]).alphaCut(0.5), [(3.0, 10.0)])
+		medium.setAB(1.0, 2.0, 3.0, 4.0)
+		assert medium.alphaCut(0.5) == [(1.5, 3.5)]
+		assert_cuts_equal(medium.unionX(xmus["large"]).alphaCut(0.5), [(1.5, 3.5), (7.0, 10.0)])
+		medium.set_xequals(Interval(0.0, 1.0))
+		assert medium.alphaCut(0.5) == [(0.0, 1.0)]
+		assert_cuts_equal(medium.unionX(xmus["large"]).alphaCut(0.5), [(0.0, 1.0), (7.0, 10.0)])
+	finally:
+		Xmu.disable_cache()
+
+##### Lazy operation graphs ###################
+
+@pytest.mark.parametrize("operation", OPERATIONS)
+@pytest.mark.parametrize("pair", PAIRS)
+def test_lazy_set_operations_match_sympy(pair, operation):
+	xmus = shapes()
+	first, second = xmus[pair[0]], xmus[pair[1]]
+	expected = sympy_operation(first, second, operation)
+	lazy = first.lazy().setOperationX(second, operation)
+	for alpha in ALPHAS:
+		assert_cuts_equal(lazy.alphaCut(alpha), sympy_cut(expected, alpha))
+
+def test_lazy_chain_matches_eager():
+	xmus = shapes()
+	eager = xmus["small"].unionX(xmus["large"]).differenceX(xmus["medium"]).intersectX(xmus["triangle"].negateX())
+	lazy = xmus["small"].lazy().unionX(xmus["large"]).differenceX(xmus["medium"]).intersectX(xmus["triangle"].negateX())
+	assert lazy.get_linear_xequals() == eager.get_linear_xequals()
+	for alpha in ALPHAS:
+		assert_cuts_equal(lazy.alphaCut(alpha), eager.alphaCut(alpha))
+	assert numpy.allclose(lazy.mu_at(numpy.linspace(0.0, 10.0, 41)), eager.mu_at(numpy.linspace(0.0, 10.0, 41)))
+
+def test_lazy_graph_follows_changes_to_operands():
+	xmus = shapes()
+	medium = TrapezoidalXmu(U, 2.0, 4.0, 6.0, 8.0)
+	lazy = medium.lazy().unionX(xmus["large"])
+	assert_cuts_equal(lazy.alphaCut(0.5), [(3.0, 10.0)])
+	medium.setAB(1.0, 2.0, 3.0, 4.0)
+	assert_cuts_equal(lazy.alphaCut(0.5), [(1.5, 3.5), (7.0, 10.0)])
+
+##### Linguistic variables ####################
+
+def variable_of_shapes():
+	""" @return	a LinguisticVariable of shapes(), with the terms in sorted order """
+	xmus = shapes()
+	return LinguisticVariable(U, [(name, xmus[name]) for name in sorted(xmus)])
+
+def test_terms_at_matches_every_term():
+	xmus = shapes()
+	variable = variable_of_shapes()
+	# the support endpoints and cores of every term, and the values in between
+	X = sorted(set(numpy.linspace(0.0, 10.0, 81).tolist() + [1.0, 2.0, 4.0, 5.0, 6.0, 8.0, 9.0]))
+	for x in X:
+		assert variable.terms_at(x) == [name for name in sorted(xmus) if xmus[name].mu_at(x) > 0.0], x
+		for alpha in [0.0, 0.5, 1.0]:
+			expected = [name for name in sorted(xmus) if any(lo <= x <= hi for lo, hi in xmus[name].alphaCut(alpha))]
+			assert variable.terms_at(x, alpha) == expected, (x, alpha)
+
+def test_terms_whose_cuts_are_not_nested():
+	# the cut at 0.0 of the difference is [0, 2], but it has nonzero membership on (2, 3) too
+	difference = DownwardGradientXmu(U, 2.0, 4.0).differenceX(TrapezoidalXmu(U, 2.0, 4.0, 6.0, 8.0))
+	assert difference.alphaCut(0.0) == [(0.0, 2.0)]
+	assert numpy.allclose(difference.mu_at([2.1, 2.9]), [0.95, 0.55])
+	narrow = TrapezoidalXmu(U, 1.0, 1.5, 2.0, 2.5)
+	# a quadratic product, which has no linear X-mu function
+	square = narrow.multiplyX(narrow)
+	assert square.get_linear_xequals() is None
+	variable = LinguisticVariable(U, [("difference", difference), ("square", square), ("large", UpwardGradientXmu(U, 6.0, 8.0))])
+	X = numpy.linspace(0.0, 10.0, 201)
+	expected = numpy.array([difference.mu_at(X), square.mu_at(X), variable["large"].mu_at(X)])
+	assert numpy.allclose(variable.memberships(X), expected)
+	assert numpy.array_equal(variable.terms_mask(X), expected > 0.0)
+	assert variable.terms_at(2.1) == ["difference", "square"]
+	assert variable.terms_at(2.9, 0.5) == ["difference", "square"]
+	assert variable.terms_at(2.9, 0.6) == ["square"]
+
+##### Streaming classification ################
+
+def test_stream_classifies_in_chunks():
+	variable = variable_of_shapes()
+	values = numpy.linspace(0.0, 10.0, 1001)
+	chunks = list(variable.stream(values, chunksize=300))
+	assert [chunk["start"] for chunk in chunks] == [0, 300, 600, 900]
+	assert [len(chunk["values"]) for chunk in chunks] == [300, 300, 300, 101]
+	for chunk in chunks:
+		assert chunk["names"] == sorted(shapes())
+		assert numpy.array_equal(chunk["values"], values[chunk["start"]:chunk["start"] + 300])
+		assert numpy.array_equal(chunk["memberships"], variable.memberships(chunk["values"]))
+	# an iterable of numeric strings (e.g. a csv column) gives the same chunks
+	masks = list(variable.stream(("%r" % value for value in values), chunksize=300, alpha=0.5))
+	assert [chunk["start"] for chunk in masks] == [0, 300, 600, 900]
+	for chunk, mask in zip(chunks, masks):
+		assert "memberships" not in mask
+		assert numpy.array_equal(mask["mask"], chunk["memberships"] >= 0.5)
+
+##### Implications ############################
+
+SCALAR_IMPLICATIONS = {
+	"lukasiewicz": lambda a, b: min(1.0 - a + b, 1.0),
+	"reichenbach": lambda a, b: 1.0 - a + a * b,
+	"kleenedienes": lambda a, b: max(1.0 - a, b),
+	"binary": lambda a, b: 1.0 if a <= b else 0.0,
+	"zadeh": lambda a, b: max(1.0 - a, min(a, b)),
+	"mamdani": lambda a, b: min(a, b),
+}
+
+@pytest.mark.parametrize("implication_type", sorted(IMPLICATIONS))
+def test_implication_matches_implication_at_x(implication_type):
+	xmus = shapes()
+	X = numpy.linspace(0.0, 10.0, 41)
+	Y = numpy.linspace(0.0, 10.0, 11)
+	batch = xmus["medium"].implication(xmus["triangle"], X, implication_type)
+	matrix = xmus["medium"].implicationMatrix(xmus["triangle"], X, Y, implication_type)
+	def mu(name, value):
+		return float(xmus[name].get_muequals().subs(Xmu.x, value))
+	for i, x in enumerate(X):
+		expected = SCALAR_IMPLICATIONS[implication_type](mu("medium", x), mu("triangle", x))
+		assert numpy.isclose(batch[i], expected)
+		assert numpy.isclose(xmus["medium"].implicationAtX(xmus["triangle"], x, implication_type), expected)
+		for j, y in enumerate(Y):
+			assert numpy.isclose(matrix[i, j], SCALAR_IMPLICATIONS[implication_type](mu("medium", x), mu("triangle", y)))
+
+def test_unknown_implication():
+	xmus = shapes()
+	assert xmus["small"].implicationAtX(xmus["large"], 5.0, "unknown") == 0.0
+	with pytest.raises(ValueError):
+		xmus["small"].implication(xmus["large"], [5.0], "unknown")
+
+##### Inference ###############################
+
+def test_mamdani_matches_sympy_memberships():
+	xmus = shapes()
+	variable = LinguisticVariable(U, [("small", xmus["small"]), ("medium", xmus["medium"]), ("large", xmus["large"])])
+	rules = RuleBase([("x", variable)], variable, resolution=51)
+	rules.add_rule({"x": "small"}, "large")
+	rules.add_rule({"x": "medium"}, "medium")
+	rules.add_rule({"x": "large"}, "small")
+	X = numpy.array([1.0, 3.3, 5.0, 6.9, 9.0])
+	grid = numpy.linspace(0.0, 10.0, 51)
+	def mu(name, value):
+		return float(xmus[name].get_muequals().subs(Xmu.x, value))
+	expected = []
+	for value in X:
+		aggregated = numpy.zeros(len(grid))
+		for antecedent, consequent in [("small", "large"), ("medium", "medium"), ("large", "small")]:
+			strength = mu(antecedent, value)
+			aggregated = numpy.maximum(aggregated, [min(strength, mu(consequent, y)) for y in grid])
+		expected.append(aggregated.dot(grid) / aggregated.sum())
+	assert numpy.allclose(rules.evaluate(X), expected)
+
+def test_tsk_matches_weighted_average():
+	xmus = shapes()
+	first = LinguisticVariable(U, [("small", xmus["small"]), ("large", xmus["large"])])
+	second = LinguisticVariable(U, [("medium", xmus["medium"]), ("triangle", xmus["triangle"])])
+	rules = RuleBase([("a", first), ("b", second)], kind="tsk", tnorm="product")
+	rules.add_rule({"a": "small", "b": "medium"}, (1.0, 2.0, -1.0))
+	rules.add_rule({"a": "large"}, (0.5, 0.0, 3.0), weight=0.5)
+	rules.add_rule({"b": "triangle"}, 4.0)
+	X = numpy.array([[1.0, 3.0], [3.0, 5.0], [7.0, 2.5], [9.0, 9.5], [5.0, 9.5]])
+	expected = []
+	for a, b in X:
+		strengths = [xmus["small"].mu_at(a) * xmus["medium"].mu_at(b), 0.5 * xmus["large"].mu_at(a), xmus["triangle"].mu_at(b)]
+		outputs = [1.0 + 2.0 * a - b, 0.5 + 3.0 * b, 4.0]
+		total = sum(strengths)
+		expected.append(sum(w * o for w, o in zip(strengths, outputs)) / total if total > 0.0 else numpy.nan)
+	assert numpy.allclose(rules.evaluate(X), expected, equal_nan=True)
+
+##### Parallel evaluation #####################
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_evaluate_parallel_keeps_order_and_reports_errors_per_task(processes):
+	xmus = shapes()
+	tasks = [
+		xmus["small"],
+		(xmus["small"], [("unionX", "not an Xmu")]),
+		(xmus["medium"], [("intersectX", xmus["triangle"]), ("negateX", None)]),
+		(xmus["large"], [("evaluate", None)]),
+		(xmus["small"], [("unionX", xmus["large"]), ("differenceX", xmus["medium"])]),
+	]
+	results = evaluate_parallel(tasks, alphas=ALPHAS, X=[1.0, 5.0, 9.0], processes=processes, chunksize=1)
+	assert [result["ok"] for result in results] == [True, False, True, False, True]
+	assert "AttributeError" in results[1]["error"]
+	assert "Operation not allowed" in results[3]["error"]
+	expected = [xmus["small"], None, xmus["medium"].intersectX(xmus["triangle"]).negateX(), None, xmus["small"].unionX(xmus["large"]).differenceX(xmus["medium"])]
+	for result, xmu in zip(results, expected):
+		if xmu is None:
+			continue
+		for cut, alpha in zip(result["cuts"], ALPHAS):
+			assert_cuts_equal(cut, xmu.alphaCut(alpha))
+		assert numpy.allclose(result["memberships"], xmu.mu_at([1.0, 5.0, 9.0]))
+
+##### Numeric entry point #####################
+
+NU = (0.0, 10.0)
+
+def numeric_shapes():
+	""" @return	the NumericXmu equivalents of shapes() """
+	return {
+		"small": NumericDownwardGradientXmu(NU, 2.0, 4.0),
+		"large": NumericUpwardGradientXmu(NU, 6.0, 8.0),
+		"medium": NumericTrapezoidalXmu(NU, 2.0, 4.0, 6.0, 8.0),
+		"triangle": NumericTriangularXmu(NU, 1.0, 5.0, 9.0),
+	}
+
+@pytest.mark.parametrize("operation", OPERATIONS)
+@pytest.mark.parametrize("pair", PAIRS)
+def test_numeric_set_operations_match_sympy(pair, operation):
+	xmus = shapes()
+	numerics = numeric_shapes()
+	expected = sympy_operation(xmus[pair[0]], xmus[pair[1]], operation)
+	numeric = numerics[pair[0]].setOperationX(numerics[pair[1]], operation)
+	for alpha in ALPHAS:
+		assert_cuts_equal(numeric.alphaCut(alpha), sympy_cut(expected, alpha))
+
+@pytest.mark.parametrize("name", sorted(shapes()))
+def test_numeric_negate_matches_sympy(name):
+	negation = numeric_shapes()[name].negateX()
+	expected = U - shapes()[name].get_xequals()
+	for alpha in ALPHAS:
+		assert_cuts_equal(negation.alphaCut(alpha), sympy_cut(expected, alpha))
+
+def test_numeric_module_does_not_import_sympy():
+	code = "; ".join([
+		"import sys, xmu_numeric",
+		"medium = xmu_numeric.NumericTrapezoidalXmu((0.0, 10.0), 2.0, 4.0, 6.0, 8.0)",
+		"large = xmu_numeric.NumericUpwardGradientXmu((0.0, 10.0), 6.0, 8.0)",
+		"assert medium.alphaCut(0.5) == [(3.0, 7.0)]",
+		"assert medium.unionX(large).mu_at([5.0, 9.0]).tolist() == [1.0, 1.0]",
+		"assert not any(m.startswith('sympy') for m in sys.modules), sorted(sys.modules)",
+	])
+	subprocess.check_call([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)))
+
+##### Fuzzy set banks ##########################
+
+def bank_cuts(lows, highs, i, j):
+	""" @return	the intervals of set i at alpha j from banked cuts of shape (k, N, n), without missing ones """
+	return [(lo[i, j], hi[i, j]) for lo, hi in zip(lows, highs) if not numpy.isnan(lo[i, j])]
+
+def test_bank_matches_xmu_objects():
+	xmus = shapes()
+	names = sorted(xmus)
+	bank = FuzzySetBank.from_shapes(NU, [xmus[name] for name in names] + [numeric_shapes()["medium"]])
+	names.append("medium")
+	assert len(bank) == 5
+	assert bank[4].to_payload() == xmus["medium"].to_payload()
+	X = numpy.linspace(0.0, 10.0, 101)
+	assert numpy.allclose(bank.mu_at(X), [xmus[name].mu_at(X) for name in names])
+	lows, highs = bank.alphaCuts(numpy.array(ALPHAS))
+	for i, name in enumerate(names):
+		for j, alpha in enumerate(ALPHAS):
+			assert_cuts_equal([(lows[i, j], highs[i, j])], xmus[name].alphaCut(alpha))
+
+def test_bank_pairwise_operations_match_xmu_objects():
+	xmus = shapes()
+	names = sorted(xmus)
+	bank = FuzzySetBank.from_shapes(NU, [xmus[name] for name in names])
+	# every set paired with every set
+	first = bank.take(numpy.repeat(numpy.arange(4), 4))
+	second = bank.take(numpy.tile(numpy.arange(4), 4))
+	pairs = [(names[i], names[j]) for i in range(4) for j in range(4)]
+	X = numpy.linspace(0.0, 10.0, 101)
+	union_lows, union_highs = first.unionCuts(second, numpy.array(ALPHAS))
+	intersect_lows, intersect_highs = first.intersectCuts(second, numpy.array(ALPHAS))
+	union_mu = first.union_mu_at(second, X)
+	intersect_mu = first.intersect_mu_at(second, X)
+	for k, (a, b) in enumerate(pairs):
+		union = xmus[a].unionX(xmus[b])
+		intersection = xmus[a].intersectX(xmus[b])
+		assert numpy.allclose(union_mu[k], numpy.maximum(xmus[a].mu_at(X), xmus[b].mu_at(X)))
+		assert numpy.allclose(intersect_mu[k], numpy.minimum(xmus[a].mu_at(X), xmus[b].mu_at(X)))
+		for j, alpha in enumerate(ALPHAS):
+			assert_cuts_equal(bank_cuts(union_lows, union_highs, k, j), union.alphaCut(alpha))
+			assert_cuts_equal(bank_cuts(intersect_lows[numpy.newaxis], intersect_highs[numpy.newaxis], k, j), intersection.alphaCut(alpha))
+
+@pytest.mark.parametrize("protocol", [0, 1, 2])
+def test_slotted_objects_pickle_with_every_protocol(protocol):
+	xmus = shapes()
+	linear = xmus["medium"].unionX(xmus["small"]).get_linear_xequals()
+	assert pickle.loads(pickle.dumps(linear, protocol)) == linear
+	restored = pickle.loads(pickle.dumps(xmus["triangle"], protocol))
+	assert restored.parameters == (1.0, 5.0, 9.0)
+	assert restored.get_linear_xequals() == xmus["triangle"].get_linear_xequals()
+
+##### Instrumentation ##########################
+
+def test_instrumentation_counts_calls_and_restores_classes():
+	xmus = shapes()
+	numerics = numeric_shapes()
+	classes = instrumented_classes() + [LinearXmuFunction, Basic]
+	before = dict((cls, dict(cls.__dict__)) for cls in classes)
+	with XmuInstrumentation(sympy=True) as profile:
+		union = xmus["small"].unionX(xmus["large"])
+		xmus["small"].unionX(xmus["large"]).get_xequals()
+		numerics["small"].unionX(numerics["large"])
+		xmus["medium"].multiplyX(xmus["triangle"]).alphaCut(0.5)
+		with XmuInstrumentation() as inner:
+			evaluate_parallel([union, xmus["medium"]], alphas=[0.5], processes=1)
+			xmus["medium"].subX(xmus["triangle"])
+		assert not inner.is_active()
+	assert not profile.is_active()
+	assert profile.stats("Xmu.unionX")["calls"] == 2
+	assert profile.stats("Xmu.setOperationX")["calls"] == 2
+	assert profile.stats("NumericXmu.unionX")["calls"] == 1
+	assert profile.stats("Xmu.multiplyX")["calls"] == 1
+	assert profile.stats("Basic.subs")["calls"] >= 1
+	assert profile.stats("Xmu.get_xequals")["max_nodes"] > 1
+	assert profile.stats("evaluate_parallel")["calls"] == 1
+	assert profile.stats("Xmu.subX")["calls"] == 1
+	assert inner.stats("evaluate_parallel")["calls"] == 1
+	assert inner.stats("Xmu.unionX") is None
+	assert [row["name"] for row in profile.query("*.unionX", order="calls")] == ["Xmu.unionX", "NumericXmu.unionX"]
+	# every method is put back, and nothing more is recorded
+	for cls in classes:
+		assert dict(cls.__dict__) == before[cls], cls
+	xmus["small"].unionX(xmus["large"])
+	evaluate_parallel([union], processes=1)
+	assert profile.stats("Xmu.unionX")["calls"] == 2
+	assert profile.stats("evaluate_parallel")["calls"] == 1
+
+##### Rendering ###############################
+
+def test_render_xmu_images_with_agg():
+	xmus = shapes()
+	union = xmus["small"].unionX(xmus["large"])
+	plots = [union, xmus["medium"].multiplyX(xmus["triangle"]), Interval(2.0 + ALPHA, 8.0 - ALPHA)]
+	directory = tempfile.mkdtemp()
+	try:
+		filenames = [os.path.join(directory, name) for name in ("union.png", "product.svg", "interval.pdf")]
+		assert render_xmu_images(plots, filenames, U, titles=["union", "product", None], granularity=20) == filenames
+		with open(filenames[0], "rb") as image:
+			assert image.read(8) == b"\x89PNG\r\n\x1a\n"
+		with open(filenames[1], "rb") as image:
+			assert b"<svg" in image.read()
+		with open(filenames[2], "rb") as image:
+			assert image.read(5) == b"%PDF-"
+	finally:
+		for name in os.listdir(directory):
+			os.remove(os.path.join(directory, name))
+		os.rmdir(directory)
+
+def test_exact_drawing_has_one_polygon_per_interval():
+	from matplotlib.figure import Figure
+	xmus = shapes()
+	union = xmus["small"].unionX(xmus["large"])
+	linear = union.get_linear_xequals()
+	collection = draw_linear_xmu(Figure().add_subplot(111), linear_form(union, U, None), U, "union", "b")
+	assert len(collection.get_paths()) == sum(len(intervals) for intervals in linear.pieces)
+	# the outline of each interval follows its endpoints exactly
+	for polygon in linear.polygons(0.0, 10.0):
+		for alpha, x in polygon:
+			assert any(numpy.isclose(x, lo) or numpy.isclose(x, hi) for lo, hi in union.alphaCut(alpha))
+
+##### Serialization ###########################
+
+def serialized_cases():
+	xmus = shapes()
+	return list(xmus.values()) + [xmus["small"].unionX(xmus["large"]).differenceX(xmus["medium"]), numeric_shapes()["triangle"].negateX()]
+
+@pytest.mark.parametrize("format", ["binary", "json"])
+def test_dump_load_round_trips(format):
+	for xmu in serialized_cases():
+		data = dump_xmu(xmu, format)
+		for numeric in (False, True):
+			loaded = load_xmu(data, numeric)
+			assert loaded.to_payload()[0] == xmu.to_payload()[0]
+			for alpha in ALPHAS:
+				assert_cuts_equal(loaded.alphaCut(alpha), xmu.alphaCut(alpha))
+
+def test_store_round_trips():
+	items = dict(("set%d" % i, xmu) for i, xmu in enumerate(serialized_cases()))
+	handle, path = tempfile.mkstemp(suffix=".xmus")
+	os.close(handle)
+	try:
+		assert XmuStore.write(path, items) == len(items)
+		with XmuStore(path, numeric=True) as store:
+			assert sorted(store.names()) == sorted(items)
+			assert len(store) == len(items)
+			for name, xmu in items.items():
+				assert name in store
+				for alpha in ALPHAS:
+					assert_cuts_equal(store[name].alphaCut(alpha), xmu.alphaCut(alpha))
+		with pytest.raises(ValueError):
+			len(store)
+		with pytest.raises(ValueError):
+			store.names()
+		store.close()
+	finally:
+		os.remove(path)
+
+def test_dump_needs_a_compact_form():
+	xmus = shapes()
+	product = xmus["medium"].multiplyX(xmus["triangle"])
+	with pytest.raises(ValueError):
+		dump_xmu(product)
+
+##### Defuzzification ########################
+
+def test_defuzzification_of_shapes():
+	triangle = TriangularXmu(U, 2.0, 4.0, 8.0)
+	assert numpy.isclose(triangle.sigmaCount(), 3.0)
+	assert numpy.isclose(triangle.centroid(), 14.0 / 3.0)
+	assert numpy.isclose(triangle.meanOfMaxima(), 4.0)
+	xmus = shapes()
+	objects = [xmus["medium"], xmus["small"], NumericTriangularXmu(NU, 2.0, 4.0, 8.0), BasicXmu(U, EmptySet())]
+	assert numpy.allclose(defuzzify(objects, "sigma_count"), [4.0, 3.0, 3.0, 0.0])
+	assert numpy.allclose(defuzzify(objects, "centroid"), [5.0, 14.0 / 9.0, 14.0 / 3.0, numpy.nan], equal_nan=True)
+	assert numpy.allclose(defuzzify(objects, "mean_of_maxima"), [5.0, 1.0, 4.0, numpy.nan], equal_nan=True)
+	bank = FuzzySetBank.from_shapes(NU, objects[:3])
+	for method in ("sigma_count", "centroid", "mean_of_maxima"):
+		assert numpy.allclose(bank.defuzzify(method), defuzzify(objects[:3], method))
+
+def test_defuzzification_without_a_linear_form():
+	xmus = shapes()
+	product = xmus["medium"].multiplyX(xmus["triangle"])
+	X = numpy.linspace(0.0, 80.0, 160001)
+	mu = product.mu_at(X)
+	area = numpy.trapz(mu, X)
+	assert numpy.isclose(product.sigmaCount(), area, rtol=1e-4)
+	assert numpy.isclose(product.centroid(), numpy.trapz(mu * X, X) / area, rtol=1e-4)
+	# the core of the product is [4, 6] * 5
+	assert numpy.isclose(product.meanOfMaxima(), 25.0)
+
+##### Discrete universes ######################
+
+@pytest.mark.parametrize("operation", OPERATIONS)
+@pytest.mark.parametrize("pair", PAIRS)
+def test_discrete_matches_sympy(pair, operation):
+	xmus = shapes()
+	points = numpy.linspace(0.05, 9.95, 100)
+	first = DiscreteXmu.from_xmu(xmus[pair[0]], points)
+	second = DiscreteXmu.from_xmu(xmus[pair[1]], points)
+	result = first.setOperationX(second, operation)
+	expected = sympy_operation(xmus[pair[0]], xmus[pair[1]], operation)
+	for alpha in ALPHAS:
+		reference = expected.subs(ALPHA, alpha)
+		inside = [p for p in points if reference.contains(p) == True]
+		assert numpy.allclose(result.alphaCut(alpha), inside)
+
+def test_discrete_packing_round_trips():
+	rng = numpy.random.RandomState(7)
+	elements = ["e%d" % i for i in range(37)]
+	mu = numpy.round(rng.rand(37), 2) * (rng.rand(37) > 0.3)
+	discrete = DiscreteXmu.from_memberships(elements, mu)
+	assert numpy.allclose(discrete.memberships(), mu)
+	assert discrete.bits.shape == (len(numpy.unique(mu[mu > 0.0])), 5)
+	assert list(discrete.cardinalities()) == [int((mu >= level).sum()) for level in discrete.levels]
+	assert numpy.allclose(discrete.negateX().negateX().memberships() > 0.0, mu > 0.0)
+
+def test_discrete_operations_on_categories():
+	rng = numpy.random.RandomState(11)
+	elements = ["c%d" % i for i in range(20)]
+	mu_a = numpy.round(rng.rand(20), 1)
+	mu_b = numpy.round(rng.rand(20), 1)
+	first = DiscreteXmu.from_memberships(elements, mu_a)
+	second = DiscreteXmu.from_memberships(elements, mu_b)
+	assert numpy.allclose(first.unionX(second).memberships(), numpy.maximum(mu_a, mu_b))
+	assert numpy.allclose(first.intersectX(second).memberships(), numpy.minimum(mu_a, mu_b))
+	assert first.alphaCut(0.5) == [element for element, mu in zip(elements, mu_a) if mu >= 0.5]
+	assert numpy.isclose(first.sigmaCount(), mu_a.sum())
+
+def test_continuous_and_discrete_operands_mix():
+	xmus = shapes()
+	points = numpy.linspace(0.5, 9.5, 10)
+	discrete = DiscreteXmu.from_xmu(xmus["large"], points)
+	union = xmus["small"].unionX(discrete)
+	assert isinstance(union, DiscreteXmu)
+	assert numpy.allclose(union.memberships(), numpy.maximum(xmus["small"].mu_at(points), xmus["large"].mu_at(points)))
+
+##### Streaming fitting #######################
+
+def test_streaming_histogram_merge():
+	rng = numpy.random.RandomState(3)
+	values = rng.normal(5.0, 1.5, 20000)
+	whole = StreamingHistogram(64).update(values)
+	left = StreamingHistogram(64).update(values[:10000])
+	right = StreamingHistogram(64).update(values[10000:])
+	merged = left.merge(right)
+	assert len(merged) <= 64
+	assert merged.count() == whole.count() == 20000
+	assert merged.minimum == values.min() and merged.maximum == values.max()
+	q = [0.1, 0.25, 0.5, 0.75, 0.9]
+	assert numpy.allclose(merged.quantiles(q), numpy.percentile(values, [100 * p for p in q]), atol=0.05)
+	assert numpy.allclose(merged.quantiles(q), whole.quantiles(q), atol=0.05)
+
+def test_streaming_fitter_uses_known_quantiles():
+	rng = numpy.random.RandomState(5)
+	values = numpy.linspace(0.0, 100.0, 100001)
+	rng.shuffle(values)
+	fitter = StreamingFitter(64).consume(values, chunksize=7000)
+	assert numpy.allclose(fitter.quantiles([0.1, 0.25, 0.5, 0.75, 0.9]), [10.0, 25.0, 50.0, 75.0, 90.0], atol=0.5)
+	trapezoid = fitter.fit("TrapezoidalXmu")
+	assert trapezoid.u == (0.0, 100.0)
+	assert numpy.allclose(trapezoid.to_payload()[2], [10.0, 25.0, 75.0, 90.0], atol=0.5)
+	triangle = fitter.fit("TriangularXmu", percentiles=(0.2, 0.4, 0.6), u=U, numeric=False)
+	assert isinstance(triangle, TriangularXmu)
+	assert numpy.allclose(triangle.to_payload()[2], [20.0, 40.0, 60.0], atol=0.5)
+	# a stream of numeric strings gives the same fit
+	strings = StreamingFitter(64).consume(("%r" % value for value in values), chunksize=7000)
+	assert numpy.allclose(strings.fit("TrapezoidalXmu").to_payload()[2], trapezoid.to_payload()[2])
+
+def test_streaming_fitter_partition():
+	values = numpy.linspace(0.0, 100.0, 100001)
+	terms = StreamingFitter(64).update(values).partition(["low", "middle", "high"])
+	assert [name for name, term in terms] == ["low", "middle", "high"]
+	assert [term.to_payload()[0] for name, term in terms] == ["DownwardGradientXmu", "TriangularXmu", "UpwardGradientXmu"]
+	assert numpy.allclose(terms[1][1].to_payload()[2], [5.0, 50.0, 95.0], atol=0.5)
+	X = numpy.linspace(0.0, 100.0, 201)
+	assert numpy.allclose(sum(term.mu_at(X) for name, term in terms), 1.0)
+	with pytest.raises(ValueError):
+		StreamingFitter().update(numpy.ones(100)).partition(["low", "high"])
+
+##### Thread-safe evaluation ##################
+
+@pytest.mark.parametrize("operation", OPERATIONS)
+@pytest.mark.parametrize("pair", PAIRS)
+def test_compiled_set_operations_match_sympy(pair, operation):
+	xmus = shapes()
+	first, second = xmus[pair[0]], xmus[pair[1]]
+	expected = sympy_operation(first, second, operation)
+	compiled = first.compile().setOperationX(second.compile(), operation)
+	assert isinstance(compiled, CompiledXmu)
+	for alpha in ALPHAS:
+		assert_cuts_equal(compiled.alphaCut(alpha), sympy_cut(expected, alpha))
+
+def test_compiled_xmu_is_immutable_and_detached():
+	xmus = shapes()
+	medium = TrapezoidalXmu(U, 2.0, 4.0, 6.0, 8.0)
+	compiled = medium.compile()
+	with pytest.raises(AttributeError):
+		compiled.u = (0.0, 1.0)
+	medium.setAB(1.0, 2.0, 3.0, 4.0)
+	assert compiled.alphaCut(0.5) == [(3.0, 7.0)]
+	assert compiled.to_payload() == ("TrapezoidalXmu", (0.0, 10.0), (2.0, 4.0, 6.0, 8.0))
+	lazy = xmus["medium"].lazy().unionX(xmus["large"])
+	eager = xmus["medium"].unionX(xmus["large"])
+	for alpha in ALPHAS:
+		assert_cuts_equal(lazy.compile().alphaCut(alpha), eager.alphaCut(alpha))
+
+def test_compiled_product_can_be_dumped():
+	xmus = shapes()
+	# compiling samples the quadratic X-mu function into a linear one, which can be stored
+	compiled = xmus["medium"].multiplyX(xmus["triangle"]).compile()
+	loaded = load_xmu(dump_xmu(compiled), numeric=True)
+	for alpha in ALPHAS:
+		assert_cuts_equal(loaded.alphaCut(alpha), compiled.alphaCut(alpha))
+
+def test_evaluate_threaded_reports_errors_per_task():
+	xmus = shapes()
+	lazy = xmus["small"].lazy().unionX(xmus["large"])
+	results = evaluate_threaded([lazy, (xmus["small"], [("unionX", "not an Xmu")]), (xmus["medium"], [("intersectX", xmus["triangle"])])], alphas=[0.5], threads=2)
+	assert [result["ok"] for result in results] == [True, False, True]
+	assert_cuts_equal(results[0]["cuts"][0], xmus["small"].unionX(xmus["large"]).alphaCut(0.5))
+	assert_cuts_equal(results[2]["cuts"][0], xmus["medium"].intersectX(xmus["triangle"]).alphaCut(0.5))
+
+def test_evaluate_threaded_with_a_shared_pool():
+	xmus = shapes()
+	names = sorted(xmus)
+	tasks = [(xmus[names[i % 4]], [("unionX", xmus[names[(i + 1) % 4]]), ("negateX", None)]) for i in range(40)]
+	X = numpy.linspace(0.0, 10.0, 21)
+	pool = ThreadPool(4)
+	try:
+		for _ in range(2):
+			results = evaluate_threaded(tasks, alphas=ALPHAS, X=X, pool=pool)
+			for i, result in enumerate(results):
+				expected = xmus[names[i % 4]].unionX(xmus[names[(i + 1) % 4]]).negateX()
+				assert result["ok"]
+				assert numpy.allclose(result["memberships"], expected.mu_at(X))
+				for cut, alpha in zip(result["cuts"], ALPHAS):
+					assert_cuts_equal(cut, expected.alphaCut(alpha))
+	finally:
+		pool.close()
+		pool.join()
+
+##### Numeric inversion #######################
+
+def gaussian_cut(alpha):
+	""" @return	the exact alpha-cut of exp(-(x - 5)**2 / 2) over [0, 10], as NumPy arrays (lows, highs) """
+	spread = numpy.sqrt(-2.0 * numpy.log(alpha))
+	return numpy.maximum(5.0 - spread, 0.0), numpy.minimum(5.0 + spread, 10.0)
+
+def test_inversion_reaches_the_tolerance_on_a_gaussian():
+	inversion = MuInversion(lambda X: numpy.exp(-(X - 5.0) ** 2 / 2.0), NU)
+	alphas = numpy.linspace(0.0, 1.0, 20001)[1:]
+	exact_lows, exact_highs = gaussian_cut(alphas)
+	sizes = []
+	for tolerance in [1e-4, 1e-6]:
+		linear = inversion.refine(tolerance)
+		assert inversion.tolerance == tolerance
+		lows, highs = linear.endpoints(alphas)
+		assert lows.shape == (1, len(alphas))
+		assert numpy.abs(lows[0] - exact_lows).max() <= tolerance
+		assert numpy.abs(highs[0] - exact_highs).max() <= tolerance
+		sizes.append(len(inversion.alphas))
+	assert sizes[0] < sizes[1]
+	# a looser tolerance than the one reached returns the same function at once
+	assert inversion.refine(1e-3) is linear
+
+def test_inversion_warns_when_the_alphas_run_out():
+	inversion = MuInversion(lambda X: numpy.exp(-(X - 5.0) ** 2 / 2.0), NU)
+	with pytest.warns(RuntimeWarning):
+		inversion.refine(1e-9, max_alphas=100)
+	assert len(inversion.alphas) <= 100
+	assert inversion.tolerance > 1e-9
+
+def test_invert_x_of_a_sympy_gaussian():
+	gaussian = BasicXmu(U)
+	gaussian.set_muequals(exp(-(Xmu.x - 5.0) ** 2 / 2.0))
+	linear = gaussian.invertX(tolerance=1e-4)
+	assert gaussian.get_linear_xequals() is linear
+	for alpha in ALPHAS:
+		lows, highs = gaussian_cut(alpha)
+		assert numpy.allclose(gaussian.alphaCut(alpha), [(lows, highs)], atol=1e-4)
+
+def test_lazy_invert():
+	xmus = shapes()
+	lazy = xmus["medium"].lazy().unionX(xmus["large"])
+	eager = xmus["medium"].unionX(xmus["large"])
+	inverted = lazy.invertX(tolerance=1e-4)
+	for alpha in ALPHAS:
+		assert numpy.allclose(inverted.cut(alpha), eager.alphaCut(alpha), atol=1e-3)
+
+##### Extension principle #####################
+
+def test_extension_principle_matches_addition():
+	xmus = shapes()
+	a, b = symbols("a b")
+	with warnings.catch_warnings(record=True) as caught:
+		warnings.simplefilter("always")
+		total = extension_principle(a + b, [xmus["medium"], xmus["triangle"]])
+	assert caught == []
+	expected = xmus["medium"].addX(xmus["triangle"])
+	for alpha in ALPHAS:
+		assert numpy.allclose(total.alphaCut(alpha), expected.alphaCut(alpha), atol=1e-6)
+
+def test_extension_principle_of_a_monotone_expression_is_exact():
+	xmus = shapes()
+	a, b, c = symbols("a b c")
+	operands = [xmus["small"], xmus["medium"], xmus["large"]]
+	with warnings.catch_warnings(record=True) as caught:
+		warnings.simplefilter("always")
+		cost = extension_principle(a * b + sqrt(c), operands, alphas=ALPHAS)
+	assert caught == []
+	for alpha in ALPHAS:
+		(a0, a1), (b0, b1), (c0, c1) = [operand.alphaCut(alpha)[0] for operand in operands]
+		assert numpy.allclose(cost.alphaCut(alpha), [(a0 * b0 + numpy.sqrt(c0), a1 * b1 + numpy.sqrt(c1))], rtol=1e-12, atol=0.0)
+
+def test_extension_principle_warns_when_it_searches():
+	xmus = shapes()
+	with pytest.warns(RuntimeWarning):
+		extension_principle(lambda a, b: a + b, [xmus["medium"], xmus["triangle"]])
+	a = symbols("a")
+	with pytest.warns(RuntimeWarning):
+		extension_principle(a + 0.5 * sin(8 * pi * a), [xmus["medium"]])
+
+def test_extension_cuts_fix_the_monotone_variables():
+	a, b = symbols("a b")
+	expr = a + b ** 2
+	# a in [0, 1] and b in [-1, 2]: monotone in a, but not in b
+	lows = [numpy.array([0.0, 0.0]), numpy.array([-1.0, 1.0])]
+	highs = [numpy.array([1.0, 1.0]), numpy.array([2.0, 2.0])]
+	directions = monotone_directions(expr, [a, b], lows, highs)
+	assert [direction.tolist() for direction in directions] == [[1, 1], [0, 1]]
+	minima, maxima, exact = extension_cuts(lambda a, b: a + b ** 2, lows, highs, directions=directions)
+	assert exact.tolist() == [False, True]
+	assert numpy.allclose(minima, [0.0, 1.0]) and maxima.tolist() == [5.0, 5.0]
+
+def test_extension_cuts_find_extremes_between_grid_points():
+	# f is a at every point of the initial grid, but its image over [0, 1] is about [-0.314, 1.314]
+	f = lambda a: a + 0.5 * numpy.sin(8 * numpy.pi * a)
+	X = numpy.linspace(0.0, 1.0, 100001)
+	minima, maxima, exact = extension_cuts(f, [numpy.array([0.0])], [numpy.array([1.0])])
+	assert not exact[0]
+	assert numpy.allclose([minima[0], maxima[0]], [f(X).min(), f(X).max()], atol=1e-6)
+
+def test_interval_expression_encloses_the_expression():
+	a, b = symbols("a b")
+	expr = exp(a) * sin(3 * b) / (1 + Abs(a - b)) + log(b + 3) + sqrt(a ** 2 + 1) - cos(a * b)
+	f = lambdify([a, b], expr, "numpy")
+	lows = [numpy.array([-2.0, 0.0, 0.5, -0.1]), numpy.array([-1.0, 0.0, 1.0, 2.0])]
+	highs = [numpy.array([1.0, 0.0, 0.75, 4.0]), numpy.array([2.0, 6.0, 1.5, 2.0])]
+	lo, hi = interval_expression(expr, [a, b], lows, highs)
+	steps = numpy.linspace(0.0, 1.0, 201)
+	for i in range(4):
+		A, B = numpy.meshgrid(lows[0][i] + steps * (highs[0][i] - lows[0][i]), lows[1][i] + steps * (highs[1][i] - lows[1][i]))
+		values = f(A, B)
+		assert lo[i] <= values.min() and values.max() <= hi[i], i
+	assert interval_expression(gamma(a), [a], [numpy.array([1.0])], [numpy.array([2.0])]) is None
+
+##### Canonical form ##########################
+
+def canonical_cases():
+	xmus = shapes()
+	divisor = TriangularXmu(Interval(-5.0, 10.0), -1.0, 1.0, 3.0)
+	dividend = TrapezoidalXmu(Interval(-5.0, 10.0), 2.0, 4.0, 6.0, 8.0)
+	return [
+		LinearXmuFunction(),
+		xmus["medium"].get_linear_xequals(),
+		xmus["small"].unionX(xmus["large"]).differenceX(xmus["medium"]).get_linear_xequals(),
+		xmus["triangle"].negateX().get_linear_xequals(),
+		xmus["medium"].multiplyX(BasicXmu(U, Interval(2.0, 3.0))).get_linear_xequals(),
+		dividend.divX(divisor).get_linear_xequals(),
+	]
+
+@pytest.mark.parametrize("index", range(6))
+def test_canonical_form_round_trips(index):
+	linear = canonical_cases()[index]
+	expr = linear.to_sympy()
+	assert LinearXmuFunction.from_sympy(expr) == linear
+	for alpha in ALPHAS:
+		cut = [interval for interval in linear.cut(alpha) if numpy.isfinite(interval).all()]
+		assert_cuts_equal([interval for interval in sympy_cut(expr, alpha) if numpy.isfinite(interval).all()], cut)
+
+@pytest.mark.parametrize("name", sorted(shapes()))
+def test_negate_matches_sympy(name):
+	xmu = shapes()[name]
+	negation = xmu.negateX()
+	expected = U - xmu.get_xequals()
+	for alpha in ALPHAS:
+		reference = sympy_cut(expected, alpha)
+		assert_cuts_equal(negation.alphaCut(alpha), reference)
+		assert_cuts_equal(sympy_cut(negation.get_xequals(), alpha), reference)
+
+def test_division_keeps_infinite_cuts_through_set_operations():
+	u = Interval(-5.0, 10.0)
+	quotient = TrapezoidalXmu(u, 2.0, 4.0, 6.0, 8.0).divX(TriangularXmu(u, -1.0, 1.0, 3.0))
+	low = TrapezoidalXmu(u, -5.0, -5.0, -4.0, -3.0)
+	union = quotient.unionX(low)
+	linear = union.get_linear_xequals()
+	assert LinearXmuFunction.from_sympy(union.get_xequals()) == linear
+	# the quotient's cut at 0.1 is (-inf, ...] U [..., inf), clipped to u
+	cut = union.alphaCut(0.1)
+	assert cut[0][0] == -5.0 and cut[-1][1] == 10.0
+
+def test_deep_chain_has_bounded_sympy_form():
+	xmus = shapes()
+	names = sorted(xmus)
+	result = xmus["small"]
+	sizes = []
+	for i in range(40):
+		result = result.setOperationX(xmus[names[i % 4]], OPERATIONS[i % 3])
+		sizes.append(len(str(result.get_xequals())))
+	assert max(sizes[20:]) <= max(sizes[:20])
@@ -26,29 +26,74 @@ limitations under the License.
 
 ##### Requirements ############################
 from sympy import *
-import sympy.mpmath as mpmath
-from sympy.assumptions.assume import *
-from numpy.random import rand
+import numpy
+import copy
+import itertools
+import time
+import traceback
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import fnmatch
+import json
+import types
+from xmu_numeric import *
 ###############################################
-	
+
 ALPHA = Symbol('alpha', positive=True, real=True, bounded=True)
-global_assumptions.add(Q.is_true(And((ALPHA >= 0.0), (ALPHA <= 1.0))))
+
+def numpy_kernel(symbol, expr):
+	""" Compiles a sympy expression in a single symbol to a function over NumPy arrays. Piecewise, And, Or and Not are translated into numpy.where and numpy logical operations, so the result is evaluated in one vectorized pass.
+	@param	symbol	the sympy symbol the expression is a function of
+	@param	expr	a sympy expression
+	@return	a function taking a NumPy array and returning a NumPy array of the same shape """
+	if isinstance(expr, Piecewise):
+		parts = [(numpy_kernel(symbol, e), numpy_kernel(symbol, c)) for e, c in expr.args]
+		def piecewise_kernel(X):
+			result = numpy.zeros(X.shape)
+			done = numpy.zeros(X.shape, dtype=bool)
+			# every branch is evaluated at every x, but only used where its condition holds
+			with numpy.errstate(invalid='ignore', divide='ignore'):
+				for e, c in parts:
+					chosen = c(X) & ~done
+					result = numpy.where(chosen, e(X), result)
+					done |= chosen
+			return result
+		return piecewise_kernel
+	if isinstance(expr, (And, Or)):
+		parts = [numpy_kernel(symbol, arg) for arg in expr.args]
+		op = numpy.logical_and if isinstance(expr, And) else numpy.logical_or
+		return lambda X: reduce(op, [p(X) for p in parts])
+	if isinstance(expr, Not):
+		part = numpy_kernel(symbol, expr.args[0])
+		return lambda X: numpy.logical_not(part(X))
+	f = lambdify(symbol, expr, "numpy")
+	return lambda X: numpy.broadcast_arrays(f(X), X)[0]
+
 
 class Xmu(object):
 	""" The Xmu class (which extends the Python object class), is a somewhat abstract class that sets up an object for polymorphism, and also provides the basic properties (such as x, u, mu and the Xmu function) """
 	
+	__slots__ = ("u", "xequals", "muequals", "mu_kernel", "xequals_builder", "linear_xequals", "linear_checked", "xequals_key", "parameters", "inversion")
+	
 	x = Symbol('x', real=True, bounded=True)
-	muequals = Piecewise((0.0, True))
-	xequals = EmptySet()
-	u = Interval(0.0, 1.0)
+	default_muequals = Piecewise((0.0, True))
+	cache = None
 	
 	def __init__(self, u):
-		""" __init__ contructor taking in a singule parameter u representing the universe. Sets the object u, and also sends assertions to SymPy.
+		""" __init__ contructor taking in a singule parameter u representing the universe. Sets the object u; no global (e.g. SymPy assumption) state is changed, so Xmu objects can be built concurrently.
 		@param	u	an interval being a subset of R (real numbers), representing the universe of this particular domain.
 		@return	An instantiated X-mu object """
 		
+		self.xequals = EmptySet()
+		self.muequals = Xmu.default_muequals
+		self.mu_kernel = None
+		self.xequals_builder = None
+		self.linear_xequals = None
+		self.linear_checked = False
+		self.xequals_key = None
+		self.parameters = None
+		self.inversion = None
 		self.set_u(u)
-		Q.is_true((self.x >= self.u.start) & (self.x <= self.u.end))
 	
 	def __str__(self):
 		""" __str__ method returns a string representation of the X-mu formula. 
@@ -56,20 +101,67 @@ class Xmu(object):
 		
 		return str(self.get_muequals())
 	
+	def __getstate__(self):
+		""" Gets the state of this Xmu object for pickling. The membership kernel and any numeric inversion are closures, which cannot be pickled, so they are left out: the closed-form kernel of a built-in shape is recorded by its points (and rebuilt by __setstate__), and any other kernel is compiled again from the mu function when next needed. An X-mu function still to be built (see set_xequals_builder) is built now.
+		@return	a dict of slot values """
+		if self.xequals_builder is not None:
+			Xmu.get_xequals(self)
+		state = {}
+		for cls in type(self).__mro__:
+			for name in getattr(cls, "__slots__", ()):
+				if hasattr(self, name):
+					state[name] = getattr(self, name)
+		state["mu_kernel"] = getattr(self.mu_kernel, "points", None)
+		state["inversion"] = None
+		# the default mu function is recognised by identity (e.g. by BasicXmu.buildMuKernel), which pickling would not keep
+		if self.muequals is Xmu.default_muequals:
+			state["muequals"] = None
+		return state
+	
+	def __setstate__(self, state):
+		""" Restores an Xmu object from the state given by __getstate__.
+		@param	state	a dict of slot values """
+		for name, value in state.items():
+			setattr(self, name, value)
+		if self.muequals is None:
+			self.muequals = Xmu.default_muequals
+		if self.mu_kernel is not None:
+			self.mu_kernel = trapezoidal_kernel(*self.mu_kernel)
+	
 	def setMuFunction(self, func):
 		""" Sets the mu function. Currently a synonym for set_muequals.
 		@param	func	a sympy function """
 		self.set_muequals(func)
 	
 	def set_muequals(self, func):
-		""" Sets the mu function.
+		""" Sets the mu function. The compiled membership kernel (and any numeric inversion, see invertX) is discarded, and rebuilt when next needed.
 		@param	func	a sympy function """
 		self.muequals = func
+		self.mu_kernel = None
+		self.inversion = None
 	
 	def get_muequals(self):
 		""" Gets the mu function.
 		@return	muequals	a sympy function """
 		return self.muequals
+	
+	def get_mu_kernel(self):
+		""" Gets the compiled membership kernel, building it the first time.
+		@return	a function taking a NumPy array of x values and returning a NumPy array of memberships """
+		if self.mu_kernel is None:
+			self.mu_kernel = self.buildMuKernel()
+		return self.mu_kernel
+	
+	def buildMuKernel(self):
+		""" Compiles the mu function to a NumPy kernel. Subclasses with a closed form set mu_kernel directly in setMuFunction instead.
+		@return	a function taking a NumPy array of x values and returning a NumPy array of memberships """
+		return numpy_kernel(self.x, self.get_muequals())
+	
+	def mu_at(self, X):
+		""" Evaluates membership for many x values in one vectorized pass.
+		@param	X	a NumPy array (or anything array-like) of x values
+		@return	a NumPy array of memberships, of the same shape as X """
+		return self.get_mu_kernel()(numpy.asarray(X, dtype=float))
 		
 	def setXFunction(self, func):
 		""" Sets the X-mu function. Currently a synonym for set_xequals.
@@ -77,49 +169,281 @@ class Xmu(object):
 		self.set_xequals(func)
 		
 	def set_xequals(self, func):
-		""" Sets the X-mu function.
+		""" Sets the X-mu function. Any numeric (linear) X-mu function is discarded, and re-derived from func when next needed.
 		@param	func	a sympy function """
 		self.xequals = func
+		self.xequals_builder = None
+		self.linear_xequals = None
+		self.linear_checked = False
+		self.xequals_key = None
+		self.parameters = None
+	
+	def invertX(self, tolerance=None, samples=1025):
+		""" Derives the X-mu function from the mu function numerically, for mu functions without a hand-derived inverse (e.g. a Gaussian, a sigmoid or any Piecewise set with set_muequals). The result is a linear X-mu function whose endpoints are within tolerance of the exact ones (see MuInversion), and replaces the current X-mu function. The inversion is kept on this object, so asking again for a smaller tolerance only refines it.
+		@param	tolerance	the largest endpoint error, in x units (default: 1e-3 of the universe)
+		@param	samples	the number of x values at which mu is sampled for bracketing, when the inversion is first made
+		@return	a LinearXmuFunction """
+		if self.inversion is None:
+			self.inversion = MuInversion(self.get_mu_kernel(), self.u, samples)
+		linear = self.inversion.refine(tolerance)
+		self.set_linear_xequals(linear)
+		self.set_xequals_builder(linear.to_sympy)
+		return linear
 	
 	def get_xequals(self):
-		""" Gets the X-mu function.
+		""" Gets the X-mu function. If the X-mu function was produced numerically, the sympy version is only built now.
 		@return	xequals	a sympy function """
+		builder = self.xequals_builder
+		if builder is not None:
+			# the result is stored before the builder is dropped, so a concurrent caller never sees a stale X-mu function
+			self.xequals = builder()
+			self.xequals_builder = None
 		return self.xequals
 	
+	def get_xequals_builder(self):
+		""" Gets a function returning the current sympy X-mu function, without building it now. Later changes to this instance do not affect the function returned.
+		@return	a function taking no parameters and returning a sympy function """
+		if self.xequals_builder is not None:
+			return self.xequals_builder
+		xequals = self.xequals
+		return lambda: xequals
+	
+	def set_xequals_builder(self, builder):
+		""" Sets a function which builds the sympy X-mu function on demand (i.e. on the first call to get_xequals).
+		@param	builder	a function taking no parameters and returning a sympy function """
+		self.xequals_builder = builder
+	
+	def set_linear_xequals(self, func):
+		""" Sets the numeric X-mu function.
+		@param	func	a LinearXmuFunction """
+		self.linear_xequals = func
+		self.linear_checked = True
+		self.xequals_key = None
+		self.parameters = None
+	
+	def get_linear_xequals(self):
+		""" Gets the numeric X-mu function, converting it from the sympy X-mu function the first time if necessary.
+		@return	a LinearXmuFunction, or None if the X-mu function has no linear representation """
+		if not self.linear_checked:
+			self.linear_xequals = LinearXmuFunction.from_sympy(self.get_xequals())
+			self.linear_checked = True
+		return self.linear_xequals
+	
+	def get_xequals_key(self):
+		""" Gets a structural key for the X-mu function: structurally equal X-mu functions have equal keys. The key is kept until a setter changes the X-mu function.
+		@return	a hashable tuple """
+		if self.xequals_key is None:
+			linear = self.get_linear_xequals()
+			if linear is not None:
+				self.xequals_key = ("linear",) + linear.key()
+			else:
+				self.xequals_key = ("sympy", self.get_xequals())
+		return self.xequals_key
+	
+	@classmethod
+	def enable_cache(cls, maxsize=1024):
+		""" Turns on memoisation of set operations and alpha-cuts for all Xmu objects.
+		@param	maxsize	the largest number of cached results
+		@return	the XmuCache in use """
+		Xmu.cache = XmuCache(maxsize)
+		return Xmu.cache
+	
+	@classmethod
+	def disable_cache(cls):
+		""" Turns off memoisation, discarding the cache. """
+		Xmu.cache = None
+	
+	def alphaCut(self, alpha):
+		""" Gets the alpha-cut of this Xmu object, using the numeric X-mu function where possible (and the cache, if enabled).
+		@param	alpha	a float between 0.0 and 1.0
+		@return	a sorted list of (inf, sup) tuples """
+		cache = self.cache
+		if cache is not None:
+			key = ("cut", self.get_xequals_key(), float(alpha))
+			result = cache.get(key)
+			if result is None:
+				result = self.computeAlphaCut(alpha)
+				cache.put(key, result)
+			return list(result)
+		return self.computeAlphaCut(alpha)
+	
+	def computeAlphaCut(self, alpha):
+		""" Computes the alpha-cut of this Xmu object, without the cache. Primarily used as a private method.
+		@param	alpha	a float between 0.0 and 1.0
+		@return	a sorted list of (inf, sup) tuples """
+		linear = self.get_linear_xequals()
+		if linear is not None:
+			return linear.cut(alpha)
+		subs = self.get_xequals().subs(ALPHA, float(alpha))
+		if subs.is_EmptySet:
+			return []
+		if isinstance(subs, Union):
+			return [(float(part.inf), float(part.sup)) for part in subs.args]
+		return [(float(subs.inf), float(subs.sup))]
+	
 	def set_u(self, u):
 		""" Sets the universe u.
 		@param	u	a sympy interval """
 		self.u = u
 	
+	def alphaCuts(self, alphas):
+		""" Gets the alpha-cuts of this Xmu object at many alphas, as arrays of interval endpoints.
+		@param	alphas	a NumPy array of n alphas
+		@return	a tuple of NumPy arrays (lows, highs), each of shape (k, n). Missing intervals have NaN endpoints. """
+		linear = self.get_linear_xequals()
+		if linear is not None:
+			return linear.endpoints(alphas)
+		xequals = self.get_xequals()
+		if isinstance(xequals, Interval) and xequals.free_symbols <= set([ALPHA]):
+			# a single interval (e.g. a product of fuzzy numbers, whose endpoints are quadratic): its endpoints are evaluated exactly, at all alphas at once
+			alphas = numpy.asarray(alphas, dtype=float)
+			lows = numpy.array(numpy_kernel(ALPHA, xequals.start)(alphas), dtype=float)
+			highs = numpy.array(numpy_kernel(ALPHA, xequals.end)(alphas), dtype=float)
+			missing = ~(lows <= highs)
+			lows[missing] = numpy.nan
+			highs[missing] = numpy.nan
+			return lows[numpy.newaxis, :], highs[numpy.newaxis, :]
+		cuts = [self.alphaCut(alpha) for alpha in alphas]
+		k = max([len(c) for c in cuts] + [1])
+		lows = numpy.full((k, len(cuts)), numpy.nan)
+		highs = numpy.full((k, len(cuts)), numpy.nan)
+		for i, cut in enumerate(cuts):
+			for j, (inf, sup) in enumerate(cut):
+				lows[j, i] = inf
+				highs[j, i] = sup
+		return lows, highs
+	
+	def sigmaCount(self, alphas=None):
+		""" Gets the sigma-count of this Xmu object: the area under the membership function, which is the integral over alpha of the total width of the cuts. Computed in closed form when the X-mu function is linear, and numerically otherwise. See defuzzify.
+		@note	Where the cuts are not nested (e.g. after some set differences), this X-mu sigma-count differs from integrating mu_at.
+		@param	alphas	the alphas for the numeric fallback (default: 1001 equally spaced alphas)
+		@return	a float """
+		return defuzzify([self], "sigma_count", alphas)[0]
+	
+	def centroid(self, alphas=None):
+		""" Gets the centroid of this Xmu object (the first moment divided by the sigma-count). See sigmaCount and defuzzify.
+		@param	alphas	the alphas for the numeric fallback
+		@return	a float, or NaN for an empty set """
+		return defuzzify([self], "centroid", alphas)[0]
+	
+	def meanOfMaxima(self, alphas=None):
+		""" Gets the mean of maxima of this Xmu object: the mean of its cut at the largest alpha with a non-empty cut. See defuzzify.
+		@param	alphas	the alphas for the numeric fallback
+		@return	a float, or NaN for an empty set """
+		return defuzzify([self], "mean_of_maxima", alphas)[0]
+	
+	def setOperationX(self, target, operation):
+		""" Wrapper for performing X-mu set operations. If both X-mu functions have a linear representation, the operation is done numerically on LinearXmuFunction, and the sympy result is only built when get_xequals() is called. If the cache is enabled, results are memoised by the structure of both X-mu functions. Primarily used as a private method, but could be used publicly.
+		@param	target	an Xmu instance.
+		@param	operation	One of the following: union, intersect, difference
+		@return	an BasicXmu instance; or a DiscreteXmu, when the target is one (this object is sampled at its elements, see DiscreteXmu.from_xmu) """
+		if isinstance(target, DiscreteXmu):
+			return DiscreteXmu.from_xmu(self, target.u).setOperationX(target, operation)
+		cache = self.cache
+		if cache is not None:
+			key = (operation, self.u, self.get_xequals_key(), target.get_xequals_key())
+			result = cache.get(key)
+			if result is None:
+				result = self.computeSetOperationX(target, operation)
+				cache.put(key, copy.copy(result))
+				return result
+			return copy.copy(result)
+		return self.computeSetOperationX(target, operation)
+	
+	def computeSetOperationX(self, target, operation):
+		""" Performs an X-mu set operation, without the cache. Primarily used as a private method.
+		Where both X-mu functions are linear, the result is clipped to u and its sympy form is the canonical one (see LinearXmuFunction.to_sympy), so the size of its X-mu function does not grow with the length of a chain of operations.
+		@param	target	an Xmu instance.
+		@param	operation	One of the following: union, intersect, difference
+		@return	an BasicXmu instance """
+		l1 = target.get_linear_xequals()
+		l2 = self.get_linear_xequals()
+		if l1 is not None and l2 is not None:
+			return self.canonicalXmu(getattr(l2, operation)(l1))
+		return BasicXmu(self.u, Xmu.sympySetOperation(target.get_xequals(), self.get_xequals(), operation))
+	
+	def canonicalXmu(self, linear):
+		""" Makes a BasicXmu over this object's universe from a linear X-mu function, clipped to the universe. Primarily used as a private method.
+		@param	linear	a LinearXmuFunction
+		@return	a BasicXmu instance, whose sympy X-mu function is built in canonical form when first requested """
+		result = BasicXmu(self.u)
+		linear = linear.clipped(float(self.u.inf), float(self.u.sup))
+		result.set_linear_xequals(linear)
+		result.set_xequals_builder(linear.to_sympy)
+		return result
+	
+	@staticmethod
+	def sympySetOperation(i1, i2, operation):
+		""" Performs an X-mu set operation symbolically in sympy. Primarily used as a private method.
+		@param	i1	the target's sympy X-mu function
+		@param	i2	this object's sympy X-mu function
+		@param	operation	One of the following: union, intersect, difference
+		@return	a sympy set """
+		if operation == "union":
+			return i1.union(i2)
+		elif operation == "intersect":
+			return i1.intersect(i2)
+		elif operation == "difference":
+			return i2 - i1
+		raise ValueError("Unknown set operation: " + str(operation))
+	
 	def intersectX(self, target):
 		""" Performs X-mu set intersection (itself union a target), and returns the result.
 		@param	target	an Xmu instance. 
 		@return	intersection	an BasicXmu instance """
-		i1 = target.get_xequals()
-		i2 = self.get_xequals()
-		return BasicXmu(self.u, i1.intersect(i2))
+		return self.setOperationX(target, "intersect")
 	
 	def differenceX(self, target):
 		""" Performs X-mu set difference (itself - a target), and returns the result.
 		@param	target	an Xmu instance. 
 		@return	difference	an BasicXmu instance """
-		i1 = target.get_xequals()
-		i2 = self.get_xequals()
-		result = i2 - i1
-		return BasicXmu(self.u, result)
+		return self.setOperationX(target, "difference")
 	
 	def unionX(self, target):
 		""" Performs X-mu set union (itself union a target), and returns the result.
 		@param	target	an Xmu instance. 
 		@return	union	an BasicXmu instance """
-		i1 = target.get_xequals()
-		i2 = self.get_xequals()
-		return BasicXmu(self.u, i1.union(i2))
+		return self.setOperationX(target, "union")
+	
+	def to_payload(self):
+		""" Gets a compact, picklable description of this Xmu object, which avoids sending sympy trees between processes. Built-in shapes are described by their class name and parameters, and other X-mu functions by their linear form; only X-mu functions without a linear form (or with a mu function set by hand) fall back to sympy.
+		@return	a tuple: (class name, (u.inf, u.sup), parameters), ("linear", (u.inf, u.sup), breakpoints, pieces) or ("sympy", (u.inf, u.sup), xequals, muequals)
+		@see	xmu_from_payload """
+		u = (float(self.u.inf), float(self.u.sup))
+		if self.parameters is not None:
+			return (type(self).__name__, u, self.parameters)
+		linear = self.get_linear_xequals()
+		if linear is not None and self.get_muequals() is Xmu.default_muequals:
+			return ("linear", u, linear.breakpoints, linear.pieces)
+		return ("sympy", u, self.get_xequals(), self.get_muequals())
+	
+	def lazy(self):
+		""" Wraps this Xmu object for lazy evaluation: set operations on the result build an operation graph (see LazyXmu), which is only evaluated when a cut, a membership or the X-mu function is requested.
+		@return	a LazyXmu instance """
+		return LazyXmu(self.u, None, (self,))
+	
+	def compile(self, alphas=None):
+		""" Compiles this Xmu object into an immutable, SymPy-free CompiledXmu, which can be shared between threads without locks. The X-mu function and membership kernel are built now; later changes to this object do not affect the result.
+		@param	alphas	the alphas at which an X-mu function without a linear form is sampled (and then interpolated); default: 1001 equally spaced alphas
+		@return	a CompiledXmu instance """
+		linear = self.get_linear_xequals()
+		if linear is None:
+			if alphas is None:
+				alphas = numpy.linspace(0.0, 1.0, 1001)
+			alphas = numpy.unique(numpy.asarray(alphas, dtype=float))
+			lows, highs = self.alphaCuts(alphas)
+			linear = LinearXmuFunction.from_samples(alphas, lows, highs)
+		shape = (type(self).__name__, self.parameters) if self.parameters is not None else None
+		return CompiledXmu(self.u, linear, self.get_mu_kernel(), shape)
 	
 	def negateX(self):
-		""" Performs X-mu set negation (- itself), and returns the result.
-		@todo	Currently not working. This is due to SymPy not quite working as expected in terms of bounded intervals and symbolics therein.
+		""" Performs X-mu set negation (u - itself), and returns the result.
+		@note	Where the X-mu function is linear, the complement is computed on the linear form; otherwise it is left to sympy, which may not simplify it.
 		@return	negation	an BasicXmu instance """
+		linear = self.get_linear_xequals()
+		if linear is not None:
+			universe = LinearXmuFunction.from_interval((0.0, float(self.u.inf)), (0.0, float(self.u.sup)))
+			return self.canonicalXmu(universe.difference(linear))
 		result = self.u - self.get_xequals()
 		return BasicXmu(self.u, result)
 	
@@ -129,100 +453,355 @@ class Xmu(object):
 		@description Performs an implication at a certain point (alpha) along the X dimension.
 		@warning	Only works on Xmu types which have a muequals set!
 		@note	Fuzzy implications come from "A new approach in Zadeh’s classification: fuzzy implication through statistic implication " ( http://math.unipa.it/~grim/nafips_gras_spagnolo_232 )
+		@note	The implication types are those registered in IMPLICATIONS. For many points at once, use implication().
 		@todo	Test more extensively, and also find an example to work on. Might need a lot more work. Could be completely wrong!
-		@todo	More research and development required - e.g. implication defined by Zadeh, and also Mamdani
 		@todo	More to implement via: "Fuzzy power sets and fuzzy implication operators" ( http://www.sciencedirect.com/science/article/pii/0165011480900603 )
-		@return 0.0 (representing false), or 1.0 (representing true)
+		@return 0.0 (representing false), or 1.0 (representing true); or 0.0 for an unknown implication type
 		"""
-		mu_a = self.get_muequals().subs(self.x, float(X))
-		mu_b = i2.get_muequals().subs(self.x, float(X))	
-			
-		if implication_type is "lukasiewicz":
-			result = min(	(1.0 - mu_a + mu_b), 	1.0		)
-			return result
-		elif implication_type is "reichenbach":
-			result = 1.0 - mu_a + mu_a * mu_b
-			return result
-		elif implication_type is "kleenedienes":
-			result = max(1.0 - mu_a, mu_b)
-			return result
-		elif implication_type is "binary":
-			if (mu_a <= mu_b):
-				return 1.0
-			else:
-				return 0.0
-		else:
+		if implication_type not in IMPLICATIONS:
 			return 0.0
+		return float(self.implication(i2, X, implication_type))
+	
+	def implication(self, i2, X, implication_type="lukasiewicz"):
+		""" Performs an implication (itself implies i2) at many points along the X dimension, in one vectorized pass.
+		@IMPORTANT	This is not an X-mu operation, and is very experimental (see implicationAtX).
+		@param	i2	an Xmu instance
+		@param	X	a NumPy array of x values
+		@param	implication_type	the name of an implication in IMPLICATIONS
+		@return	a NumPy array of implication degrees, of the same shape as X """
+		if implication_type not in IMPLICATIONS:
+			raise ValueError("Unknown implication type: " + str(implication_type))
+		return IMPLICATIONS[implication_type](self.mu_at(X), i2.mu_at(X))
+	
+	def implicationMatrix(self, i2, X, Y, implication_type="lukasiewicz"):
+		""" Computes a fuzzy relation matrix: the implication from membership of each x in itself to membership of each y in i2.
+		@IMPORTANT	This is not an X-mu operation, and is very experimental (see implicationAtX).
+		@param	i2	an Xmu instance
+		@param	X	a 1-D NumPy array of x values (for itself)
+		@param	Y	a 1-D NumPy array of y values (for i2)
+		@param	implication_type	the name of an implication in IMPLICATIONS
+		@return	a NumPy array of shape (len(X), len(Y)) """
+		if implication_type not in IMPLICATIONS:
+			raise ValueError("Unknown implication type: " + str(implication_type))
+		mu_a = self.mu_at(numpy.ravel(X))[:, numpy.newaxis]
+		mu_b = i2.mu_at(numpy.ravel(Y))[numpy.newaxis, :]
+		return IMPLICATIONS[implication_type](mu_a, mu_b)
 	
 	
 	def arithmeticalOperationX(self, i2, alpha, operation):
-		""" Wrapper class for performing Fuzzy Arithmetic on X-mu Functions using SymPy/MPI. Primarily used as a private class, but could be used publicly.
+		""" Wrapper class for performing Fuzzy Arithmetic on X-mu Functions at a single alpha, using the interval arithmetic kernel (see INTERVAL_OPERATIONS). Primarily used as a private class, but could be used publicly.
 		@param	i2	the target sympy formula.
 		@param	alpha	the level on which to perform the operation.
 		@param	operation	One of the following: +, -, *, /, **
+		@return	an BasicXmu instance, or None if either X-mu function is empty at this alpha
 		"""
-		res = self.get_xequals().subs(ALPHA, float(alpha))
-		res2 = i2.get_xequals().subs(ALPHA, float(alpha))
-		if (not res.is_EmptySet) and (not res2.is_EmptySet):
-			if (type(res) != FiniteSet) and (type(res2) != FiniteSet):
-				result = eval("res.to_mpi() " + operation + " res2.to_mpi()")
-			else:
-				res_mpi = mpmath.mpi(res.inf, res.sup)
-				res2_mpi = mpmath.mpi(res2.inf, res2.sup)
-				result = eval("res_mpi " + operation + " res2_mpi")
-			
-			return BasicXmu(self.u, Interval(float(mpmath.mpf(result.a)), float(mpmath.mpf(result.b))))
+		if operation not in INTERVAL_OPERATIONS:
+			raise ValueError("Unknown arithmetic operation: " + str(operation))
+		res = self.alphaCut(alpha)
+		res2 = i2.alphaCut(alpha)
+		if len(res) > 0 and len(res2) > 0:
+			lo1, hi1 = numpy.array(res).T
+			lo2, hi2 = numpy.array(res2).T
+			pieces = []
+			for lo, hi in interval_operation(operation, numpy.repeat(lo1, len(lo2)), numpy.repeat(hi1, len(hi2)), numpy.tile(lo2, len(lo1)), numpy.tile(hi2, len(hi1))):
+				for inf, sup in zip(lo, hi):
+					if not (numpy.isnan(inf) or numpy.isnan(sup)):
+						pieces.append(Interval(float(inf), float(sup)))
+			if len(pieces) == 0:
+				return None
+			return BasicXmu(self.u, Union(*pieces))
 		else:
 			return None
 	
-	def multiplyX(self, i2, alpha):
-		""" Performs X-mu Multiplication at a certain alpha point.
+	def fuzzyArithmeticX(self, i2, operation, alphas=None):
+		""" Performs X-mu Fuzzy Arithmetic over the whole alpha range, and returns a complete X-mu result.
+		Where both X-mu functions are a single interval with linear endpoints (e.g. the built-in shapes), addition and subtraction give an exact linear X-mu function, and multiplication of intervals which do not straddle zero gives a closed-form X-mu function in ALPHA: linear where the product of each pair of endpoints is linear (e.g. a fuzzy number times a crisp one), and quadratic otherwise. Otherwise the operation is done in one vectorized pass over an array of alphas, and the result interpolates linearly between them (see linear_arithmetic).
+		@note	A quadratic product has no linear X-mu function, so alphaCut, alphaCuts and the set operations use its exact sympy form, and its mu function solves each endpoint for alpha (see quadraticMuFunction).
+		@param	i2	a target Xmu instance
+		@param	operation	One of the following: +, -, *, /, **
+		@param	alphas	the alphas to evaluate at when no closed form exists (default: 101 equally spaced alphas)
+		@return	an BasicXmu instance """
+		l1 = self.get_linear_xequals()
+		l2 = i2.get_linear_xequals()
+		single = l1 is not None and l2 is not None and len(l1.pieces) == 1 and len(l2.pieces) == 1 and len(l1.pieces[0]) == 1 and len(l2.pieces[0]) == 1
+		linear = None
+		if single and operation == "*":
+			ls1, li1, hs1, hi1 = l1.pieces[0][0]
+			ls2, li2, hs2, hi2 = l2.pieces[0][0]
+			a = ((ls1, li1), (hs1, hi1))
+			b = ((ls2, li2), (hs2, hi2))
+			# the support (alpha = 0.0) contains every cut, so its sign fixes which endpoints pair up
+			a_sign = 1 if li1 >= 0.0 else (-1 if hi1 <= 0.0 else 0)
+			b_sign = 1 if li2 >= 0.0 else (-1 if hi2 <= 0.0 else 0)
+			pairs = {
+				(1, 1): ((0, 0), (1, 1)),
+				(1, -1): ((1, 0), (0, 1)),
+				(-1, 1): ((0, 1), (1, 0)),
+				(-1, -1): ((1, 1), (0, 0)),
+			}
+			if (a_sign, b_sign) in pairs:
+				ends = [(a[i], b[j]) for i, j in pairs[(a_sign, b_sign)]]
+				# (s1*ALPHA + c1) * (s2*ALPHA + c2) = s1*s2*ALPHA**2 + (s1*c2 + s2*c1)*ALPHA + c1*c2
+				lo, hi = [(first[0] * second[0], first[0] * second[1] + second[0] * first[1], first[1] * second[1]) for first, second in ends]
+				if lo[0] == 0.0 and hi[0] == 0.0:
+					linear = LinearXmuFunction.from_interval(lo[1:], hi[1:])
+				else:
+					result = BasicXmu(self.u, Interval(lo[0] * ALPHA**2 + lo[1] * ALPHA + lo[2], hi[0] * ALPHA**2 + hi[1] * ALPHA + hi[2]))
+					result.set_muequals(Xmu.quadraticMuFunction(lo, hi))
+					return result
+		if linear is None:
+			linear = linear_arithmetic(self, i2, operation, alphas)
+		result = BasicXmu(self.u)
+		result.set_linear_xequals(linear)
+		result.set_xequals_builder(linear.to_sympy)
+		return result
+	
+	@staticmethod
+	def quadraticMuFunction(lo, hi):
+		""" Builds the mu function of a single-interval X-mu function whose endpoints are quadratic in ALPHA (e.g. a product of two fuzzy numbers). Each x is solved for alpha in closed form: from the lower endpoint on the rising side, and from the upper endpoint on the falling side. Primarily used as a private method.
+		@param	lo	the (a, b, c) coefficients of the lower endpoint a*ALPHA**2 + b*ALPHA + c, which is nondecreasing for alpha in [0, 1]
+		@param	hi	the coefficients of the upper endpoint, which is nonincreasing
+		@return	a sympy Piecewise in x """
+		x = Xmu.x
+		# a root of a*alpha**2 + b*alpha + c = x, in the form which becomes (x - c)/b as a vanishes (and so is the root in [0, 1])
+		rising = 2 * (x - lo[2]) / (lo[1] + sqrt(lo[1]**2 + 4 * lo[0] * (x - lo[2])))
+		falling = 2 * (x - hi[2]) / (hi[1] - sqrt(hi[1]**2 + 4 * hi[0] * (x - hi[2])))
+		lo0, lo1 = lo[2], sum(lo)
+		hi0, hi1 = hi[2], sum(hi)
+		parts = []
+		if lo0 < lo1:
+			parts.append((rising, (lo0 < x) & (x < lo1)))
+		parts.append((1.0, (lo1 <= x) & (x <= hi1)))
+		if hi1 < hi0:
+			parts.append((falling, (hi1 < x) & (x < hi0)))
+		parts.append((0.0, True))
+		return Piecewise(*parts)
+	
+	def multiplyX(self, i2, alpha=None, alphas=None):
+		""" Performs X-mu Multiplication, at a certain alpha point or over all alphas.
 		@param	i2	a target interval 
-		@param	alpha	the specified alpha point
-		@note	multiplyX() is a non-symbolic function due to SymPy interactions. Therefore, it must be done at a specific alpha point. """
+		@param	alpha	the specified alpha point, or None for the complete X-mu result
+		@param	alphas	when alpha is None, see fuzzyArithmeticX() """
+		if alpha is None:
+			return self.fuzzyArithmeticX(i2, "*", alphas)
 		return self.arithmeticalOperationX(i2, alpha, "*")
 	
-	def powX(self, i2, alpha):
-		""" Performs X-mu Power at a certain alpha point.
+	def powX(self, i2, alpha=None, alphas=None):
+		""" Performs X-mu Power, at a certain alpha point or over all alphas.
 		@param	i2	a target interval 
-		@param	alpha	the specified alpha point
-		@note	powX() is a non-symbolic function due to SymPy interactions. Therefore, it must be done at a specific alpha point. """
+		@param	alpha	the specified alpha point, or None for the complete X-mu result
+		@param	alphas	when alpha is None, see fuzzyArithmeticX() """
+		if alpha is None:
+			return self.fuzzyArithmeticX(i2, "**", alphas)
 		return self.arithmeticalOperationX(i2, alpha, "**")
 	
-	def addX(self, i2, alpha):
-		""" Performs X-mu Addition at a certain alpha point.
+	def addX(self, i2, alpha=None, alphas=None):
+		""" Performs X-mu Addition, at a certain alpha point or over all alphas.
 		@param	i2	a target interval 
-		@param	alpha	the specified alpha point
-		@note	addX() is a non-symbolic function due to SymPy interactions. Therefore, it must be done at a specific alpha point. """
+		@param	alpha	the specified alpha point, or None for the complete X-mu result
+		@param	alphas	when alpha is None, see fuzzyArithmeticX() """
+		if alpha is None:
+			return self.fuzzyArithmeticX(i2, "+", alphas)
 		return self.arithmeticalOperationX(i2, alpha, "+")
 	
-	def subX(self, i2, alpha):
-		""" Performs X-mu Subtraction at a certain alpha point.
+	def subX(self, i2, alpha=None, alphas=None):
+		""" Performs X-mu Subtraction, at a certain alpha point or over all alphas.
 		@param	i2	a target interval 
-		@param	alpha	the specified alpha point
-		@note	subX() is a non-symbolic function due to SymPy interactions. Therefore, it must be done at a specific alpha point. """
+		@param	alpha	the specified alpha point, or None for the complete X-mu result
+		@param	alphas	when alpha is None, see fuzzyArithmeticX() """
+		if alpha is None:
+			return self.fuzzyArithmeticX(i2, "-", alphas)
 		return self.arithmeticalOperationX(i2, alpha, "-")
 	
-	def divX(self, i2, alpha):
-		""" Performs X-mu Division at a certain alpha point.
+	def divX(self, i2, alpha=None, alphas=None):
+		""" Performs X-mu Division, at a certain alpha point or over all alphas.
 		@param	i2	a target interval 
-		@param	alpha	the specified alpha point
-		@note	divX() is a non-symbolic function due to SymPy interactions. Therefore, it must be done at a specific alpha point. """
+		@param	alpha	the specified alpha point, or None for the complete X-mu result
+		@param	alphas	when alpha is None, see fuzzyArithmeticX() """
+		if alpha is None:
+			return self.fuzzyArithmeticX(i2, "/", alphas)
 		return self.arithmeticalOperationX(i2, alpha, "/")
 		
 class BasicXmu(Xmu):
 	""" BasicXmu is a wrapper class around an Xmu function so that we can perform set theoretic operations, thereupon. All X-mu Set Theoretic operations return an instance of this BasicXmu class. """
+	__slots__ = ()
 	func = Piecewise((0, True))
 	def __init__(self, u, func = None):
 		Xmu.__init__(self, u)
 		if func is not None:
 			self.set_xequals(func)
+	
+	def buildMuKernel(self):
+		""" Compiles the membership kernel. When no mu function has been set, memberships are computed from the (linear) X-mu function.
+		@return	a function taking a NumPy array of x values and returning a NumPy array of memberships """
+		linear = self.get_linear_xequals()
+		if self.muequals is Xmu.default_muequals and linear is not None:
+			return linear.membership
+		return Xmu.buildMuKernel(self)
+
+
+class LazyXmu(Xmu):
+	""" LazyXmu is a node in a graph of X-mu set operations. unionX, intersectX and differenceX build new nodes without computing anything; the graph is evaluated on demand (e.g. by alphaCut, mu_at or get_xequals), and the result is kept until one of the wrapped Xmu objects changes.
+	Evaluation shares common subexpressions (nodes with the same structural key are computed once), and when every wrapped Xmu object has a linear X-mu function, the whole graph is fused into a single LinearXmuFunction.combine sweep, so no intermediate results are built. """
+	
+	__slots__ = ("operation", "operands", "evaluated", "evaluated_key")
+	
+	def __init__(self, u, operation=None, operands=()):
+		""" Initialises a LazyXmu node. Lazy nodes never hold a mu function of their own; the base Xmu slots are filled as for any Xmu, but are not used.
+		@param	u	the universe
+		@param	operation	One of the following: union, intersect, difference; or None for a leaf wrapping a single Xmu object
+		@param	operands	a tuple of Xmu instances: (an Xmu to wrap) for a leaf, or (self, target) for an operation
+		@return	an instantiated LazyXmu object """
+		Xmu.__init__(self, u)
+		self.operation = operation
+		self.operands = tuple(operands)
+		self.evaluated = None
+		self.evaluated_key = None
+	
+	def lazy(self):
+		return self
+	
+	def setOperationX(self, target, operation):
+		""" Builds a new node for an X-mu set operation, without evaluating anything.
+		@param	target	an Xmu instance.
+		@param	operation	One of the following: union, intersect, difference
+		@return	a LazyXmu instance; or a DiscreteXmu, when the target is one (see Xmu.setOperationX) """
+		if isinstance(target, DiscreteXmu):
+			return Xmu.setOperationX(self, target, operation)
+		return LazyXmu(self.u, operation, (self, target))
+	
+	def get_xequals_key(self, memo=None):
+		""" Gets a structural key for this operation graph. This is worked out afresh each time, as the wrapped Xmu objects may change.
+		@param	memo	a dict of keys already worked out, by node id (used internally)
+		@return	a hashable tuple """
+		if memo is None:
+			memo = {}
+		if id(self) not in memo:
+			keys = []
+			for operand in self.operands:
+				if isinstance(operand, LazyXmu):
+					keys.append(operand.get_xequals_key(memo))
+				else:
+					keys.append(operand.get_xequals_key())
+			if self.operation is None:
+				memo[id(self)] = keys[0]
+			else:
+				memo[id(self)] = (self.operation, self.u) + tuple(keys)
+		return memo[id(self)]
+	
+	def evaluate(self):
+		""" Evaluates the operation graph, or returns the result of the last evaluation if nothing has changed since.
+		@return	an Xmu instance """
+		key = self.get_xequals_key()
+		if self.evaluated is None or self.evaluated_key != key:
+			self.evaluated = self.compute()
+			self.evaluated_key = key
+		return self.evaluated
+	
+	def compute(self):
+		""" Evaluates the operation graph. Primarily used as a private method.
+		The graph is flattened into a list of slots, one per distinct structural key: a slot is either a leaf (a wrapped Xmu object) or an (operation, slot, slot) instruction.
+		@return	an Xmu instance """
+		slots = []
+		registers = {}
+		memo = {}
+		def visit(node):
+			if isinstance(node, LazyXmu):
+				key = node.get_xequals_key(memo)
+			else:
+				key = node.get_xequals_key()
+			if key not in registers:
+				if isinstance(node, LazyXmu) and node.operation is None:
+					registers[key] = visit(node.operands[0])
+				elif isinstance(node, LazyXmu):
+					a = visit(node.operands[0])
+					b = visit(node.operands[1])
+					slots.append((node.operation, a, b, node.u))
+					registers[key] = len(slots) - 1
+				else:
+					slots.append((None, node))
+					registers[key] = len(slots) - 1
+			return registers[key]
+		visit(self)
+		
+		if len(slots) == 1:
+			return slots[0][1]
+		leaves = [slot[1] for slot in slots if slot[0] is None]
+		functions = [leaf.get_linear_xequals() for leaf in leaves]
+		if None not in functions:
+			return self.canonicalXmu(LinearXmuFunction.combine(functions, LazyXmu.compile_predicate(slots)))
+		
+		# some X-mu functions are not linear: evaluate eagerly, once per slot
+		results = []
+		for slot in slots:
+			if slot[0] is None:
+				results.append(slot[1])
+			else:
+				operation, a, b, u = slot
+				results.append(results[a].computeSetOperationX(results[b], operation))
+		return results[-1]
+	
+	@staticmethod
+	def compile_predicate(slots):
+		""" Compiles a list of slots into a predicate for LinearXmuFunction.combine, which takes the memberships of the leaves (in slot order) and evaluates each instruction once.
+		@param	slots	see compute()
+		@return	a function taking a list of booleans and returning a boolean """
+		program = []
+		leaf = 0
+		for slot in slots:
+			if slot[0] is None:
+				program.append((None, leaf, None))
+				leaf += 1
+			else:
+				program.append(slot[:3])
+		def predicate(memberships):
+			values = []
+			for operation, a, b in program:
+				if operation is None:
+					values.append(memberships[a])
+				elif operation == "union":
+					values.append(values[a] or values[b])
+				elif operation == "intersect":
+					values.append(values[a] and values[b])
+				else:
+					values.append(values[a] and not values[b])
+			return values[-1]
+		return predicate
+	
+	def get_xequals(self):
+		return self.evaluate().get_xequals()
+	
+	def get_xequals_builder(self):
+		return self.evaluate().get_xequals_builder()
+	
+	def get_linear_xequals(self):
+		return self.evaluate().get_linear_xequals()
+	
+	def get_muequals(self):
+		return self.evaluate().get_muequals()
+	
+	def get_mu_kernel(self):
+		return self.evaluate().get_mu_kernel()
+	
+	def to_payload(self):
+		return self.evaluate().to_payload()
+	
+	def compile(self, alphas=None):
+		return self.evaluate().compile(alphas)
+	
+	def invertX(self, tolerance=None, samples=1025):
+		return self.evaluate().invertX(tolerance, samples)
+	
+	def set_xequals(self, func):
+		raise TypeError("A LazyXmu is defined by its operation graph; call evaluate() for a result that can be changed")
+	
+	def set_muequals(self, func):
+		raise TypeError("A LazyXmu is defined by its operation graph; call evaluate() for a result that can be changed")
 
 
 class UpwardGradientXmu(Xmu):
 	""" UpwardGradientXmu provides the basis for creating upward straight-line membership functions, and generates the X-mu function automatically. """
-	a = 0.0
-	b = 0.0
+	__slots__ = ("a", "b")
 	
 	def __init__(self, u, a = None, b = None):
 		""" Initialises the UpwardGradientXmu, and prepares its superclass (Xmu).
@@ -230,6 +809,8 @@ class UpwardGradientXmu(Xmu):
 		@param	b	is the point where mu becomes 1.0
 		@returns	an instance of UpwardGradientXmu
 		"""
+		self.a = 0.0
+		self.b = 0.0
 		Xmu.__init__(self, u)
 		if a is not None and b is not None:
 			self.setMuFunction(float(a), float(b))
@@ -257,6 +838,7 @@ class UpwardGradientXmu(Xmu):
 			(0.0, True)
 		)
 		self.set_muequals(p)
+		self.mu_kernel = trapezoidal_kernel(self.a, self.b, float('inf'), float('inf'))
 		return p
 
 	def setXFunction(self, a, b):
@@ -271,14 +853,15 @@ class UpwardGradientXmu(Xmu):
 		i = Interval(((ALPHA*self.b) - (ALPHA*self.a) + self.a), self.u.sup)
 		
 		self.set_xequals(i)
+		self.set_linear_xequals(LinearXmuFunction.from_interval((self.b - self.a, self.a), (0.0, self.u.sup)))
+		self.parameters = (self.a, self.b)
 		return i
 
 
 class DownwardGradientXmu(Xmu):
 	""" DownwardGradientXmu provides the basis for creating downward straight-line membership functions, and generates the X-mu function automatically. """
 	
-	a = 0.0
-	b = 0.0
+	__slots__ = ("a", "b")
 	
 	def __init__(self, u, a = None, b = None):
 		""" Initialises the DownwardGradientXmu, and prepares its superclass (Xmu).
@@ -286,6 +869,8 @@ class DownwardGradientXmu(Xmu):
 		@param	b	is the point where mu becomes 0.0
 		@returns	an instance of DownwardGradientXmu
 		"""
+		self.a = 0.0
+		self.b = 0.0
 		Xmu.__init__(self, u)
 		if a is not None and b is not None:
 			self.setMuFunction(float(a), float(b))
@@ -313,6 +898,7 @@ class DownwardGradientXmu(Xmu):
 			(0.0, True)
 		)
 		self.set_muequals(p)
+		self.mu_kernel = trapezoidal_kernel(float('-inf'), float('-inf'), self.a, self.b)
 		return p
 
 	def setXFunction(self, a, b):
@@ -329,15 +915,14 @@ class DownwardGradientXmu(Xmu):
 		i = Interval(self.u.inf, f)
 		
 		self.set_xequals(i)
+		self.set_linear_xequals(LinearXmuFunction.from_interval((0.0, self.u.inf), (self.a - self.b, self.b)))
+		self.parameters = (self.a, self.b)
 		return i
 
 class TrapezoidalXmu(Xmu):
 	""" TrapezoidalXmu provides the basis for creating Trapezoidal straight-line membership functions, and generates the X-mu function automatically. """
 	
-	a = 0.0
-	b = 0.0
-	c = 0.0
-	d = 0.0
+	__slots__ = ("a", "b", "c", "d")
 	
 	def __init__(self, u, a = None, b = None, c = None, d = None):
 		""" Initialises the TrapezoidalXmu, and prepares its superclass (Xmu).
@@ -347,6 +932,10 @@ class TrapezoidalXmu(Xmu):
 		@param	d	is the point where mu becomes 0.0 again
 		@returns	an instance of TrapezoidalXmu
 		"""
+		self.a = 0.0
+		self.b = 0.0
+		self.c = 0.0
+		self.d = 0.0
 		Xmu.__init__(self, u)
 		if a is not None and b is not None and c is not None and d is not None:
 			self.setMuFunction(float(a), float(b), float(c), float(d))
@@ -383,6 +972,7 @@ class TrapezoidalXmu(Xmu):
 			(0.0, True)
 		)
 		self.set_muequals(p)
+		self.mu_kernel = trapezoidal_kernel(self.a, self.b, self.c, self.d)
 		return p
 		
 		return None
@@ -408,14 +998,14 @@ class TrapezoidalXmu(Xmu):
 		i = Interval(f, g)
 		
 		self.set_xequals(i)
+		self.set_linear_xequals(LinearXmuFunction.from_interval((self.b - self.a, self.a), (self.c - self.d, self.d)))
+		self.parameters = (self.a, self.b, self.c, self.d)
 		return i
 
 class TriangularXmu(Xmu):
 	""" TriangularXmu provides the basis for creating TriangularXmu straight-line membership functions, and generates the X-mu function automatically. """
 	
-	a = 0.0
-	b = 0.0
-	c = 0.0
+	__slots__ = ("a", "b", "c", "d")
 	
 	def __init__(self, u, a = None, b = None, c = None):
 		""" Initialises the TriangularXmu, and prepares its superclass (Xmu).
@@ -424,6 +1014,10 @@ class TriangularXmu(Xmu):
 		@param	c	is the point where mu becomes 0.0 again
 		@returns	an instance of TriangularXmu
 		"""
+		self.a = 0.0
+		self.b = 0.0
+		self.c = 0.0
+		self.d = 0.0
 		Xmu.__init__(self, u)
 		if a is not None and b is not None and c is not None:
 			self.setMuFunction(float(a), float(b), float(c))
@@ -449,6 +1043,7 @@ class TriangularXmu(Xmu):
 			(0.0, True)
 		)
 		self.set_muequals(p)
+		self.mu_kernel = trapezoidal_kernel(self.a, self.b, self.c, self.d)
 		return p
 	
 	def setXFunction(self, a, b, c):
@@ -470,26 +1065,508 @@ class TriangularXmu(Xmu):
 		i = Interval(f, g)
 		
 		self.set_xequals(i)
+		self.set_linear_xequals(LinearXmuFunction.from_interval((self.b - self.a, self.a), (self.b - self.c, self.c)))
+		self.parameters = (self.a, self.b, self.c)
 		return i
 
+##### Parallel Evaluation ####################
+
+PAYLOAD_SHAPES = {
+	"UpwardGradientXmu": UpwardGradientXmu,
+	"DownwardGradientXmu": DownwardGradientXmu,
+	"TrapezoidalXmu": TrapezoidalXmu,
+	"TriangularXmu": TriangularXmu,
+}
+
+PARALLEL_OPERATIONS = set([
+	"unionX", "intersectX", "differenceX", "negateX",
+	"addX", "subX", "multiplyX", "divX", "powX",
+])
+
+def xmu_from_payload(payload):
+	""" Rebuilds an Xmu object from a payload.
+	@param	payload	a tuple from Xmu.to_payload
+	@return	an Xmu instance """
+	kind = payload[0]
+	u = Interval(*payload[1])
+	if kind in PAYLOAD_SHAPES:
+		return PAYLOAD_SHAPES[kind](u, *payload[2])
+	if kind == "linear":
+		linear = LinearXmuFunction(payload[2], payload[3])
+		result = BasicXmu(u)
+		result.set_linear_xequals(linear)
+		result.set_xequals_builder(linear.to_sympy)
+		return result
+	if kind == "sympy":
+		result = BasicXmu(u, payload[2])
+		if payload[3] is not Xmu.default_muequals:
+			result.set_muequals(payload[3])
+		return result
+	raise ValueError("Unknown payload kind: " + str(kind))
+
+def apply_steps(xmu, steps, convert=None):
+	""" Applies a chain of operations (see evaluate_parallel). Primarily used as a private method.
+	@param	xmu	the first operand
+	@param	steps	a list of (method name, operand or None)
+	@param	convert	a function applied to each operand before use (e.g. xmu_from_payload), or None
+	@return	the result of the last step """
+	result = xmu
+	for name, argument in steps:
+		if name not in PARALLEL_OPERATIONS:
+			raise ValueError("Operation not allowed: " + str(name))
+		if argument is None:
+			result = getattr(result, name)()
+		else:
+			result = getattr(result, name)(argument if convert is None else convert(argument))
+	return result
+
+def describe_result(result, alphas=None, X=None):
+	""" Builds the result dict of an evaluated task. Primarily used as a private method.
+	@return	a dict: {"ok": True, "cuts": ..., "memberships": ...} """
+	output = {"ok": True}
+	if alphas is not None:
+		output["cuts"] = [result.alphaCut(alpha) for alpha in alphas]
+	if X is not None:
+		output["memberships"] = result.mu_at(X)
+	return output
+
+def evaluate_payload_task(task, alphas=None, X=None):
+	""" Evaluates one task of evaluate_parallel in a worker process. Errors are captured rather than raised.
+	@param	task	a tuple of (payload, steps), where steps is a list of (method name, payload or None)
+	@param	alphas	alphas at which to return the cuts of the result, or None
+	@param	X	a NumPy array of x values at which to return memberships of the result, or None
+	@return	a dict: {"ok": True, "payload": ..., "cuts": ..., "memberships": ...}, or {"ok": False, "error": a traceback string} """
+	try:
+		payload, steps = task
+		result = apply_steps(xmu_from_payload(payload), steps, xmu_from_payload)
+		output = describe_result(result, alphas, X)
+		output["payload"] = result.to_payload()
+		return output
+	except Exception:
+		return {"ok": False, "error": traceback.format_exc()}
+
+class PayloadTaskRunner(object):
+	""" A picklable callable for multiprocessing, carrying the alphas and x values shared by every task. """
+	
+	def __init__(self, alphas, X):
+		self.alphas = alphas
+		self.X = X
+	
+	def __call__(self, task):
+		if isinstance(task, dict):
+			return task # a task whose payload could not be built
+		return evaluate_payload_task(task, self.alphas, self.X)
+
+def evaluate_parallel(tasks, alphas=None, X=None, processes=None, chunksize=None):
+	""" Evaluates many independent Xmu objects or operation chains across a process pool. Each task is sent as a compact payload (see Xmu.to_payload) rather than as pickled sympy trees, and results come back in input order, with errors captured per task.
+	@param	tasks	a list whose items are either an Xmu (or NumericXmu) instance, or a tuple (Xmu instance, steps) where steps is a list of (method name, Xmu instance or None), e.g. (small, [("unionX", large), ("differenceX", medium)]). Allowed methods are those in PARALLEL_OPERATIONS.
+	@param	alphas	alphas at which to return the cuts of each result, or None
+	@param	X	x values at which to return the memberships of each result, or None
+	@param	processes	the number of worker processes (default: the number of CPUs); 1 runs in this process, without a pool
+	@param	chunksize	the number of tasks sent to a worker at a time (default: spread evenly, four chunks per worker)
+	@return	a list of result dicts, in input order (see evaluate_payload_task). A task whose payload cannot be built is reported like any other failed task """
+	payloads = []
+	for task in tasks:
+		try:
+			if isinstance(task, (Xmu, NumericXmu)):
+				xmu, steps = task, []
+			else:
+				xmu, steps = task
+			payloads.append((xmu.to_payload(), [(name, None if argument is None else argument.to_payload()) for name, argument in steps]))
+		except Exception:
+			payloads.append({"ok": False, "error": traceback.format_exc()})
+	if X is not None:
+		X = numpy.asarray(X, dtype=float)
+	runner = PayloadTaskRunner(alphas, X)
+	
+	if processes is None:
+		processes = multiprocessing.cpu_count()
+	if processes <= 1 or len(payloads) <= 1:
+		return [runner(payload) for payload in payloads]
+	if chunksize is None:
+		chunksize = max(1, len(payloads) // (processes * 4))
+	pool = multiprocessing.Pool(processes)
+	try:
+		return pool.map(runner, payloads, chunksize)
+	finally:
+		pool.close()
+		pool.join()
+
+class CompiledTaskRunner(object):
+	""" A callable for ThreadPool, evaluating a task of compiled operands. Errors are captured rather than raised. """
+	
+	def __init__(self, alphas, X):
+		self.alphas = alphas
+		self.X = X
+	
+	def __call__(self, task):
+		if isinstance(task, dict):
+			return task # a task which could not be compiled
+		try:
+			result = apply_steps(*task)
+			output = describe_result(result, self.alphas, self.X)
+			output["result"] = result
+			return output
+		except Exception:
+			return {"ok": False, "error": traceback.format_exc()}
+
+def evaluate_threaded(tasks, alphas=None, X=None, threads=None, pool=None):
+	""" Evaluates many independent Xmu objects or operation chains on a thread pool, e.g. the concurrent requests of a web server. Every operand is first compiled (see Xmu.compile) in the calling thread, so the threads only touch immutable CompiledXmu objects and NumPy, and never SymPy. NumPy releases the GIL for large arrays, so large memberships and cuts run in parallel; small tasks mostly gain from not blocking one another.
+	@param	tasks	as for evaluate_parallel; CompiledXmu operands are used as they are. A task whose operands cannot be compiled is reported like any other failed task
+	@param	alphas	alphas at which to return the cuts of each result, or None
+	@param	X	x values at which to return the memberships of each result, or None
+	@param	threads	the number of threads of a new pool (default: the number of CPUs); ignored when pool is given
+	@param	pool	a multiprocessing.pool.ThreadPool to reuse between calls, or None for a pool per call
+	@return	a list of result dicts, in input order: {"ok": True, "result": a CompiledXmu, "cuts": ..., "memberships": ...}, or {"ok": False, "error": a traceback string} """
+	compiled = []
+	for task in tasks:
+		try:
+			if isinstance(task, (Xmu, NumericXmu)):
+				xmu, steps = task, []
+			else:
+				xmu, steps = task
+			compiled.append((xmu.compile(), [(name, None if argument is None else argument.compile()) for name, argument in steps]))
+		except Exception:
+			compiled.append({"ok": False, "error": traceback.format_exc()})
+	if X is not None:
+		X = numpy.asarray(X, dtype=float)
+	runner = CompiledTaskRunner(alphas, X)
+	
+	if pool is not None:
+		return pool.map(runner, compiled)
+	if threads is None:
+		threads = multiprocessing.cpu_count()
+	if threads <= 1 or len(compiled) <= 1:
+		return [runner(task) for task in compiled]
+	pool = ThreadPool(threads)
+	try:
+		return pool.map(runner, compiled)
+	finally:
+		pool.close()
+		pool.join()
+
+###############################################
+
+
+class LinguisticVariable(object):
+	""" LinguisticVariable holds a named set of Xmu terms (e.g. small, medium and large) over a shared universe u, and keeps an index of where each term has nonzero membership, so that the terms which fire at a value can be found without looking at every term.
+	The index is a sorted array of span endpoints (searchsorted), where a term's span is an interval holding all of its alpha-cuts (see span). The endpoints split the real line into atoms: the open gaps between endpoints, and the endpoints themselves. For every atom it stores which terms' spans cover it. A lookup is one binary search, after which only those candidate terms are evaluated.
+	@note	If a term is changed after it is added (e.g. with setAB), call build_index() again. """
+	
+	def __init__(self, u, terms=None):
+		""" Initialises the LinguisticVariable.
+		@param	u	the universe shared by all terms (a sympy interval)
+		@param	terms	an optional list of (name, Xmu instance) pairs
+		@return	an instantiated LinguisticVariable object """
+		self.u = u
+		self.names = []
+		self.terms = []
+		self.breakpoints = None
+		self.cover = None
+		self.candidates = None
+		self.supports = None
+		self.spans = None
+		if terms is not None:
+			for name, term in terms:
+				self.add_term(name, term)
+	
+	def __len__(self):
+		return len(self.terms)
+	
+	def __getitem__(self, name):
+		return self.terms[self.names.index(name)]
+	
+	def add_term(self, name, term):
+		""" Adds a term to the variable. The index is rebuilt when next needed.
+		@param	name	the name of the term (e.g. "large")
+		@param	term	an Xmu instance """
+		if name in self.names:
+			raise ValueError("Duplicate term name: " + str(name))
+		self.names.append(name)
+		self.terms.append(term)
+		self.breakpoints = None
+	
+	@staticmethod
+	def span(term, samples=101):
+		""" Finds an interval holding every alpha-cut of a term. The cut at 0.0 is not enough, as cuts need not be nested: e.g. DownwardGradientXmu(u, 2, 4).differenceX(TrapezoidalXmu(u, 2, 4, 6, 8)) has [0, 2] as its cut at 0.0, but nonzero membership on (2, 3). The span is the hull of every cut: exact for a linear X-mu function, and otherwise taken from the cuts at a number of alphas.
+		@param	term	an Xmu instance
+		@param	samples	the number of alphas at which an X-mu function without a linear form is cut
+		@return	a list holding one (inf, sup) tuple, or an empty list if every cut is empty """
+		linear = term.get_linear_xequals()
+		if linear is not None:
+			hull = linear.hull()
+		else:
+			lows, highs = term.alphaCuts(numpy.linspace(0.0, 1.0, samples))
+			hull = None if numpy.isnan(lows).all() else (float(numpy.nanmin(lows)), float(numpy.nanmax(highs)))
+		return [] if hull is None else [hull]
+	
+	def build_index(self):
+		""" (Re)builds the breakpoint index from the spans of the terms (see span). The supports (alpha-cuts at 0.0) are kept too, for alpha-cut containment at alpha 0.0. """
+		self.supports = [term.alphaCut(0.0) for term in self.terms]
+		spans = [LinguisticVariable.span(term) for term in self.terms]
+		self.spans = spans
+		self.breakpoints = numpy.unique([v for span in spans for interval in span for v in interval])
+		n = len(self.breakpoints)
+		self.cover = numpy.zeros((2 * n + 1, len(self.terms)), dtype=bool)
+		for j, span in enumerate(spans):
+			for lo, hi in span:
+				l = numpy.searchsorted(self.breakpoints, lo)
+				h = numpy.searchsorted(self.breakpoints, hi)
+				self.cover[2 * l + 1:2 * h + 2, j] = True
+		self.candidates = [numpy.flatnonzero(row) for row in self.cover]
+	
+	def atoms(self, X):
+		""" Finds the index atoms holding some values, by binary search.
+		@param	X	a NumPy array of values
+		@return	a NumPy array of atom numbers: 2i+1 is the i-th breakpoint, and 2i is the gap just below it """
+		if self.breakpoints is None:
+			self.build_index()
+		if len(self.breakpoints) == 0:
+			return numpy.zeros(numpy.shape(X), dtype=int)
+		i = numpy.searchsorted(self.breakpoints, X)
+		at = self.breakpoints[numpy.minimum(i, len(self.breakpoints) - 1)] == X
+		return 2 * i + at
+	
+	def terms_at(self, x, alpha=None):
+		""" Finds the terms which fire at a single value, in O(log n) plus the number of candidate terms.
+		@param	x	a value
+		@param	alpha	None for all terms with nonzero membership at x; otherwise all terms whose alpha-cut contains x (at alpha 0.0, the closure of the support: nonzero membership, or x in the cut at 0.0)
+		@return	a list of term names """
+		x = float(x)
+		atom = int(self.atoms(x))
+		result = []
+		for j in self.candidates[atom]:
+			mu = float(self.terms[j].mu_at(x))
+			if alpha is None:
+				fires = mu > 0.0
+			elif alpha <= 0.0:
+				fires = mu > 0.0 or any(lo <= x <= hi for lo, hi in self.supports[j])
+			else:
+				fires = mu >= alpha
+			if fires:
+				result.append(self.names[j])
+		return result
+	
+	def memberships(self, X):
+		""" Evaluates the membership of many values in every term, in one vectorized pass per term. The values are sorted once, so that each term is only evaluated on the slice of values inside its support.
+		@param	X	a NumPy array of values
+		@return	a NumPy array of shape (number of terms,) + X.shape """
+		if self.breakpoints is None:
+			self.build_index()
+		X = numpy.asarray(X, dtype=float)
+		flat = X.ravel()
+		order = numpy.argsort(flat, kind='mergesort')
+		ordered = flat[order]
+		result = numpy.zeros((len(self.terms), flat.size))
+		for j, term in enumerate(self.terms):
+			for lo, hi in self.spans[j]:
+				a = numpy.searchsorted(ordered, lo, 'left')
+				b = numpy.searchsorted(ordered, hi, 'right')
+				if b > a:
+					result[j, order[a:b]] = term.mu_at(ordered[a:b])
+		return result.reshape((len(self.terms),) + X.shape)
+	
+	def terms_mask(self, X, alpha=None):
+		""" The vectorized form of terms_at.
+		@param	X	a NumPy array of values
+		@param	alpha	None for nonzero membership; otherwise alpha-cut containment
+		@return	a boolean NumPy array of shape (number of terms,) + X.shape """
+		X = numpy.asarray(X, dtype=float)
+		mu = self.memberships(X)
+		if alpha is None:
+			return mu > 0.0
+		if alpha <= 0.0:
+			inside = numpy.zeros(mu.shape, dtype=bool)
+			for j, support in enumerate(self.supports):
+				for lo, hi in support:
+					inside[j] |= (lo <= X) & (X <= hi)
+			return (mu > 0.0) | inside
+		return mu >= alpha
+	
+	def stream(self, values, chunksize=65536, alpha=None):
+		""" Classifies a (possibly unbounded) stream of values in chunks, so memory use depends on chunksize rather than on the size of the input. This is a generator, and nothing is kept between chunks.
+		@param	values	a NumPy array (including a numpy.memmap, which is only read one chunk at a time), or any iterable of numbers or numeric strings (e.g. a column read with the csv module)
+		@param	chunksize	the number of values per chunk
+		@param	alpha	None to yield memberships; otherwise alpha-cut containment is yielded instead
+		@return	yields a dict per chunk, with "start" (the offset of the chunk), "values", "names", either "memberships" (a NumPy array of shape (number of terms, chunk length)) or "mask" (a boolean array of the same shape), "seconds" (time spent on the chunk) and "throughput" (values per second) """
+		if self.breakpoints is None:
+			self.build_index()
+		if hasattr(values, "shape") and hasattr(values, "__getitem__"):
+			chunks = (values[i:i + chunksize] for i in xrange(0, len(values), chunksize))
+		else:
+			iterator = iter(values)
+			chunks = (numpy.fromiter((float(v) for v in itertools.islice(iterator, chunksize)), dtype=float) for _ in itertools.count())
+		start = 0
+		for chunk in chunks:
+			began = time.time()
+			chunk = numpy.asarray(chunk, dtype=float)
+			if chunk.size == 0:
+				break
+			result = {"start": start, "values": chunk, "names": self.names}
+			if alpha is None:
+				result["memberships"] = self.memberships(chunk)
+			else:
+				result["mask"] = self.terms_mask(chunk, alpha)
+			result["seconds"] = time.time() - began
+			result["throughput"] = chunk.size / result["seconds"] if result["seconds"] > 0.0 else float("inf")
+			start += chunk.size
+			yield result
+
+
+class FuzzyRule(object):
+	""" FuzzyRule is a single rule of a RuleBase: IF input1 is term1 AND input2 is term2 ... THEN the consequent. """
+	
+	def __init__(self, antecedents, consequent, weight=1.0):
+		""" Initialises the FuzzyRule.
+		@param	antecedents	a dict of input name to term name, e.g. {"temperature": "hot", "pressure": "low"}; these are joined by AND
+		@param	consequent	for a Mamdani rule base, the name of an output term. For a TSK rule base, a constant, or a list of coefficients [c0, c1, ..., cn] giving c0 + c1*x1 + ... + cn*xn over the inputs in order
+		@param	weight	the weight of the rule, which multiplies its firing strength
+		@return	an instantiated FuzzyRule object """
+		self.antecedents = dict(antecedents)
+		self.consequent = consequent
+		self.weight = float(weight)
+
+
+class RuleBase(object):
+	""" RuleBase is a fuzzy inference engine whose antecedents (and, for Mamdani inference, consequents) are the Xmu terms of LinguisticVariable instances.
+	Before inference the rules are compiled into arrays: a rule-by-input matrix of term indices, and either the consequent memberships sampled on an output grid (Mamdani) or a rule-by-coefficient matrix (TSK). Inference then works on a whole batch of input vectors at once, with no per-rule or per-sample Python loops. """
+	
+	TNORMS = {
+		"min": numpy.minimum,
+		"product": numpy.multiply,
+	}
+	
+	def __init__(self, inputs, output=None, kind="mamdani", tnorm="min", resolution=201):
+		""" Initialises an empty RuleBase.
+		@param	inputs	a list of (input name, LinguisticVariable) pairs, in the order of the columns of the input vectors
+		@param	output	the output LinguisticVariable (Mamdani only)
+		@param	kind	One of the following: mamdani, tsk
+		@param	tnorm	One of the following: min, product. Used for AND, and for Mamdani implication (clipping or scaling)
+		@param	resolution	the number of points of the output grid used for centroid defuzzification (Mamdani only)
+		@return	an instantiated RuleBase object """
+		if kind not in ("mamdani", "tsk"):
+			raise ValueError("Unknown rule base kind: " + str(kind))
+		if kind == "mamdani" and output is None:
+			raise ValueError("A Mamdani rule base needs an output LinguisticVariable")
+		if tnorm not in self.TNORMS:
+			raise ValueError("Unknown t-norm: " + str(tnorm))
+		self.inputs = list(inputs)
+		self.output = output
+		self.kind = kind
+		self.tnorm = tnorm
+		self.resolution = resolution
+		self.rules = []
+		self.compiled = False
+	
+	def add_rule(self, antecedents, consequent, weight=1.0):
+		""" Adds a rule (see FuzzyRule). The rule base is recompiled when next used.
+		@return	the FuzzyRule added """
+		rule = FuzzyRule(antecedents, consequent, weight)
+		self.rules.append(rule)
+		self.compiled = False
+		return rule
+	
+	def compile(self):
+		""" Compiles the rules into arrays. This is done automatically before inference, after any change. """
+		names = [name for name, variable in self.inputs]
+		self.term_index = numpy.full((len(self.rules), len(self.inputs)), -1, dtype=int)
+		for r, rule in enumerate(self.rules):
+			for input_name, term_name in rule.antecedents.items():
+				if input_name not in names:
+					raise ValueError("Unknown input: " + str(input_name))
+				i = names.index(input_name)
+				self.term_index[r, i] = self.inputs[i][1].names.index(term_name)
+		self.weights = numpy.array([rule.weight for rule in self.rules])
+		
+		if self.kind == "mamdani":
+			self.grid = numpy.linspace(float(self.output.u.inf), float(self.output.u.sup), self.resolution)
+			self.consequent_index = numpy.array([self.output.names.index(rule.consequent) for rule in self.rules], dtype=int)
+			self.consequent_mu = self.output.memberships(self.grid)
+		else:
+			self.coefficients = numpy.zeros((len(self.rules), len(self.inputs) + 1))
+			for r, rule in enumerate(self.rules):
+				coefficients = numpy.atleast_1d(numpy.asarray(rule.consequent, dtype=float))
+				self.coefficients[r, :len(coefficients)] = coefficients
+		self.compiled = True
+	
+	def firing_strengths(self, X):
+		""" Computes the firing strength of every rule for a batch of input vectors.
+		@param	X	a NumPy array of shape (N, number of inputs); with a single input, a 1-D array of N values is also accepted
+		@return	a NumPy array of shape (number of rules, N) """
+		if not self.compiled:
+			self.compile()
+		X = numpy.asarray(X, dtype=float).reshape(-1, len(self.inputs))
+		tnorm = self.TNORMS[self.tnorm]
+		strengths = numpy.ones((len(self.rules), len(X)))
+		for i, (name, variable) in enumerate(self.inputs):
+			used = self.term_index[:, i] >= 0
+			if used.any():
+				memberships = variable.memberships(X[:, i])
+				strengths[used] = tnorm(strengths[used], memberships[self.term_index[used, i]])
+		return strengths * self.weights[:, numpy.newaxis]
+	
+	def evaluate(self, X, chunksize=4096):
+		""" Performs inference for a batch of input vectors.
+		Mamdani: the consequents are clipped (min) or scaled (product) by the firing strengths, aggregated by max, and defuzzified by centroid over the output grid. TSK: the weighted average of the rule outputs.
+		@param	X	a NumPy array of shape (N, number of inputs)
+		@param	chunksize	the number of input vectors aggregated at once (Mamdani only), which bounds memory use at chunksize * resolution floats
+		@return	a NumPy array of N outputs; NaN where no rule fires """
+		strengths = self.firing_strengths(X)
+		n = strengths.shape[1]
+		with numpy.errstate(invalid='ignore', divide='ignore'):
+			if self.kind == "tsk":
+				X = numpy.asarray(X, dtype=float).reshape(-1, len(self.inputs))
+				outputs = self.coefficients[:, :1] + self.coefficients[:, 1:].dot(X.T)
+				return (strengths * outputs).sum(axis=0) / strengths.sum(axis=0)
+			
+			# rules sharing a consequent are aggregated first, so each output term is applied once
+			used_terms = numpy.unique(self.consequent_index)
+			per_term = numpy.array([strengths[self.consequent_index == t].max(axis=0) for t in used_terms])
+			tnorm = self.TNORMS[self.tnorm]
+			result = numpy.empty(n)
+			for start in xrange(0, n, chunksize):
+				aggregated = numpy.zeros((min(chunksize, n - start), len(self.grid)))
+				for k, t in enumerate(used_terms):
+					numpy.maximum(aggregated, tnorm(per_term[k, start:start + chunksize, numpy.newaxis], self.consequent_mu[t]), out=aggregated)
+				result[start:start + chunksize] = aggregated.dot(self.grid) / aggregated.sum(axis=1)
+		return result
+
+
 class Graph:
 	""" Graph class extracts the plotting requirements away from the interface. So no need to know matplotlib, and could act as a unifying wrapper in the future.
+	All of its state belongs to the instance. By default it draws with pyplot, whose current figure is shared by the whole process; an isolated Graph owns its own figure instead, so each request of a multi-threaded server can draw (and save_plot) without locks.
 	"""
-	granularity = 100
-	alphas = []
-	plt = None
-	u = Interval(0.0,1.0)
 	
-	def __init__(self, granularity, u):
+	def __init__(self, granularity, u, exact=False, isolated=False):
 		""" Initialises plotting library, and sets the granularity and universe.
 		@param	granularity	the 'resolution' of the generated graph
 		@param	u	the universe of the domain (a sympy interval)
+		@param	exact	if True, X-mu functions are drawn as exact filled polygons between their alpha breakpoints (see draw_linear_xmu), so the granularity is only used for X-mu functions without a linear form
+		@param	isolated	if True, draw on a figure owned by this Graph (with the Agg backend) rather than on pyplot's current figure; the plot can then be saved with save_plot, but not shown
 		@return	an instantiated Graph object
 		"""
-		import matplotlib.pyplot as plt
-		self.plt = plt
+		self.plt = None
+		self.figure = None
+		self.axes = None
+		if isolated:
+			from matplotlib.figure import Figure
+			from matplotlib.backends.backend_agg import FigureCanvasAgg
+			self.figure = Figure()
+			FigureCanvasAgg(self.figure)
+			self.axes = self.figure.add_subplot(111)
+		else:
+			import matplotlib.pyplot as plt
+			self.plt = plt
 		self.set_granularity(granularity)
 		self.set_u(u)
+		self.exact = exact
+	
+	def get_axes(self):
+		""" Gets the axes to draw on: those of this Graph's own figure if it is isolated, otherwise pyplot's current axes.
+		@return	matplotlib axes """
+		if self.axes is not None:
+			return self.axes
+		return self.plt.gca()
 	
 	def set_u(self, u):
 		""" Sets u, the universe.
@@ -518,13 +1595,20 @@ class Graph:
 		@param	colour	the colour of the visualisation of this Xmu object
 		"""
 		self.add_plot(plot, plot_title, colour=colour)
-		self.plt.xlabel('mu')
-		self.plt.xlim(0.0, 1.0)
+		self.label_axes(ylim_top)
+	
+	def label_axes(self, ylim_top=None):
+		""" Sets the labels and limits of the axes. Primarily used as a private method.
+		@param	ylim_top	the maximum limit of the y axis
+		"""
+		axes = self.get_axes()
+		axes.set_xlabel('mu')
+		axes.set_xlim(0.0, 1.0)
 		if ylim_top == None:
-			self.plt.ylim(float(self.u.inf), float(self.u.sup))
+			axes.set_ylim(float(self.u.inf), float(self.u.sup))
 		else:
-			self.plt.ylim(float(self.u.inf), float(ylim_top))
-		self.plt.ylabel('X')
+			axes.set_ylim(float(self.u.inf), float(ylim_top))
+		axes.set_ylabel('X')
 		
 	
 	def add_plot(self, plot, plot_title, colour=None):
@@ -533,11 +1617,15 @@ class Graph:
 		@param	plot_title	the title of the Xmu object
 		@param	colour	the colour of the visualisation of this Xmu object
 		"""
+		if self.exact:
+			draw_linear_xmu(self.get_axes(), linear_form(plot, self.u, self.alphas), self.u, plot_title, colour)
+			return
+		
 		if isinstance(plot, Xmu):
 			plot = plot.get_xequals()
 		
 		if colour is None:
-			colour = rand(3,1)
+			colour = numpy.random.rand(3)
 		
 		plot_xss_length = []
 		plot_xss_start = []
@@ -546,17 +1634,17 @@ class Graph:
 			subs = plot.subs(ALPHA, i)
 			if not subs.is_EmptySet:
 				if type(subs.args[0]) is not Interval:
-					plot_xss_length.append(subs.sup - subs.inf)
-					plot_xss_start.append(subs.inf)
+					plot_xss_length.append(float(subs.sup - subs.inf))
+					plot_xss_start.append(float(subs.inf))
 					plot_alphas.append(i)
 				else: # type(subs.args[0]) is Interval
 					for part in subs.args:
-						plot_xss_length.append(part.sup - part.inf)
-						plot_xss_start.append(part.inf)
+						plot_xss_length.append(float(part.sup - part.inf))
+						plot_xss_start.append(float(part.inf))
 						plot_alphas.append(i)
 		
 		if(len(plot_alphas) > 0):
-			self.plt.bar(left=plot_alphas, height=plot_xss_length, bottom=plot_xss_start, width=1.0/self.granularity, alpha=0.3, linewidth=0, label=plot_title, color=colour)
+			self.get_axes().bar(left=plot_alphas, height=plot_xss_length, bottom=plot_xss_start, width=1.0/self.granularity, alpha=0.3, linewidth=0, label=plot_title, color=colour)
 		else:
 			print "Nothing to plot"
 	
@@ -571,13 +1659,7 @@ class Graph:
 		@param	ylim_top	the top limit for the y axis.
 		"""
 		self.add_arithmetic_plot(A_interval, B_interval, func, plot_title)
-		self.plt.xlabel('mu')
-		self.plt.xlim(0.0, 1.0)
-		if ylim_top == None:
-			self.plt.ylim(float(self.u.inf), float(self.u.sup))
-		else:
-			self.plt.ylim(float(self.u.inf), float(ylim_top))
-		self.plt.ylabel('X')
+		self.label_axes(ylim_top)
 	
 	
 	
@@ -585,35 +1667,318 @@ class Graph:
 		""" Adds an arithmetic operation to the plot.
 		@param	A_interval	one interval to add to a plot.
 		@param	B_interval	another interval to add to a plot.
-		@param	func	the arithmetic operation to apply on A using B.
+		@param	func	the arithmetic operation to apply on A using B (the name of an Xmu method, e.g. addX). The complete X-mu result is computed once, over all the alphas of this graph (or, when exact, at the default alphas of fuzzyArithmeticX).
 		@param	plot_title	the title of this operation.
 		@param	colour	the colour of this plot.
 		"""
+		if self.exact:
+			result = getattr(A_interval, func)(B_interval)
+			draw_linear_xmu(self.get_axes(), linear_form(result, self.u, self.alphas), self.u, plot_title, colour)
+			return
+		
 		if colour is None:
-			colour = rand(3,1)
+			colour = numpy.random.rand(3)
 		
 		plot_xss_length = []
 		plot_xss_start = []
 		plot_alphas = []
+		result = getattr(A_interval, func)(B_interval, alphas=self.alphas)
 		for i in self.alphas:
-			result = eval("A_interval." + func + "(B_interval, i)")
-			if result is not None and not result.get_xequals().is_EmptySet:
-				result = result.get_xequals()
-				if type(result.args[0]) is not Interval:
-					plot_xss_length.append(float(result.sup) - float(result.inf))
-					plot_xss_start.append(float(result.inf))
-					plot_alphas.append(float(i))
-				else: # type(subs.args[0]) is Interval
-					for part in result.args:
-						plot_xss_length.append(float(part.sup) - float(part.inf))
-						plot_xss_start.append(float(part.inf))
-						plot_alphas.append(float(i))
+			for inf, sup in result.alphaCut(i):
+				plot_xss_length.append(sup - inf)
+				plot_xss_start.append(inf)
+				plot_alphas.append(float(i))
 		
-		self.plt.bar(left=plot_alphas, height=plot_xss_length, bottom=plot_xss_start, width=1.0/float(self.granularity), alpha=0.3, linewidth=0, label=plot_title, color=colour)
+		self.get_axes().bar(left=plot_alphas, height=plot_xss_length, bottom=plot_xss_start, width=1.0/float(self.granularity), alpha=0.3, linewidth=0, label=plot_title, color=colour)
 	
 	def show_plot(self):
 		""" Shows a plot to screen. """
+		if self.plt is None:
+			raise ValueError("An isolated Graph cannot be shown; use save_plot")
 		self.plt.legend(loc='best')
 		self.plt.show()
+	
+	def save_plot(self, target, format=None, dpi=100):
+		""" Saves the plot, with a legend.
+		@param	target	a file name, or a file-like object (e.g. an HTTP response or a StringIO)
+		@param	format	the image format (e.g. "png" or "svg"); by default it is chosen from the file name
+		@param	dpi	the resolution of raster images
+		"""
+		self.get_axes().legend(loc='best')
+		figure = self.figure if self.figure is not None else self.plt.gcf()
+		figure.savefig(target, format=format, dpi=dpi)
+
+
+def linear_form(plot, u, alphas):
+	""" Gets the linear X-mu function to draw for an Xmu object or sympy X-mu function. X-mu functions without a linear form are sampled at the given alphas and interpolated.
+	@param	plot	an Xmu object, or a sympy X-mu function
+	@param	u	the universe
+	@param	alphas	the alphas to sample at, if needed
+	@return	a LinearXmuFunction """
+	if not isinstance(plot, Xmu):
+		plot = BasicXmu(u, plot)
+	linear = plot.get_linear_xequals()
+	if linear is None:
+		alphas = numpy.asarray(alphas, dtype=float)
+		lows, highs = plot.alphaCuts(alphas)
+		linear = LinearXmuFunction.from_samples(alphas, lows, highs)
+	return linear
 
+def draw_linear_xmu(axes, linear, u, label=None, colour=None):
+	""" Draws an X-mu function on matplotlib axes as exact filled polygons, one per interval between alpha breakpoints, with alpha on the x axis and X on the y axis. The drawing time depends on the number of breakpoints, not on any granularity.
+	@param	axes	matplotlib axes
+	@param	linear	a LinearXmuFunction
+	@param	u	the universe, which clips infinite endpoints
+	@param	label	the legend label
+	@param	colour	the fill colour (default: a random colour)
+	@return	the matplotlib PolyCollection drawn """
+	from matplotlib.collections import PolyCollection
+	if colour is None:
+		colour = numpy.random.rand(3)
+	collection = PolyCollection(linear.polygons(float(u.inf), float(u.sup)), facecolors=[colour], alpha=0.3, linewidths=0, label=label)
+	axes.add_collection(collection)
+	axes.autoscale_view()
+	return collection
 
+def render_xmu_images(plots, filenames, u, titles=None, ylim_top=None, granularity=100, dpi=100):
+	""" Renders many Xmu objects to image files in one call, without pyplot or a display: each is drawn exactly (see draw_linear_xmu) on a figure owned by this call, which is cleared between images.
+	@param	plots	a list of Xmu objects or sympy X-mu functions
+	@param	filenames	a list of image file names, one per plot; the extension chooses the format (e.g. .png, .svg, .pdf)
+	@param	u	the universe
+	@param	titles	a list of titles, one per plot, or None
+	@param	ylim_top	the top limit for the y axis (default: the supremum of u)
+	@param	granularity	the number of alphas to sample X-mu functions without a linear form at
+	@param	dpi	the resolution of raster images
+	@return	the list of file names written """
+	from matplotlib.figure import Figure
+	from matplotlib.backends.backend_agg import FigureCanvasAgg
+	alphas = numpy.linspace(0.0, 1.0, granularity + 1)
+	figure = Figure()
+	FigureCanvasAgg(figure)
+	for i, (plot, filename) in enumerate(zip(plots, filenames)):
+		figure.clf()
+		axes = figure.add_subplot(111)
+		title = None if titles is None else titles[i]
+		draw_linear_xmu(axes, linear_form(plot, u, alphas), u, title, colour="b")
+		axes.set_xlim(0.0, 1.0)
+		axes.set_ylim(float(u.inf), float(u.sup if ylim_top is None else ylim_top))
+		axes.set_xlabel('mu')
+		axes.set_ylabel('X')
+		if title is not None:
+			axes.set_title(title)
+		figure.savefig(filename, dpi=dpi)
+	return list(filenames)
+
+
+##### Instrumentation ########################
+# Instrumentation is opt-in: while no XmuInstrumentation is active, no method
+# is wrapped, so there is no cost at all. Activating one wraps the public
+# methods of the Xmu and NumericXmu classes (and all their subclasses) and of
+# the other classes in INSTRUMENTED_CLASSES (and optionally sympy's subs), and
+# every active instrumentation records each call. The functions in
+# INSTRUMENTED_FUNCTIONS may already have been imported by name elsewhere, so
+# they are wrapped once, here, and only check for an active instrumentation.
+# Times are inclusive, so a method's time includes the methods it calls.
+
+ACTIVE_INSTRUMENTATIONS = []
+INSTRUMENTED_METHODS = []
+INSTRUMENTED_CLASSES = [DiscreteXmu, FuzzySetBank, LinguisticVariable, RuleBase, StreamingFitter, Graph]
+INSTRUMENTED_FUNCTIONS = ["extension_principle", "linear_arithmetic", "defuzzify", "evaluate_parallel", "evaluate_threaded", "render_xmu_images"]
+
+def expression_size(value):
+	""" Counts the nodes of a sympy expression, or of the sympy X-mu function an Xmu object already holds (a pending X-mu function is not built just to measure it).
+	@param	value	any value
+	@return	the number of nodes, or None if value has no sympy expression """
+	if isinstance(value, Xmu) and not isinstance(value, LazyXmu):
+		if value.xequals_builder is not None:
+			return None
+		value = value.xequals
+	if isinstance(value, Basic):
+		return sum(1 for node in preorder_traversal(value))
+	return None
+
+def instrumented_method(name, function):
+	""" Wraps a function so that each call is recorded by the active instrumentations. Primarily used as a private method.
+	@param	name	the name to record calls under, e.g. "Xmu.unionX"
+	@param	function	the function to wrap
+	@return	the wrapping function """
+	def wrapper(*args, **kwargs):
+		result = None
+		start = time.time()
+		try:
+			result = function(*args, **kwargs)
+			return result
+		finally:
+			seconds = time.time() - start
+			for instrumentation in ACTIVE_INSTRUMENTATIONS:
+				instrumentation.record(name, seconds, result)
+	wrapper.__name__ = function.__name__
+	wrapper.__doc__ = function.__doc__
+	return wrapper
+
+def instrumentable_function(name, function):
+	""" Wraps a module-level function so that it is recorded while an instrumentation is active; otherwise the wrapper only calls it. Primarily used as a private method.
+	@param	name	the name to record calls under
+	@param	function	the function to wrap
+	@return	the wrapping function """
+	recorded = instrumented_method(name, function)
+	def wrapper(*args, **kwargs):
+		if len(ACTIVE_INSTRUMENTATIONS) == 0:
+			return function(*args, **kwargs)
+		return recorded(*args, **kwargs)
+	wrapper.__name__ = function.__name__
+	wrapper.__doc__ = function.__doc__
+	return wrapper
+
+for name in INSTRUMENTED_FUNCTIONS:
+	globals()[name] = instrumentable_function(name, globals()[name])
+del name
+
+def instrumented_classes():
+	""" Lists the classes whose public methods are instrumented: Xmu and NumericXmu with all their subclasses (including any defined outside this library), then INSTRUMENTED_CLASSES. Primarily used as a private method.
+	@return	a list of classes """
+	classes = []
+	pending = [Xmu, NumericXmu]
+	while len(pending) > 0:
+		cls = pending.pop(0)
+		if cls not in classes:
+			classes.append(cls)
+			pending.extend(cls.__subclasses__())
+	return classes + [cls for cls in INSTRUMENTED_CLASSES if cls not in classes]
+
+def instrument_methods(with_sympy):
+	""" Wraps the public methods of the instrumented classes (see instrumented_classes), LinearXmuFunction's sympy conversions and, optionally, sympy's Basic.subs. Primarily used as a private method.
+	@param	with_sympy	whether to wrap Basic.subs as well """
+	targets = [(cls, name) for cls in instrumented_classes() for name in sorted(cls.__dict__) if not name.startswith("_")]
+	targets += [(LinearXmuFunction, "from_sympy"), (LinearXmuFunction, "to_sympy")]
+	if with_sympy:
+		targets.append((Basic, "subs"))
+	for cls, name in targets:
+		original = cls.__dict__[name]
+		label = cls.__name__ + "." + name
+		if isinstance(original, staticmethod):
+			wrapped = staticmethod(instrumented_method(label, original.__get__(None, cls)))
+		elif isinstance(original, classmethod):
+			wrapped = classmethod(instrumented_method(label, original.__func__))
+		elif isinstance(original, types.FunctionType):
+			wrapped = instrumented_method(label, original)
+		else:
+			continue
+		setattr(cls, name, wrapped)
+		INSTRUMENTED_METHODS.append((cls, name, original))
+
+def restore_methods():
+	""" Puts back the methods wrapped by instrument_methods. Primarily used as a private method. """
+	while len(INSTRUMENTED_METHODS) > 0:
+		cls, name, original = INSTRUMENTED_METHODS.pop()
+		setattr(cls, name, original)
+
+class XmuInstrumentation(object):
+	""" XmuInstrumentation records call counts, cumulative wall time and the size of returned sympy expressions for the public operations of the X-mu classes (sympy and numeric), Graph and the rule-based classes (see instrument_methods). Use it as a context manager for scoped profiling, or call start() and stop(); several instrumentations may be active (e.g. nested) at once, and each records the calls made while it is active. """
+	
+	def __init__(self, sizes=True, sympy=False):
+		""" Initialises an (inactive) instrumentation.
+		@param	sizes	whether to measure the size of returned sympy expressions. This costs a traversal of each result, which is counted in the time of any calling method.
+		@param	sympy	whether to also record sympy's Basic.subs, which is how Graph.add_plot and symbolic cuts evaluate X-mu functions
+		@return	an instantiated XmuInstrumentation object """
+		self.sizes = sizes
+		self.sympy = sympy
+		self.entries = {}
+	
+	def __enter__(self):
+		self.start()
+		return self
+	
+	def __exit__(self, kind, value, trace):
+		self.stop()
+		return False
+	
+	def start(self):
+		""" Starts recording. If no other instrumentation is active, the methods are wrapped now. """
+		if self in ACTIVE_INSTRUMENTATIONS:
+			return
+		if len(ACTIVE_INSTRUMENTATIONS) == 0:
+			instrument_methods(self.sympy)
+		elif self.sympy and not any(cls is Basic for cls, name, original in INSTRUMENTED_METHODS):
+			raise ValueError("sympy instrumentation must be requested by the outermost active XmuInstrumentation")
+		ACTIVE_INSTRUMENTATIONS.append(self)
+	
+	def stop(self):
+		""" Stops recording. If no other instrumentation is active, the original methods are put back. """
+		if self in ACTIVE_INSTRUMENTATIONS:
+			ACTIVE_INSTRUMENTATIONS.remove(self)
+			if len(ACTIVE_INSTRUMENTATIONS) == 0:
+				restore_methods()
+	
+	def is_active(self):
+		""" @return	True if this instrumentation is recording """
+		return self in ACTIVE_INSTRUMENTATIONS
+	
+	def reset(self):
+		""" Discards everything recorded so far. """
+		self.entries = {}
+	
+	def record(self, name, seconds, result):
+		""" Records one call. Primarily used as a private method.
+		@param	name	the method name, e.g. "Xmu.unionX"
+		@param	seconds	the wall time of the call
+		@param	result	the value returned """
+		entry = self.entries.get(name)
+		if entry is None:
+			entry = self.entries[name] = {"calls": 0, "seconds": 0.0, "max_seconds": 0.0, "sized": 0, "nodes": 0, "max_nodes": 0}
+		entry["calls"] += 1
+		entry["seconds"] += seconds
+		entry["max_seconds"] = max(entry["max_seconds"], seconds)
+		if self.sizes:
+			size = expression_size(result)
+			if size is not None:
+				entry["sized"] += 1
+				entry["nodes"] += size
+				entry["max_nodes"] = max(entry["max_nodes"], size)
+	
+	def stats(self, name):
+		""" Gets the statistics of one method.
+		@param	name	the method name, e.g. "Xmu.unionX"
+		@return	a dict of name, calls, seconds (cumulative), mean_seconds, max_seconds, mean_nodes and max_nodes (None if no sympy result was measured), or None if the method was not called """
+		entry = self.entries.get(name)
+		if entry is None:
+			return None
+		return {
+			"name": name,
+			"calls": entry["calls"],
+			"seconds": entry["seconds"],
+			"mean_seconds": entry["seconds"] / entry["calls"],
+			"max_seconds": entry["max_seconds"],
+			"mean_nodes": float(entry["nodes"]) / entry["sized"] if entry["sized"] > 0 else None,
+			"max_nodes": entry["max_nodes"] if entry["sized"] > 0 else None,
+		}
+	
+	def query(self, pattern="*", order="seconds", limit=None):
+		""" Gets the statistics of the methods matching a pattern.
+		@param	pattern	a shell-style pattern matched against method names, e.g. "Graph.*" or "*.unionX"
+		@param	order	the statistic to sort by, largest first (e.g. "seconds", "calls" or "max_nodes")
+		@param	limit	the largest number of rows to return, or None for all
+		@return	a list of dicts (see stats) """
+		rows = [self.stats(name) for name in fnmatch.filter(self.entries.keys(), pattern)]
+		rows.sort(key=lambda row: (row[order], row["name"]), reverse=True)
+		return rows if limit is None else rows[:limit]
+	
+	def to_json(self, path=None):
+		""" Exports the statistics of every method as JSON.
+		@param	path	a file to write to, or None
+		@return	the JSON string """
+		text = json.dumps({"methods": [self.stats(name) for name in sorted(self.entries)]}, indent=1, sort_keys=True)
+		if path is not None:
+			with open(path, "w") as output:
+				output.write(text)
+		return text
+	
+	def report(self, pattern="*", limit=20):
+		""" Formats the slowest methods as a table.
+		@param	pattern	see query
+		@param	limit	the number of rows
+		@return	a string """
+		lines = ["%-40s %8s %12s %12s %10s" % ("method", "calls", "seconds", "mean", "max nodes")]
+		for row in self.query(pattern, limit=limit):
+			lines.append("%-40s %8d %12.6f %12.6f %10s" % (row["name"], row["calls"], row["seconds"], row["mean_seconds"], "" if row["max_nodes"] is None else row["max_nodes"]))
+		return "\n".join(lines)
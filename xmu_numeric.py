@@ -0,0 +1,2569 @@
+ #!/usr/bin/python
+ # -*- coding: utf-8 -*-
+ 
+##### Authorship ##############################
+###############################################
+# @name	The X-mu Python Library: numeric core
+# @author	Daniel Lewis
+# @email	daniel@vanirsystems.com
+# @website	http://vanirsystems.com/
+# @version	alpha-4
+# @license	Apache License, Version 2.0
+""" Copyright 2014 Daniel Lewis
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+###############################################
+
+##### Requirements ############################
+# This module holds the parts of X-mu which only need NumPy: the membership
+# and interval kernels, LinearXmuFunction, the implication table, the cache,
+# float-only versions of the standard shapes, discrete X-mu functions and
+# the streaming fitter. It never imports SymPy at load time; SymPy (and the
+# full xmu module) is imported on the first call which needs a symbolic
+# result, so short-lived processes can use "import xmu_numeric" without
+# paying for it.
+import numpy
+import bisect
+import itertools
+import json
+import mmap
+import struct
+import threading
+import warnings
+from collections import OrderedDict
+###############################################
+
+def symbolic():
+	""" Imports the full, SymPy-based X-mu library. Used by the numeric classes when a symbolic result is requested, so that SymPy is only loaded on first use.
+	@return	the xmu module """
+	import xmu
+	return xmu
+
+def trapezoidal_kernel(a, b, c, d):
+	""" Creates a NumPy membership function for a trapezoid. Gradients are trapezoids with infinite points (e.g. an upward gradient is a, b, inf, inf), and triangles have b equal to c.
+	@param	a	is the last point where mu is 0.0
+	@param	b	is the point where mu becomes 1.0
+	@param	c	is the last point where mu is 1.0
+	@param	d	is the point where mu becomes 0.0 again
+	@return	a function taking a NumPy array and returning a NumPy array of memberships """
+	rise = 1.0 / (b - a) if b > a else 0.0
+	fall = 1.0 / (d - c) if d > c else 0.0
+	def kernel(X):
+		with numpy.errstate(invalid='ignore'):
+			return numpy.where((b <= X) & (X <= c), 1.0,
+				numpy.where((a < X) & (X < b), (X - a) * rise,
+				numpy.where((c < X) & (X < d), (d - X) * fall, 0.0)))
+	# kept so that an Xmu object holding this kernel can be pickled (see Xmu.__getstate__)
+	kernel.points = (a, b, c, d)
+	return kernel
+
+##### Interval Arithmetic ####################
+# Intervals are held as NumPy arrays of lower and upper endpoints, so that
+# many intervals (e.g. the cuts of an X-mu function at many alphas) are
+# handled in one pass. Missing (empty) intervals have NaN endpoints.
+# Each operation returns a list of (lo, hi) pieces: one piece, except for
+# division by an interval containing zero, which returns two.
+# Results are rounded outwards, so they always enclose the exact result.
+
+def round_outward(lo, hi):
+	""" Widens intervals by one unit in the last place at each end, so that they enclose the exactly rounded result.
+	@param	lo	a NumPy array of lower endpoints
+	@param	hi	a NumPy array of upper endpoints
+	@return	a tuple of NumPy arrays (lo, hi) """
+	return numpy.nextafter(lo, -numpy.inf), numpy.nextafter(hi, numpy.inf)
+
+def interval_add(lo1, hi1, lo2, hi2):
+	""" Interval addition.
+	@return	a list of one (lo, hi) piece """
+	return [round_outward(lo1 + lo2, hi1 + hi2)]
+
+def interval_sub(lo1, hi1, lo2, hi2):
+	""" Interval subtraction.
+	@return	a list of one (lo, hi) piece """
+	return [round_outward(lo1 - hi2, hi1 - lo2)]
+
+def interval_mul(lo1, hi1, lo2, hi2):
+	""" Interval multiplication.
+	@return	a list of one (lo, hi) piece """
+	with numpy.errstate(invalid='ignore', over='ignore'):
+		corners = numpy.array([lo1 * lo2, lo1 * hi2, hi1 * lo2, hi1 * hi2])
+		# 0 * inf is taken as 0, as the infinite end is never reached
+		corners = numpy.where(numpy.isnan(corners) & ~numpy.isnan(lo1 + lo2 + hi1 + hi2), 0.0, corners)
+	return [round_outward(corners.min(axis=0), corners.max(axis=0))]
+
+def interval_div(lo1, hi1, lo2, hi2):
+	""" Interval division. Where the divisor contains zero the result is unbounded: the whole real line if the dividend also contains zero, and otherwise up to two pieces, (-inf, x] and [y, inf). The second piece is NaN where it is not needed, and division by exactly [0, 0] gives a missing interval.
+	@return	a list of two (lo, hi) pieces """
+	inf = numpy.inf
+	nan = numpy.nan
+	with numpy.errstate(invalid='ignore', divide='ignore', over='ignore'):
+		corners = numpy.array([lo1 / lo2, lo1 / hi2, hi1 / lo2, hi1 / hi2])
+		lo = corners.min(axis=0)
+		hi = corners.max(axis=0)
+
+		zero = (lo2 <= 0.0) & (hi2 >= 0.0)
+		negative = hi1 < 0.0
+		# the finite ends come from the dividend endpoint nearest zero
+		near = numpy.where(negative, hi1, lo1)
+		by_hi = near / hi2
+		by_lo = near / lo2
+		# the part of the divisor in (0, hi2], and the part in [lo2, 0)
+		has_pos = zero & (hi2 > 0.0)
+		has_neg = zero & (lo2 < 0.0)
+		pos_lo = numpy.where(negative, -inf, by_hi)
+		pos_hi = numpy.where(negative, by_hi, inf)
+		neg_lo = numpy.where(negative, by_lo, -inf)
+		neg_hi = numpy.where(negative, inf, by_lo)
+
+		# order the pieces from -inf upwards
+		low_has = numpy.where(negative, has_pos, has_neg)
+		low_lo = numpy.where(negative, pos_lo, neg_lo)
+		low_hi = numpy.where(negative, pos_hi, neg_hi)
+		up_has = numpy.where(negative, has_neg, has_pos)
+		up_lo = numpy.where(negative, neg_lo, pos_lo)
+		up_hi = numpy.where(negative, neg_hi, pos_hi)
+
+		first_lo = numpy.where(low_has, low_lo, numpy.where(up_has, up_lo, nan))
+		first_hi = numpy.where(low_has, low_hi, numpy.where(up_has, up_hi, nan))
+		second_lo = numpy.where(low_has & up_has, up_lo, nan)
+		second_hi = numpy.where(low_has & up_has, up_hi, nan)
+
+		whole = zero & (lo1 <= 0.0) & (hi1 >= 0.0) & (has_pos | has_neg)
+		first_lo = numpy.where(whole, -inf, numpy.where(zero, first_lo, lo))
+		first_hi = numpy.where(whole, inf, numpy.where(zero, first_hi, hi))
+		second_lo = numpy.where(whole, nan, second_lo)
+		second_hi = numpy.where(whole, nan, second_hi)
+	return [round_outward(first_lo, first_hi), round_outward(second_lo, second_hi)]
+
+def interval_pow(lo1, hi1, lo2, hi2):
+	""" Interval power. A base with negative values may have a single integer exponent. For any other exponent the power is only real for a non-negative base, so the base is restricted to its non-negative part, [max(lo1, 0), hi1].
+	@raise	ValueError	if a base is wholly negative and its exponent is not a single integer, as the power then has no real values
+	@return	a list of one (lo, hi) piece """
+	inf = numpy.inf
+	integer = (lo2 == hi2) & (numpy.floor(lo2) == lo2)
+	if numpy.any((hi1 < 0.0) & ~integer):
+		raise ValueError("A negative base has no real power unless its exponent is a single integer")
+	with numpy.errstate(invalid='ignore', divide='ignore', over='ignore'):
+		base = numpy.maximum(lo1, 0.0)
+		corners = numpy.array([base ** lo2, base ** hi2, hi1 ** lo2, hi1 ** hi2])
+		lo = corners.min(axis=0)
+		hi = corners.max(axis=0)
+
+		n = numpy.where(integer, lo2, 0.0)
+		a = lo1 ** n
+		b = hi1 ** n
+		int_lo = numpy.minimum(a, b)
+		int_hi = numpy.maximum(a, b)
+		# x ** n is monotone away from zero; around zero, even powers have their minimum
+		# (or, for negative n, a pole) at zero, and odd negative powers have a pole
+		contains_zero = (lo1 < 0.0) & (hi1 >= 0.0)
+		even = numpy.mod(n, 2.0) == 0.0
+		int_lo = numpy.where(contains_zero & even & (n > 0), 0.0, int_lo)
+		int_hi = numpy.where(contains_zero & even & (n < 0), inf, int_hi)
+		odd_pole = contains_zero & ~even & (n < 0)
+		int_lo = numpy.where(odd_pole, -inf, int_lo)
+		int_hi = numpy.where(odd_pole & (hi1 > 0.0), inf, numpy.where(odd_pole, a, int_hi))
+
+		negative_base = (lo1 < 0.0) & integer
+		lo = numpy.where(negative_base, int_lo, lo)
+		hi = numpy.where(negative_base, int_hi, hi)
+	lo, hi = round_outward(lo, hi)
+	# a power is never negative for a non-negative base or an even exponent, so a lower end rounded below zero is put back
+	lo = numpy.where(~negative_base | even, numpy.maximum(lo, 0.0), lo)
+	return [(lo, hi)]
+
+INTERVAL_OPERATIONS = {
+	"+": interval_add,
+	"-": interval_sub,
+	"*": interval_mul,
+	"/": interval_div,
+	"**": interval_pow,
+}
+
+def interval_operation(operation, lo1, hi1, lo2, hi2):
+	""" Performs interval arithmetic on NumPy arrays of interval endpoints, element by element, dispatching through INTERVAL_OPERATIONS.
+	@param	operation	One of the following: +, -, *, /, **
+	@param	lo1	a NumPy array of lower endpoints of the first intervals
+	@param	hi1	a NumPy array of upper endpoints of the first intervals
+	@param	lo2	a NumPy array of lower endpoints of the second intervals
+	@param	hi2	a NumPy array of upper endpoints of the second intervals
+	@return	a list of (lo, hi) pieces, each a tuple of NumPy arrays """
+	if operation not in INTERVAL_OPERATIONS:
+		raise ValueError("Unknown arithmetic operation: " + str(operation))
+	args = [numpy.asarray(v, dtype=float) for v in (lo1, hi1, lo2, hi2)]
+	return INTERVAL_OPERATIONS[operation](*args)
+
+def interval_exp(lo, hi):
+	""" Interval exponential.
+	@return	a tuple of NumPy arrays (lo, hi) """
+	with numpy.errstate(over='ignore'):
+		lo, hi = round_outward(numpy.exp(lo), numpy.exp(hi))
+	return numpy.maximum(lo, 0.0), hi
+
+def interval_log(lo, hi):
+	""" Interval natural logarithm. The bounds are NaN where the interval reaches below zero.
+	@return	a tuple of NumPy arrays (lo, hi) """
+	with numpy.errstate(invalid='ignore', divide='ignore'):
+		return round_outward(numpy.log(lo), numpy.log(hi))
+
+def interval_periodic(kernel, lo, hi, peak):
+	""" Interval sine or cosine: the images of the endpoints, widened to 1 (or -1) where the interval holds a peak (or a trough, half a period later).
+	@param	kernel	numpy.sin or numpy.cos
+	@param	peak	a point where kernel is 1
+	@return	a tuple of NumPy arrays (lo, hi) """
+	period = 2.0 * numpy.pi
+	with numpy.errstate(invalid='ignore'):
+		a = kernel(lo)
+		b = kernel(hi)
+		has_peak = numpy.floor((hi - peak) / period) >= numpy.ceil((lo - peak) / period)
+		has_trough = numpy.floor((hi - peak - numpy.pi) / period) >= numpy.ceil((lo - peak - numpy.pi) / period)
+		lo, hi = round_outward(numpy.where(has_trough, -1.0, numpy.minimum(a, b)), numpy.where(has_peak, 1.0, numpy.maximum(a, b)))
+	return numpy.maximum(lo, -1.0), numpy.minimum(hi, 1.0)
+
+def interval_abs(lo, hi):
+	""" Interval absolute value.
+	@return	a tuple of NumPy arrays (lo, hi) """
+	return numpy.where(lo >= 0.0, lo, numpy.where(hi <= 0.0, -hi, 0.0)), numpy.maximum(numpy.abs(lo), numpy.abs(hi))
+
+INTERVAL_FUNCTIONS = {
+	"exp": interval_exp,
+	"log": interval_log,
+	"sin": lambda lo, hi: interval_periodic(numpy.sin, lo, hi, numpy.pi / 2.0),
+	"cos": lambda lo, hi: interval_periodic(numpy.cos, lo, hi, 0.0),
+	"Abs": interval_abs,
+}
+
+def interval_expression(expr, symbols, lows, highs):
+	""" Bounds a SymPy expression over a batch of boxes, with the interval kernel (see INTERVAL_OPERATIONS and INTERVAL_FUNCTIONS). Sums, products, powers (so also differences, quotients and roots), constants and the functions in INTERVAL_FUNCTIONS are supported. SymPy itself is not needed, as the expression is only walked.
+	@param	expr	a SymPy expression
+	@param	symbols	the n symbols of the expression
+	@param	lows	a list of n NumPy arrays of shape (m,): the lower corner of each box, per symbol
+	@param	highs	a list of n NumPy arrays of shape (m,): the upper corner of each box, per symbol
+	@return	a tuple of NumPy arrays (lo, hi) of shape (m,), enclosing the expression over each box (NaN where it could not be bounded); or None if the expression holds anything else """
+	m = len(lows[0])
+	def bound(e):
+		if e.is_Symbol:
+			if e not in symbols:
+				return None
+			i = list(symbols).index(e)
+			return lows[i], highs[i]
+		if e.is_number:
+			try:
+				value = numpy.full(m, float(e))
+			except TypeError:
+				return None
+			if e.is_Integer:
+				return value, value
+			return round_outward(value, value)
+		parts = [bound(arg) for arg in e.args]
+		if any(part is None for part in parts):
+			return None
+		if e.is_Add or e.is_Mul:
+			operation = "+" if e.is_Add else "*"
+			lo, hi = parts[0]
+			for lo2, hi2 in parts[1:]:
+				(lo, hi), = interval_operation(operation, lo, hi, lo2, hi2)
+			return lo, hi
+		if e.is_Pow:
+			try:
+				(lo, hi), = interval_operation("**", parts[0][0], parts[0][1], parts[1][0], parts[1][1])
+			except ValueError:
+				# a wholly negative base with a non-integer exponent: the expression is not real there
+				return numpy.full(m, numpy.nan), numpy.full(m, numpy.nan)
+			return lo, hi
+		name = e.func.__name__
+		if name in INTERVAL_FUNCTIONS and len(parts) == 1:
+			return INTERVAL_FUNCTIONS[name](*parts[0])
+		return None
+	return bound(expr)
+
+###############################################
+
+class LinearXmuFunction(object):
+	""" LinearXmuFunction is a numeric representation of an X-mu function whose interval endpoints are linear in alpha. It is stored as a sorted list of float alpha breakpoints, and for each segment between two breakpoints a sorted tuple of intervals. Each interval is a (lo_slope, lo_intercept, hi_slope, hi_intercept) tuple, so that at a given alpha the interval is [lo_slope*alpha + lo_intercept, hi_slope*alpha + hi_intercept].
+	Set operations are computed exactly on these lines (splitting segments wherever two endpoints cross), so no SymPy set machinery is involved.
+	@note	All intervals are treated as closed, and intervals of zero width inside a segment are dropped. """
+
+	__slots__ = ("breakpoints", "pieces")
+	
+	EPSILON = 1e-12
+
+	def __init__(self, breakpoints=None, pieces=None):
+		""" Initialises the LinearXmuFunction. With no parameters, this is the empty X-mu function.
+		@param	breakpoints	a sorted list of n+1 alphas, starting at 0.0 and ending at 1.0
+		@param	pieces	a list of n tuples of (lo_slope, lo_intercept, hi_slope, hi_intercept) intervals, one tuple per segment
+		@return	an instantiated LinearXmuFunction object """
+		if breakpoints is None:
+			breakpoints = [0.0, 1.0]
+		if pieces is None:
+			pieces = [()] * (len(breakpoints) - 1)
+		self.breakpoints = [float(b) for b in breakpoints]
+		self.pieces = [tuple(p) for p in pieces]
+
+	def __getstate__(self):
+		return (self.breakpoints, self.pieces)
+
+	def __setstate__(self, state):
+		self.breakpoints, self.pieces = state
+
+	def __eq__(self, other):
+		return isinstance(other, LinearXmuFunction) and self.breakpoints == other.breakpoints and self.pieces == other.pieces
+
+	def __ne__(self, other):
+		return not self.__eq__(other)
+
+	def __hash__(self):
+		return hash(self.key())
+
+	def key(self):
+		""" @return	a hashable tuple which is equal for structurally equal X-mu functions """
+		return (tuple(self.breakpoints), tuple(self.pieces))
+
+	def __repr__(self):
+		return "LinearXmuFunction(%r, %r)" % (self.breakpoints, self.pieces)
+
+	@classmethod
+	def from_interval(cls, lo, hi):
+		""" Creates a single-interval X-mu function, valid over all alphas.
+		@param	lo	a (slope, intercept) tuple for the lower endpoint
+		@param	hi	a (slope, intercept) tuple for the upper endpoint
+		@return	a LinearXmuFunction """
+		interval = (float(lo[0]), float(lo[1]), float(hi[0]), float(hi[1]))
+		return cls([0.0, 1.0], [(interval,)]).normalised()
+
+	@classmethod
+	def from_sympy(cls, expr):
+		""" Converts a SymPy X-mu function (intervals whose endpoints are linear in ALPHA, combined by union, intersection and complement) to a LinearXmuFunction.
+		@param	expr	a sympy set
+		@return	a LinearXmuFunction, or None if expr cannot be represented """
+		from sympy import Interval, Union, Intersection, Complement, Piecewise
+		if isinstance(expr, Piecewise):
+			return cls.from_piecewise(expr)
+		if getattr(expr, "is_EmptySet", False):
+			return cls()
+		if isinstance(expr, Interval) and (isinstance(expr.start, Piecewise) or isinstance(expr.end, Piecewise)):
+			return cls.from_piecewise_interval(expr.start, expr.end)
+		if isinstance(expr, Interval):
+			lo = cls.line(expr.start)
+			hi = cls.line(expr.end)
+			if lo is None or hi is None:
+				return None
+			return cls.from_interval(lo, hi)
+		if isinstance(expr, (Union, Intersection, Complement)):
+			parts = [cls.from_sympy(arg) for arg in expr.args]
+			if None in parts:
+				return None
+			result = parts[0]
+			for part in parts[1:]:
+				if isinstance(expr, Union):
+					result = result.union(part)
+				elif isinstance(expr, Intersection):
+					result = result.intersect(part)
+				else:
+					result = result.difference(part)
+			return result
+		return None
+
+	@staticmethod
+	def piecewise_parts(expr):
+		""" Splits a Piecewise in ALPHA whose conditions are ALPHA <= q (the last may be True) into its branches. Primarily used as a private method.
+		@param	expr	a sympy expression; anything other than a Piecewise is one branch, valid for every alpha
+		@return	a list of (q, value) tuples, with q = 1.0 for the last branch; or None if a condition is of another form """
+		from sympy import Piecewise, LessThan
+		ALPHA = symbolic().ALPHA
+		parts = expr.args if isinstance(expr, Piecewise) else [(expr, True)]
+		result = []
+		for value, condition in parts:
+			if condition == True:
+				q = 1.0
+			elif isinstance(condition, LessThan) and condition.lhs == ALPHA and len(condition.rhs.free_symbols) == 0:
+				q = float(condition.rhs)
+			else:
+				return None
+			result.append((min(q, 1.0), value))
+		return result
+	
+	@classmethod
+	def from_piecewise(cls, expr):
+		""" Converts a Piecewise of sympy sets (e.g. the canonical form, see to_sympy) to a LinearXmuFunction.
+		@param	expr	a sympy Piecewise, whose conditions are ALPHA <= q
+		@return	a LinearXmuFunction, or None if expr cannot be represented """
+		parts = cls.piecewise_parts(expr)
+		if parts is None:
+			return None
+		breakpoints = [0.0]
+		pieces = []
+		for q, value in parts:
+			if q <= breakpoints[-1]:
+				continue
+			function = cls.from_sympy(value)
+			if function is None:
+				return None
+			for b in [b for b in function.breakpoints if breakpoints[-1] < b < q] + [q]:
+				pieces.append(function.pieces[function.segment((breakpoints[-1] + b) / 2.0)])
+				breakpoints.append(b)
+			if q >= 1.0:
+				break
+		return cls(breakpoints, pieces).normalised()
+	
+	@classmethod
+	def from_piecewise_interval(cls, start, end):
+		""" Converts an interval whose endpoints are Piecewise in ALPHA (an interval of the canonical form, see to_sympy) to a LinearXmuFunction.
+		@param	start	a sympy expression: linear in ALPHA, or a Piecewise of such expressions (or of oo and -oo) with conditions ALPHA <= q
+		@param	end	the matching upper endpoint
+		@return	a LinearXmuFunction, or None if the endpoints cannot be represented """
+		lows = cls.piecewise_parts(start)
+		highs = cls.piecewise_parts(end)
+		if lows is None or highs is None:
+			return None
+		lows = [(q, cls.line(value)) for q, value in lows]
+		highs = [(q, cls.line(value)) for q, value in highs]
+		if None in [line for q, line in lows + highs]:
+			return None
+		breakpoints = sorted(set([0.0, 1.0] + [q for q, line in lows + highs if 0.0 < q < 1.0]))
+		pieces = []
+		for p, q in zip(breakpoints[:-1], breakpoints[1:]):
+			m = (p + q) / 2.0
+			lo = next((line for bound, line in lows if m <= bound), None)
+			hi = next((line for bound, line in highs if m <= bound), None)
+			pieces.append(() if lo is None or hi is None else (lo + hi,))
+		return cls(breakpoints, pieces).normalised()
+	
+	@staticmethod
+	def line(expr):
+		""" Converts a SymPy expression which is linear in ALPHA to a (slope, intercept) tuple.
+		@param	expr	a sympy expression
+		@return	a (slope, intercept) tuple of floats, or None if expr is not linear in ALPHA """
+		from sympy import sympify, diff
+		ALPHA = symbolic().ALPHA
+		expr = sympify(expr)
+		slope = diff(expr, ALPHA)
+		if len(slope.free_symbols) > 0 or len(expr.free_symbols - set([ALPHA])) > 0:
+			return None
+		return (float(slope), float(expr.subs(ALPHA, 0.0)))
+
+	@classmethod
+	def from_samples(cls, alphas, lows, highs):
+		""" Creates an X-mu function by linear interpolation between interval endpoints sampled at a number of alphas.
+		@param	alphas	a sorted NumPy array of n alphas, which should start at 0.0 and end at 1.0
+		@param	lows	a NumPy array of shape (k, n), holding the lower endpoints of k intervals at each alpha (NaN where an interval is missing)
+		@param	highs	a NumPy array of shape (k, n), holding the matching upper endpoints
+		@return	a LinearXmuFunction """
+		alphas = numpy.asarray(alphas, dtype=float)
+		lows = numpy.atleast_2d(lows)
+		highs = numpy.atleast_2d(highs)
+		widths = numpy.diff(alphas)
+		tracks = []
+		with numpy.errstate(invalid='ignore'):
+			for lo, hi in zip(lows, highs):
+				if numpy.isnan(lo).all():
+					continue
+				# an endpoint which is the same at both ends (including an infinite one) is constant
+				lo_slopes = numpy.where(lo[:-1] == lo[1:], 0.0, numpy.diff(lo) / widths)
+				hi_slopes = numpy.where(hi[:-1] == hi[1:], 0.0, numpy.diff(hi) / widths)
+				lo_intercepts = lo[:-1] - lo_slopes * alphas[:-1]
+				hi_intercepts = hi[:-1] - hi_slopes * alphas[:-1]
+				valid = numpy.isfinite(lo_slopes) & numpy.isfinite(hi_slopes) & ~numpy.isnan(lo_intercepts) & ~numpy.isnan(hi_intercepts)
+				tracks.append(zip(valid.tolist(), lo_slopes.tolist(), lo_intercepts.tolist(), hi_slopes.tolist(), hi_intercepts.tolist()))
+		if len(tracks) == 0:
+			return cls()
+		if len(tracks) == 1:
+			return cls(alphas.tolist(), [(t[1:],) if t[0] else () for t in tracks[0]])
+		pieces = [tuple(sorted(t[1:] for t in segment if t[0])) for segment in zip(*tracks)]
+		return cls(alphas.tolist(), pieces).normalised()
+
+	def to_sympy(self, lower=None, upper=None):
+		""" Converts this X-mu function to sympy, in a canonical flat form. Neighbouring segments with the same number of intervals form a run, and each run is a union of intervals (the k-th interval of every segment in the run), whose endpoints are Piecewise in ALPHA; a run without intervals is the EmptySet. With more than one run, the result is a Piecewise of these sets. Infinite endpoints are kept as oo and -oo. The size of the result depends only on the breakpoints and intervals, not on how the X-mu function was made.
+		@param	lower	if given, the X-mu function is first clipped to [lower, upper] (see clipped)
+		@param	upper	see lower
+		@return	a sympy set, or a Piecewise of sympy sets """
+		from sympy import Interval, Union, EmptySet, Piecewise, oo
+		ALPHA = symbolic().ALPHA
+		linear = self if lower is None else self.clipped(lower, upper)
+		def endpoint(run, k, side):
+			parts = []
+			for q, intervals in run:
+				line = intervals[k][2 * side:2 * side + 2]
+				if len(parts) > 0 and parts[-1][0] == line:
+					parts[-1] = (line, q)
+				else:
+					parts.append((line, q))
+			values = []
+			for (slope, intercept), q in parts:
+				if numpy.isinf(intercept):
+					values.append((oo if intercept > 0 else -oo, ALPHA <= q))
+				else:
+					values.append((slope * ALPHA + intercept, ALPHA <= q))
+			if len(values) == 1:
+				return values[0][0]
+			values[-1] = (values[-1][0], True)
+			return Piecewise(*values)
+		runs = []
+		for q, intervals in zip(linear.breakpoints[1:], linear.pieces):
+			if len(runs) > 0 and len(runs[-1][-1][1]) == len(intervals):
+				runs[-1].append((q, intervals))
+			else:
+				runs.append([(q, intervals)])
+		sets = []
+		for run in runs:
+			count = len(run[0][1])
+			value = EmptySet() if count == 0 else Union(*[Interval(endpoint(run, k, 0), endpoint(run, k, 1)) for k in range(count)])
+			sets.append((value, ALPHA <= run[-1][0]))
+		if len(sets) == 1:
+			return sets[0][0]
+		sets[-1] = (sets[-1][0], True)
+		return Piecewise(*sets)
+	
+	def clipped(self, lower, upper):
+		""" Clips this X-mu function to a universe.
+		@param	lower	the infimum of the universe
+		@param	upper	the supremum of the universe
+		@return	a LinearXmuFunction (this one, if it already lies within the universe) """
+		for p, q, intervals in zip(self.breakpoints[:-1], self.breakpoints[1:], self.pieces):
+			for ls, li, hs, hi in intervals:
+				if min(ls * p + li, ls * q + li) < lower or max(hs * p + hi, hs * q + hi) > upper:
+					return self.intersect(LinearXmuFunction.from_interval((0.0, lower), (0.0, upper)))
+		return self
+
+	def hull(self):
+		""" Finds an interval holding every cut, at every alpha. The cuts need not be nested (e.g. after a difference), so this can be wider than the cut at 0.0.
+		@return	an (inf, sup) tuple, or None if every cut is empty """
+		lows = []
+		highs = []
+		for p, q, intervals in zip(self.breakpoints[:-1], self.breakpoints[1:], self.pieces):
+			for ls, li, hs, hi in intervals:
+				lows.append(min(ls * p + li, ls * q + li))
+				highs.append(max(hs * p + hi, hs * q + hi))
+		if len(lows) == 0:
+			return None
+		return (min(lows), max(highs))
+
+	def segment(self, alpha):
+		""" Finds the segment holding a given alpha.
+		@param	alpha	a float between 0.0 and 1.0
+		@return	the index of the segment in self.pieces """
+		i = bisect.bisect_right(self.breakpoints, float(alpha)) - 1
+		return min(max(i, 0), len(self.pieces) - 1)
+
+	def cut(self, alpha):
+		""" Evaluates the X-mu function at a given alpha (i.e. returns the alpha-cut).
+		@param	alpha	a float between 0.0 and 1.0
+		@return	a sorted list of (inf, sup) tuples """
+		alpha = float(alpha)
+		result = []
+		for ls, li, hs, hi in self.pieces[self.segment(alpha)]:
+			lo = ls * alpha + li
+			up = hs * alpha + hi
+			if lo > up:
+				continue
+			# intervals may touch exactly at a breakpoint
+			if len(result) > 0 and lo <= result[-1][1]:
+				result[-1] = (result[-1][0], max(up, result[-1][1]))
+			else:
+				result.append((lo, up))
+		return result
+
+	def endpoints(self, alphas):
+		""" Evaluates the X-mu function at many alphas in one vectorized pass.
+		@param	alphas	a NumPy array of n alphas
+		@return	a tuple of NumPy arrays (lows, highs), each of shape (k, n) where k is the largest number of intervals in any segment. Missing intervals have NaN endpoints. """
+		alphas = numpy.asarray(alphas, dtype=float)
+		k = max([len(p) for p in self.pieces] + [1])
+		lows = numpy.full((k, len(alphas)), numpy.nan)
+		highs = numpy.full((k, len(alphas)), numpy.nan)
+		segments = numpy.clip(numpy.searchsorted(self.breakpoints, alphas, 'right') - 1, 0, len(self.pieces) - 1)
+		for i, intervals in enumerate(self.pieces):
+			mask = segments == i
+			if not mask.any():
+				continue
+			a = alphas[mask]
+			for j, (ls, li, hs, hi) in enumerate(intervals):
+				lo = ls * a + li
+				up = hs * a + hi
+				empty = lo > up
+				lows[j, mask] = numpy.where(empty, numpy.nan, lo)
+				highs[j, mask] = numpy.where(empty, numpy.nan, up)
+		return lows, highs
+
+	def is_empty(self):
+		""" @return	True if this X-mu function is empty at every alpha """
+		return all(len(p) == 0 for p in self.pieces)
+
+	def polygons(self, lower=-numpy.inf, upper=numpy.inf):
+		""" Gets the exact outline of this X-mu function in the (alpha, x) plane: one polygon per interval of each segment, clipped to lower <= x <= upper. Clipping adds a vertex wherever an endpoint crosses a bound, so the polygons stay exact.
+		@param	lower	the smallest x to draw (e.g. the infimum of the universe)
+		@param	upper	the largest x to draw
+		@return	a list of NumPy arrays of shape (m, 2), holding (alpha, x) vertices """
+		result = []
+		for q0, q1, intervals in zip(self.breakpoints[:-1], self.breakpoints[1:], self.pieces):
+			for ls, li, hs, hi in intervals:
+				alphas = [q0, q1]
+				for slope, intercept in ((ls, li), (hs, hi)):
+					if slope == 0.0 or not numpy.isfinite(intercept):
+						continue
+					for bound in (lower, upper):
+						crossing = (bound - intercept) / slope
+						if q0 < crossing < q1:
+							alphas.append(crossing)
+				alphas = numpy.array(sorted(alphas))
+				lows = numpy.clip(ls * alphas + li, lower, upper)
+				highs = numpy.maximum(numpy.clip(hs * alphas + hi, lower, upper), lows)
+				result.append(numpy.concatenate([numpy.column_stack([alphas, lows]), numpy.column_stack([alphas[::-1], highs[::-1]])]))
+		return result
+
+	@staticmethod
+	def moments(functions):
+		""" Computes the area and first moment of many X-mu functions in one vectorized pass over all their intervals. The area is the integral over alpha of the total width of the cut (the X-mu sigma-count); the first moment is the integral over alpha of the integral of x over the cut. Endpoints are linear within a segment, so the trapezoid rule is exact for the area, and Simpson's rule for the (quadratic) first moment.
+		@param	functions	a list of N LinearXmuFunction objects
+		@return	a tuple of NumPy arrays (areas, moments), each of length N """
+		owners = []
+		bounds = []
+		lines = []
+		for i, function in enumerate(functions):
+			for q0, q1, intervals in zip(function.breakpoints[:-1], function.breakpoints[1:], function.pieces):
+				for interval in intervals:
+					owners.append(i)
+					bounds.append((q0, q1))
+					lines.append(interval)
+		if len(lines) == 0:
+			return numpy.zeros(len(functions)), numpy.zeros(len(functions))
+		bounds = numpy.array(bounds)
+		lines = numpy.array(lines)
+		with numpy.errstate(invalid='ignore'):
+			widths = []
+			squares = []
+			for alpha in (bounds[:, 0], bounds.mean(axis=1), bounds[:, 1]):
+				lo = lines[:, 0] * alpha + lines[:, 1]
+				hi = lines[:, 2] * alpha + lines[:, 3]
+				widths.append(hi - lo)
+				squares.append((hi * hi - lo * lo) / 2.0)
+			step = bounds[:, 1] - bounds[:, 0]
+			areas = step * (widths[0] + widths[2]) / 2.0
+			moments = step * (squares[0] + 4.0 * squares[1] + squares[2]) / 6.0
+		return numpy.bincount(owners, areas, len(functions)), numpy.bincount(owners, moments, len(functions))
+
+	def maxima(self):
+		""" Gets the height of this X-mu function (the largest alpha with a non-empty cut) and the cut at that height.
+		@return	a tuple of (height, a sorted list of (inf, sup) tuples); (0.0, []) if the X-mu function is empty """
+		for q1, intervals in reversed(zip(self.breakpoints[1:], self.pieces)):
+			if len(intervals) > 0:
+				return q1, sorted((ls * q1 + li, hs * q1 + hi) for ls, li, hs, hi in intervals)
+		return 0.0, []
+
+	def mean_of_maxima(self):
+		""" Gets the mean of the cut at the height of this X-mu function, weighting each interval by its width (or averaging the points, if the cut has no width).
+		@return	a float, or NaN if the X-mu function is empty """
+		height, cut = self.maxima()
+		return cut_mean(cut)
+
+	def union(self, other):
+		""" X-mu set union.
+		@param	other	a LinearXmuFunction
+		@return	a LinearXmuFunction """
+		return LinearXmuFunction.combine([self, other], any)
+
+	def intersect(self, other):
+		""" X-mu set intersection.
+		@param	other	a LinearXmuFunction
+		@return	a LinearXmuFunction """
+		return LinearXmuFunction.combine([self, other], all)
+
+	def difference(self, other):
+		""" X-mu set difference (self - other).
+		@param	other	a LinearXmuFunction
+		@return	a LinearXmuFunction """
+		return LinearXmuFunction.combine([self, other], lambda m: m[0] and not m[1])
+
+	def normalised(self):
+		""" Splits segments wherever an interval becomes empty, merges touching intervals, and merges identical neighbouring segments.
+		@return	a LinearXmuFunction """
+		return LinearXmuFunction.combine([self], any)
+
+	@classmethod
+	def combine(cls, functions, predicate):
+		""" Combines several X-mu functions into one, in a single sweep over alpha. The segments are split at every breakpoint of every function, and at every alpha where two endpoints cross; within each resulting segment the order of all endpoints is fixed, so the combination can be worked out once at the midpoint and carried along the lines.
+		@param	functions	a list of LinearXmuFunction instances
+		@param	predicate	a function taking a list of booleans (membership of a point in each function) and returning whether the point is in the result
+		@return	a LinearXmuFunction """
+		alphas = sorted(set(b for f in functions for b in f.breakpoints))
+		breakpoints = [alphas[0]]
+		pieces = []
+		for s, t in zip(alphas[:-1], alphas[1:]):
+			m = (s + t) / 2.0
+			operands = [f.pieces[f.segment(m)] for f in functions]
+			lines = set()
+			for intervals in operands:
+				for ls, li, hs, hi in intervals:
+					lines.add((ls, li))
+					lines.add((hs, hi))
+			lines = sorted(lines)
+			splits = set([s, t])
+			for i in range(len(lines)):
+				for j in range(i + 1, len(lines)):
+					(s1, c1), (s2, c2) = lines[i], lines[j]
+					if abs(s1 - s2) > cls.EPSILON:
+						crossing = (c2 - c1) / (s1 - s2)
+						if s < crossing < t:
+							splits.add(crossing)
+			splits = sorted(splits)
+			for p, q in zip(splits[:-1], splits[1:]):
+				piece = cls.combine_at((p + q) / 2.0, operands, predicate)
+				if len(pieces) > 0 and pieces[-1] == piece:
+					breakpoints[-1] = q
+				else:
+					breakpoints.append(q)
+					pieces.append(piece)
+		return cls(breakpoints, pieces)
+
+	@classmethod
+	def combine_at(cls, alpha, operands, predicate):
+		""" Works out the combination of several segments at a given alpha, in terms of their endpoint lines. Primarily used as a private method by combine().
+		@param	alpha	an alpha strictly inside the segment, where no two different endpoints meet
+		@param	operands	a list of tuples of (lo_slope, lo_intercept, hi_slope, hi_intercept) intervals
+		@param	predicate	see combine()
+		@return	a tuple of (lo_slope, lo_intercept, hi_slope, hi_intercept) intervals """
+		values = []
+		bounds = []
+		for intervals in operands:
+			evaluated = []
+			for ls, li, hs, hi in intervals:
+				lo = ls * alpha + li
+				up = hs * alpha + hi
+				if lo < up:
+					evaluated.append((lo, up))
+					bounds.append((lo, (ls, li)))
+					bounds.append((up, (hs, hi)))
+			values.append(evaluated)
+		bounds.sort()
+		unique = []
+		for value, line in bounds:
+			if len(unique) == 0 or value - unique[-1][0] > cls.EPSILON * (1.0 + min(abs(value), abs(unique[-1][0]))):
+				unique.append((value, line))
+
+		result = []
+		start = None
+		for (v1, l1), (v2, l2) in zip(unique[:-1], unique[1:]):
+			if v1 == float('-inf'):
+				point = v2 - 1.0
+			elif v2 == float('inf'):
+				point = v1 + 1.0
+			else:
+				point = (v1 + v2) / 2.0
+			member = predicate([any(lo <= point <= up for lo, up in evaluated) for evaluated in values])
+			if member and start is None:
+				start = l1
+			elif not member and start is not None:
+				result.append(start + l1)
+				start = None
+		if start is not None:
+			result.append(start + unique[-1][1])
+		return tuple(result)
+
+	def membership(self, X):
+		""" Computes memberships from the X-mu function, i.e. the largest alpha whose cut contains each x. Each linear interval is solved for alpha in closed form, so this is one vectorized pass per interval.
+		@param	X	a NumPy array of x values
+		@return	a NumPy array of memberships """
+		X = numpy.asarray(X, dtype=float)
+		result = numpy.zeros(X.shape)
+		for p, q, intervals in zip(self.breakpoints[:-1], self.breakpoints[1:], self.pieces):
+			for ls, li, hs, hi in intervals:
+				lower = numpy.full(X.shape, p)
+				upper = numpy.full(X.shape, q)
+				for slope, rhs, sign in ((ls, X - li, 1.0), (hs, X - hi, -1.0)):
+					# lo(alpha) <= x, and hi(alpha) >= x
+					if slope * sign > 0:
+						upper = numpy.minimum(upper, rhs / slope)
+					elif slope * sign < 0:
+						lower = numpy.maximum(lower, rhs / slope)
+					else:
+						upper = numpy.where(rhs * sign >= 0, upper, -1.0)
+				feasible = lower <= upper + self.EPSILON
+				result = numpy.where(feasible, numpy.maximum(result, upper), result)
+		return result
+
+def cut_mean(cut):
+	""" Gets the mean of a cut, weighting each interval by its width (or averaging the midpoints, if the cut has no width).
+	@param	cut	a list of (inf, sup) tuples
+	@return	a float, or NaN for an empty cut """
+	if len(cut) == 0:
+		return float('nan')
+	width = sum(hi - lo for lo, hi in cut)
+	if width > LinearXmuFunction.EPSILON:
+		return sum((hi * hi - lo * lo) / 2.0 for lo, hi in cut) / width
+	return sum((lo + hi) / 2.0 for lo, hi in cut) / len(cut)
+
+def cut_moments(alphas, lows, highs):
+	""" Computes the area and first moment of an X-mu function numerically, from its cuts at many alphas (see LinearXmuFunction.moments), by the trapezoid rule.
+	@param	alphas	a sorted NumPy array of n alphas, from 0.0 to 1.0
+	@param	lows	a NumPy array of shape (k, n) of lower endpoints (NaN where an interval is missing)
+	@param	highs	a NumPy array of shape (k, n) of upper endpoints
+	@return	a tuple of floats (area, moment) """
+	widths = numpy.nansum(highs - lows, axis=0)
+	squares = numpy.nansum((highs * highs - lows * lows) / 2.0, axis=0)
+	return float(numpy.trapz(widths, alphas)), float(numpy.trapz(squares, alphas))
+
+DEFUZZIFICATIONS = ("sigma_count", "centroid", "mean_of_maxima")
+
+def defuzzify(objects, method="centroid", alphas=None):
+	""" Defuzzifies many X-mu objects (Xmu or NumericXmu) at once. X-mu functions with a linear form are done in closed form, all together (see LinearXmuFunction.moments); the others numerically, from their cuts at many alphas.
+	@param	objects	a list of X-mu objects
+	@param	method	"sigma_count" (the area under the membership function, i.e. the integral over alpha of the cut widths), "centroid" or "mean_of_maxima"
+	@param	alphas	the alphas for the numeric fallback (default: 1001 equally spaced alphas)
+	@return	a NumPy array of floats, one per object; NaN where the value is undefined (e.g. the centroid of an empty set) """
+	if method not in DEFUZZIFICATIONS:
+		raise ValueError("Unknown defuzzification: " + str(method))
+	objects = list(objects)
+	result = numpy.full(len(objects), numpy.nan)
+	linear = [(i, obj.get_linear_xequals()) for i, obj in enumerate(objects)]
+	exact = [(i, function) for i, function in linear if function is not None]
+	sampled = [i for i, function in linear if function is None]
+	
+	if method == "mean_of_maxima":
+		for i, function in exact:
+			result[i] = function.mean_of_maxima()
+	elif len(exact) > 0:
+		areas, moments = LinearXmuFunction.moments([function for i, function in exact])
+		indices = [i for i, function in exact]
+		with numpy.errstate(invalid='ignore', divide='ignore'):
+			result[indices] = areas if method == "sigma_count" else numpy.where(areas > 0.0, moments / areas, numpy.nan)
+	
+	if len(sampled) > 0:
+		alphas = numpy.linspace(0.0, 1.0, 1001) if alphas is None else numpy.asarray(alphas, dtype=float)
+		for i in sampled:
+			lows, highs = objects[i].alphaCuts(alphas)
+			if method == "mean_of_maxima":
+				present = numpy.flatnonzero(~numpy.isnan(lows).all(axis=0))
+				if len(present) > 0:
+					j = present[-1]
+					result[i] = cut_mean([(lo, hi) for lo, hi in zip(lows[:, j], highs[:, j]) if not numpy.isnan(lo)])
+			else:
+				area, moment = cut_moments(alphas, lows, highs)
+				result[i] = area if method == "sigma_count" else (moment / area if area > 0.0 else numpy.nan)
+	return result
+
+def linear_arithmetic(first, second, operation, alphas=None):
+	""" Performs X-mu Fuzzy Arithmetic numerically, over the whole alpha range. Where both X-mu functions are a single interval with linear endpoints, addition and subtraction are exact; otherwise the operation is done in one vectorized pass over an array of alphas, and the result interpolates linearly between them.
+	@param	first	an Xmu or NumericXmu instance
+	@param	second	an Xmu or NumericXmu instance
+	@param	operation	One of the following: +, -, *, /, **
+	@param	alphas	the alphas to evaluate at when no closed form exists (default: 101 equally spaced alphas)
+	@return	a LinearXmuFunction """
+	if operation not in INTERVAL_OPERATIONS:
+		raise ValueError("Unknown arithmetic operation: " + str(operation))
+	l1 = first.get_linear_xequals()
+	l2 = second.get_linear_xequals()
+	single = l1 is not None and l2 is not None and len(l1.pieces) == 1 and len(l2.pieces) == 1 and len(l1.pieces[0]) == 1 and len(l2.pieces[0]) == 1
+	if single and operation in ("+", "-"):
+		ls1, li1, hs1, hi1 = l1.pieces[0][0]
+		ls2, li2, hs2, hi2 = l2.pieces[0][0]
+		if operation == "+":
+			return LinearXmuFunction.from_interval((ls1 + ls2, li1 + li2), (hs1 + hs2, hi1 + hi2))
+		return LinearXmuFunction.from_interval((ls1 - hs2, li1 - hi2), (hs1 - ls2, hi1 - li2))
+	
+	if alphas is None:
+		alphas = numpy.linspace(0.0, 1.0, 101)
+	alphas = numpy.unique(numpy.asarray(alphas, dtype=float))
+	lows1, highs1 = first.alphaCuts(alphas)
+	lows2, highs2 = second.alphaCuts(alphas)
+	lows = []
+	highs = []
+	for lo1, hi1 in zip(lows1, highs1):
+		for lo2, hi2 in zip(lows2, highs2):
+			for lo, hi in interval_operation(operation, lo1, hi1, lo2, hi2):
+				lows.append(lo)
+				highs.append(hi)
+	return LinearXmuFunction.from_samples(alphas, numpy.array(lows), numpy.array(highs))
+
+def box_grid(lows, highs, grid):
+	""" Builds a grid of points over a batch of boxes, one box per column. Primarily used as a private function.
+	@param	lows	a list of n NumPy arrays of shape (m,): the lower corner of each box, per dimension
+	@param	highs	a list of n NumPy arrays of shape (m,): the upper corner of each box, per dimension
+	@param	grid	the number of points per dimension
+	@return	a list of n NumPy arrays, each of shape (grid,) * n + (m,) """
+	n = len(lows)
+	steps = numpy.linspace(0.0, 1.0, grid)
+	points = []
+	for i, (lo, hi) in enumerate(zip(lows, highs)):
+		shape = [1] * n + [len(lo)]
+		shape[i] = grid
+		values = lo[numpy.newaxis, :] + steps[:, numpy.newaxis] * (hi - lo)[numpy.newaxis, :]
+		points.append(values.reshape(shape))
+	return numpy.broadcast_arrays(*points)
+
+def evaluate_grid(func, points):
+	""" Evaluates a function on a grid of points (see box_grid), flattening the grid. Primarily used as a private function.
+	@return	a NumPy array of shape (grid ** n, m) """
+	values = numpy.asarray(func(*points), dtype=float)
+	values = numpy.broadcast_arrays(values, points[0])[0]
+	return values.reshape(-1, points[0].shape[-1])
+
+def box_extremum(func, lows, highs, grid, iterations, sign):
+	""" Searches for the minimum (sign 1.0) or maximum (sign -1.0) of a function over a batch of boxes: the best grid point is found, then the search zooms in on it, each time to the cells next to the best point so far. Primarily used as a private function.
+	@return	a NumPy array of shape (m,) """
+	n = len(lows)
+	centres = [(lo + hi) / 2.0 for lo, hi in zip(lows, highs)]
+	widths = [(hi - lo) / 2.0 for lo, hi in zip(lows, highs)]
+	columns = numpy.arange(len(lows[0]))
+	best = numpy.full(len(columns), numpy.inf)
+	for _ in range(iterations):
+		box_lows = [numpy.maximum(lo, c - w) for lo, c, w in zip(lows, centres, widths)]
+		box_highs = [numpy.minimum(hi, c + w) for hi, c, w in zip(highs, centres, widths)]
+		points = box_grid(box_lows, box_highs, grid)
+		values = sign * evaluate_grid(func, points)
+		values = numpy.where(numpy.isnan(values), numpy.inf, values)
+		chosen = numpy.argmin(values, axis=0)
+		improved = values[chosen, columns] < best
+		best = numpy.where(improved, values[chosen, columns], best)
+		for i in range(n):
+			coordinate = points[i].reshape(-1, len(columns))[chosen, columns]
+			centres[i] = numpy.where(improved, coordinate, centres[i])
+			widths[i] = (box_highs[i] - box_lows[i]) / (grid - 1.0)
+	return sign * best
+
+def monotone_directions(expr, symbols, lows, highs):
+	""" Finds the boxes over which a SymPy expression is monotone in each of its symbols, by bounding each partial derivative over each box (see interval_expression). Primarily used as a private function.
+	@return	a list of n NumPy arrays of shape (m,): 1 where the expression is nondecreasing in that symbol over the box, -1 where it is nonincreasing, and 0 where the sign of the derivative is not fixed (or could not be bounded) """
+	directions = []
+	for symbol in symbols:
+		bounds = interval_expression(expr.diff(symbol), symbols, lows, highs)
+		if bounds is None:
+			directions.append(numpy.zeros(len(lows[0]), dtype=int))
+			continue
+		lo, hi = bounds
+		with numpy.errstate(invalid='ignore'):
+			directions.append(numpy.where(lo >= 0.0, 1, numpy.where(hi <= 0.0, -1, 0)))
+	return directions
+
+def extension_cuts(func, lows, highs, grid=5, iterations=30, directions=None):
+	""" Computes the image of a function over a batch of boxes (the extension principle at one alpha per box): [min f, max f] over each box.
+	Where f is known to be monotone in a variable over a box (see monotone_directions), that variable is fixed at the endpoint giving the minimum (or the maximum). Where every variable is fixed, the extreme is f at a vertex, and is exact. The remaining extremes are searched for (see box_extremum): f is evaluated on a grid over what is left of the box, which includes its vertices, and the search then zooms in on the best grid points. The search is not a bound, as features of f narrower than the grid spacing at every zoom step may be missed (and the cut is then too narrow), so these cuts are reported as not exact.
+	@param	func	a function of n NumPy arrays, returning a NumPy array (it must broadcast)
+	@param	lows	a list of n NumPy arrays of shape (m,): the lower endpoint of each operand in each box
+	@param	highs	a list of n NumPy arrays of shape (m,): the upper endpoints
+	@param	grid	the number of grid points per variable (at least 2)
+	@param	iterations	the number of zoom steps
+	@param	directions	a list of n NumPy arrays of shape (m,), as given by monotone_directions; or None if nothing is known about f (e.g. it is an opaque callable)
+	@return	a tuple of NumPy arrays (minima, maxima, exact), each of shape (m,): the extremes are NaN where f is NaN over the whole box, and exact is False where they were searched for """
+	m = len(lows[0])
+	if directions is None:
+		directions = [numpy.zeros(m, dtype=int)] * len(lows)
+	exact = numpy.ones(m, dtype=bool)
+	for direction in directions:
+		exact &= direction != 0
+	extremes = []
+	for sign in (1.0, -1.0):
+		# for the minimum, a nondecreasing variable is fixed at its lower endpoint and a nonincreasing one at its upper endpoint; the other way round for the maximum
+		box_lows = [numpy.where(direction * sign < 0, hi, lo) for lo, hi, direction in zip(lows, highs, directions)]
+		box_highs = [numpy.where(direction * sign > 0, lo, hi) for lo, hi, direction in zip(lows, highs, directions)]
+		extreme = numpy.empty(m)
+		if exact.any():
+			vertices = [lo[exact] for lo in box_lows]
+			with numpy.errstate(invalid='ignore', divide='ignore', over='ignore'):
+				extreme[exact] = numpy.broadcast_arrays(numpy.asarray(func(*vertices), dtype=float), vertices[0])[0]
+		if not exact.all():
+			searched = ~exact
+			extreme[searched] = box_extremum(func, [lo[searched] for lo in box_lows], [hi[searched] for hi in box_highs], grid, iterations, sign)
+		extremes.append(extreme)
+	minima, maxima = extremes
+	# where f is NaN everywhere, the searches give inf and -inf
+	undefined = ~(minima <= maxima)
+	minima[undefined] = numpy.nan
+	maxima[undefined] = numpy.nan
+	return minima, maxima, exact
+
+def extension_principle(func, operands, alphas=None, u=None, symbols=None, grid=5, numeric=False):
+	""" Applies a function of several fuzzy quantities through the extension principle: at each alpha, the cut of the result is the image of the cuts of the operands (see extension_cuts). All alphas, and every combination of intervals when a cut has several, are done in one vectorized batch. The result interpolates linearly between the alphas.
+	For a SymPy expression, the partial derivatives are bounded over each box with interval arithmetic (see monotone_directions), and where the expression is monotone in every operand its cut is exact. Other cuts (and every cut of an opaque callable) are found by search, which may give a cut that is too narrow; a RuntimeWarning says how many.
+	@param	func	a function of len(operands) NumPy arrays, which must broadcast (e.g. lambda a, b, c: a * b + numpy.sqrt(c)); or a SymPy expression, which is compiled with lambdify
+	@param	operands	a list of Xmu or NumericXmu instances
+	@param	alphas	the alphas to evaluate at (default: 101 equally spaced alphas)
+	@param	u	the universe of the result (default: that of the first operand)
+	@param	symbols	for a SymPy expression, its symbols in the order of the operands (default: its free symbols, sorted by name)
+	@param	grid	the number of grid points per operand
+	@param	numeric	if True, a NumericXmu (no SymPy); otherwise a BasicXmu, usable with unionX, Graph.add_plot and so on
+	@return	a NumericXmu or BasicXmu instance """
+	expression = None
+	if not callable(func):
+		sympy = symbolic()
+		expression = func
+		if symbols is None:
+			symbols = sorted(func.free_symbols, key=lambda s: s.name)
+		if len(symbols) != len(operands):
+			raise ValueError("The expression has %d symbols, but there are %d operands" % (len(symbols), len(operands)))
+		func = sympy.lambdify(symbols, func, "numpy")
+	if grid < 2:
+		raise ValueError("The grid needs at least 2 points per operand")
+	if alphas is None:
+		alphas = numpy.linspace(0.0, 1.0, 101)
+	alphas = numpy.unique(numpy.asarray(alphas, dtype=float))
+	cuts = [operand.alphaCuts(alphas) for operand in operands]
+	# one box per (combination of intervals, alpha)
+	combinations = list(itertools.product(*[range(len(lows)) for lows, highs in cuts]))
+	lows = [numpy.concatenate([cut[0][c[i]] for c in combinations]) for i, cut in enumerate(cuts)]
+	highs = [numpy.concatenate([cut[1][c[i]] for c in combinations]) for i, cut in enumerate(cuts)]
+	present = numpy.ones(len(lows[0]), dtype=bool)
+	for lo, hi in zip(lows, highs):
+		present &= ~(numpy.isnan(lo) | numpy.isnan(hi))
+	result_lows = numpy.full(len(present), numpy.nan)
+	result_highs = numpy.full(len(present), numpy.nan)
+	chosen = numpy.flatnonzero(present)
+	if len(chosen) > 0:
+		box_lows = [lo[chosen] for lo in lows]
+		box_highs = [hi[chosen] for hi in highs]
+		directions = None
+		if expression is not None:
+			directions = monotone_directions(expression, symbols, box_lows, box_highs)
+		minima, maxima, exact = extension_cuts(func, box_lows, box_highs, grid, directions=directions)
+		result_lows[chosen] = minima
+		result_highs[chosen] = maxima
+		if not exact.all():
+			warnings.warn("%d of %d cuts were found by search, and may be too narrow: f is not a SymPy expression, or is not monotone in every operand over them" % (len(exact) - exact.sum(), len(exact)), RuntimeWarning)
+	shape = (len(combinations), len(alphas))
+	linear = LinearXmuFunction.from_samples(alphas, result_lows.reshape(shape), result_highs.reshape(shape))
+	if u is None:
+		u = operands[0].u
+	if hasattr(u, "inf"):
+		u = (float(u.inf), float(u.sup))
+	return from_payload(("linear", u, linear.breakpoints, linear.pieces), numeric)
+
+##### Numeric Inversion ######################
+# X-mu functions derived from any membership function (e.g. a Gaussian, a
+# sigmoid or a hand-written Piecewise), given as a NumPy kernel. The universe
+# is sampled once; at each alpha, the endpoints of the cut are bracketed
+# between samples where mu >= alpha changes, and found by bisection, for all
+# alphas and brackets in one vectorized pass. The alphas start on a coarse
+# grid, and a segment is split until linear interpolation of its endpoints
+# is within a tolerance at its midpoint, or (where the number of intervals
+# changes inside it) until it is narrower than MIN_STEP.
+
+class MuInversion(object):
+	""" MuInversion inverts a membership function numerically, into a LinearXmuFunction. The sampled alphas and endpoints are kept, so refine can be called again with a smaller tolerance without repeating earlier work.
+	@note	Features of mu narrower than the spacing of the samples (e.g. a spike between two samples) may be missed. """
+	
+	__slots__ = ("kernel", "lower", "upper", "X", "M", "x_tolerance", "alphas", "lows", "highs", "tolerance", "linear")
+	
+	EPSILON = 1e-9
+	MIN_STEP = 1e-6
+	INITIAL_ALPHAS = 17
+	
+	def __init__(self, kernel, u, samples=1025, x_tolerance=None):
+		""" Initialises the MuInversion, sampling the membership function over the universe.
+		@param	kernel	a membership function, taking and returning NumPy arrays
+		@param	u	the (finite) universe, as an (inf, sup) tuple or anything with inf and sup attributes
+		@param	samples	the number of equally spaced x values at which mu is sampled for bracketing
+		@param	x_tolerance	the width to which each endpoint is bisected (default: 1e-9 of the universe)
+		@return	an instantiated MuInversion object """
+		if hasattr(u, "inf"):
+			u = (u.inf, u.sup)
+		self.lower, self.upper = float(u[0]), float(u[1])
+		if not (numpy.isfinite(self.lower) and numpy.isfinite(self.upper) and self.lower < self.upper):
+			raise ValueError("A numeric inversion needs a finite universe")
+		self.kernel = kernel
+		self.X = numpy.linspace(self.lower, self.upper, samples)
+		self.M = numpy.asarray(kernel(self.X), dtype=float)
+		self.x_tolerance = x_tolerance if x_tolerance is not None else 1e-9 * (self.upper - self.lower)
+		self.alphas = None
+		self.lows = None
+		self.highs = None
+		self.tolerance = None
+		self.linear = None
+	
+	def bisect(self, alphas, left, right, rising):
+		""" Bisects many brackets at once. Primarily used as a private method.
+		@param	alphas	a NumPy array of alphas, one per bracket
+		@param	left	a NumPy array of the left ends of the brackets
+		@param	right	a NumPy array of the right ends of the brackets
+		@param	rising	a boolean NumPy array: True where mu >= alpha holds at the right end (and not the left), False for the opposite
+		@return	a NumPy array of endpoints """
+		steps = int(numpy.ceil(numpy.log2(max((self.X[1] - self.X[0]) / self.x_tolerance, 1.0))))
+		inside_left = ~rising
+		for _ in range(steps):
+			middle = (left + right) / 2.0
+			move = (numpy.asarray(self.kernel(middle), dtype=float) >= alphas) == inside_left
+			left = numpy.where(move, middle, left)
+			right = numpy.where(move, right, middle)
+		return (left + right) / 2.0
+	
+	def endpoints(self, alphas):
+		""" Finds the alpha-cuts {x : mu(x) >= alpha} at many alphas. Alpha 0.0 is taken as EPSILON, so its cut is the closure of the support rather than the whole universe.
+		@param	alphas	a NumPy array of n alphas
+		@return	a tuple of NumPy arrays (lows, highs), each of shape (k, n). Missing intervals have NaN endpoints. """
+		alphas = numpy.maximum(numpy.asarray(alphas, dtype=float), self.EPSILON)
+		samples = len(self.X)
+		inside = numpy.zeros((len(alphas), samples + 2), dtype=numpy.int8)
+		inside[:, 1:-1] = self.M[numpy.newaxis, :] >= alphas[:, numpy.newaxis]
+		# +1 where a cut interval starts and -1 where one ends: column j lies between samples j-1 and j
+		changes = numpy.diff(inside, axis=1)
+		rows, columns = numpy.nonzero(changes)
+		starts = changes[rows, columns] > 0
+		values = numpy.where(columns == 0, self.lower, self.upper)
+		inner = (columns > 0) & (columns < samples)
+		values[inner] = self.bisect(alphas[rows[inner]], self.X[columns[inner] - 1], self.X[columns[inner]], starts[inner])
+		k = max(numpy.bincount(rows[starts], minlength=len(alphas)).max() if len(rows) > 0 else 0, 1)
+		result = []
+		for chosen in (starts, ~starts):
+			owners = rows[chosen]
+			ranks = numpy.arange(len(owners)) - numpy.searchsorted(owners, owners)
+			ends = numpy.full((k, len(alphas)), numpy.nan)
+			ends[ranks, owners] = values[chosen]
+			result.append(ends)
+		return result[0], result[1]
+	
+	def refine(self, tolerance=None, max_alphas=4097):
+		""" Gets the X-mu function to a tolerance, refining the alpha grid as needed (see above). Results are kept: asking again for the same or a looser tolerance than was reached returns at once.
+		@param	tolerance	the largest error allowed when interpolating an endpoint, in x units (default: 1e-3 of the universe)
+		@param	max_alphas	the most alphas to sample, after which refinement stops. If it stops before the tolerance is met, a RuntimeWarning is given, and the tolerance reached (the largest error left, or infinity where a change in the number of intervals could not be located) is kept in self.tolerance
+		@return	a LinearXmuFunction """
+		if tolerance is None:
+			tolerance = 1e-3 * (self.upper - self.lower)
+		if self.linear is not None and tolerance >= self.tolerance:
+			return self.linear
+		if self.alphas is None:
+			self.alphas = numpy.linspace(0.0, 1.0, self.INITIAL_ALPHAS)
+			self.lows, self.highs = self.endpoints(self.alphas)
+		check = numpy.ones(len(self.alphas) - 1, dtype=bool)
+		remaining = 0.0
+		while check.any():
+			left = numpy.flatnonzero(check)
+			a0, a1 = self.alphas[left], self.alphas[left + 1]
+			middles = (a0 + a1) / 2.0
+			lows, highs = self.endpoints(middles)
+			k = max(len(lows), len(self.lows))
+			lows, highs, all_lows, all_highs = [padded_rows(array, k) for array in (lows, highs, self.lows, self.highs)]
+			counts = [(~numpy.isnan(array)).sum(axis=0) for array in (all_lows[:, left], lows, all_lows[:, left + 1])]
+			same = (counts[0] == counts[1]) & (counts[1] == counts[2])
+			with numpy.errstate(invalid='ignore'):
+				errors = numpy.maximum(
+					numpy.abs(lows - (all_lows[:, left] + all_lows[:, left + 1]) / 2.0),
+					numpy.abs(highs - (all_highs[:, left] + all_highs[:, left + 1]) / 2.0))
+			errors = numpy.where(numpy.isnan(errors), 0.0, errors).max(axis=0)
+			wanted = numpy.where(same, errors > tolerance, a1 - a0 > self.MIN_STEP)
+			priority = numpy.where(same, errors, numpy.inf)
+			split = wanted.copy()
+			room = max_alphas - len(self.alphas)
+			if split.sum() > room:
+				# near the cap, the intervals with the largest errors (or a change in topology) are split first
+				split[:] = False
+				split[numpy.argsort(-numpy.where(wanted, priority, -1.0), kind="mergesort")[:max(room, 0)]] = True
+			if (wanted & ~split).any():
+				remaining = max(remaining, priority[wanted & ~split].max())
+			if not split.any():
+				break
+			alphas = numpy.concatenate((self.alphas, middles[split]))
+			order = numpy.argsort(alphas, kind="mergesort")
+			self.alphas = alphas[order]
+			self.lows = numpy.hstack((all_lows, lows[:, split]))[:, order]
+			self.highs = numpy.hstack((all_highs, highs[:, split]))[:, order]
+			added = order >= len(order) - split.sum()
+			check = added[:-1] | added[1:]
+		self.linear = LinearXmuFunction.from_samples(self.alphas, self.lows, self.highs)
+		self.tolerance = max(tolerance, remaining)
+		if remaining > tolerance:
+			warnings.warn("Numeric inversion stopped at %d alphas, with an endpoint error of up to %g (asked for %g)" % (len(self.alphas), remaining, tolerance), RuntimeWarning)
+		return self.linear
+
+def padded_rows(array, k):
+	""" Pads a 2-D array with rows of NaN, up to k rows. Primarily used as a private function.
+	@return	a NumPy array of shape (k, array.shape[1]) """
+	if len(array) >= k:
+		return array
+	return numpy.vstack((array, numpy.full((k - len(array), array.shape[1]), numpy.nan)))
+
+##### Fuzzy Implications #####################
+# Each implication takes NumPy arrays of memberships mu_a (antecedent) and
+# mu_b (consequent), which broadcast against each other, and returns the
+# implication degrees. Add new implications with register_implication.
+
+def lukasiewicz_implication(mu_a, mu_b):
+	""" Lukasiewicz implication: min(1 - a + b, 1) """
+	return numpy.minimum(1.0 - mu_a + mu_b, 1.0)
+
+def reichenbach_implication(mu_a, mu_b):
+	""" Reichenbach implication: 1 - a + a*b """
+	return 1.0 - mu_a + mu_a * mu_b
+
+def kleenedienes_implication(mu_a, mu_b):
+	""" Kleene-Dienes implication: max(1 - a, b) """
+	return numpy.maximum(1.0 - mu_a, mu_b)
+
+def binary_implication(mu_a, mu_b):
+	""" Binary implication: 1 if a <= b, otherwise 0 """
+	return numpy.where(mu_a <= mu_b, 1.0, 0.0)
+
+def zadeh_implication(mu_a, mu_b):
+	""" Zadeh implication: max(1 - a, min(a, b)) """
+	return numpy.maximum(1.0 - mu_a, numpy.minimum(mu_a, mu_b))
+
+def mamdani_implication(mu_a, mu_b):
+	""" Mamdani implication (a t-norm rather than a true implication): min(a, b) """
+	return numpy.minimum(mu_a, mu_b)
+
+IMPLICATIONS = {
+	"lukasiewicz": lukasiewicz_implication,
+	"reichenbach": reichenbach_implication,
+	"kleenedienes": kleenedienes_implication,
+	"binary": binary_implication,
+	"zadeh": zadeh_implication,
+	"mamdani": mamdani_implication,
+}
+
+def register_implication(name, func):
+	""" Registers a fuzzy implication, for use with Xmu.implication, Xmu.implicationMatrix and Xmu.implicationAtX.
+	@param	name	the implication_type name
+	@param	func	a function taking NumPy arrays (mu_a, mu_b) and returning an array of implication degrees """
+	IMPLICATIONS[name] = func
+
+###############################################
+
+class XmuCache(object):
+	""" XmuCache is a bounded least-recently-used cache, used by Xmu to memoise set operations and alpha-cuts. Keys are structural (see Xmu.get_xequals_key), so equal X-mu functions share entries, and an instance changed through a setter simply gets a new key. It may be shared between threads: each call holds a lock only while the entries are touched. """
+	
+	def __init__(self, maxsize=1024):
+		""" Initialises an empty cache.
+		@param	maxsize	the largest number of entries kept, after which the least recently used entry is evicted
+		@return	an instantiated XmuCache object """
+		self.maxsize = maxsize
+		self.entries = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+		self.lock = threading.Lock()
+	
+	def __len__(self):
+		return len(self.entries)
+	
+	def get(self, key):
+		""" Looks up a key, marking it as most recently used.
+		@param	key	a hashable key
+		@return	the cached value, or None """
+		with self.lock:
+			value = self.entries.pop(key, None)
+			if value is None:
+				self.misses += 1
+				return None
+			self.entries[key] = value
+			self.hits += 1
+			return value
+	
+	def put(self, key, value):
+		""" Stores a value, evicting the least recently used entries if the cache is full.
+		@param	key	a hashable key
+		@param	value	the value to cache (not None) """
+		with self.lock:
+			self.entries.pop(key, None)
+			self.entries[key] = value
+			while len(self.entries) > self.maxsize:
+				self.entries.popitem(last=False)
+	
+	def clear(self):
+		""" Removes all entries, and resets the counters. """
+		with self.lock:
+			self.entries.clear()
+			self.hits = 0
+			self.misses = 0
+	
+	def stats(self):
+		""" @return	a dict of hits, misses, size and maxsize """
+		with self.lock:
+			return {"hits": self.hits, "misses": self.misses, "size": len(self.entries), "maxsize": self.maxsize}
+
+##### Numeric Shapes #########################
+# Float-only counterparts of the standard shapes in xmu. They hold the
+# universe as an (inf, sup) tuple and the X-mu function as a
+# LinearXmuFunction, so building and evaluating them needs only NumPy.
+# Their payloads (see Xmu.to_payload) name the full xmu classes, so
+# to_xmu() and xmu.xmu_from_payload rebuild the equivalent Xmu object.
+
+class NumericXmu(object):
+	""" NumericXmu is a float-only counterpart of Xmu. Cuts, memberships and set operations are computed with NumPy alone; only get_xequals, get_muequals and to_xmu import SymPy, on first use. """
+	
+	__slots__ = ("u", "linear_xequals", "mu_kernel", "parameters")
+	
+	payload_name = None
+	
+	def __init__(self, u, linear=None, kernel=None):
+		""" Initialises the NumericXmu.
+		@param	u	the universe, as an (inf, sup) tuple (or anything with inf and sup attributes, such as a sympy Interval)
+		@param	linear	a LinearXmuFunction, by default the empty X-mu function
+		@param	kernel	a NumPy membership function; by default memberships are derived from the X-mu function
+		@return	an instantiated NumericXmu object """
+		if hasattr(u, "inf"):
+			u = (u.inf, u.sup)
+		self.u = (float(u[0]), float(u[1]))
+		self.linear_xequals = linear if linear is not None else LinearXmuFunction()
+		self.mu_kernel = kernel if kernel is not None else self.linear_xequals.membership
+		self.parameters = None
+	
+	@classmethod
+	def from_mu_kernel(cls, u, kernel, tolerance=None, samples=1025):
+		""" Builds a NumericXmu from any membership function, inverting it numerically (see MuInversion).
+		@param	u	the (finite) universe, as an (inf, sup) tuple
+		@param	kernel	a membership function, taking and returning NumPy arrays
+		@param	tolerance	the largest endpoint error, in x units (default: 1e-3 of the universe)
+		@param	samples	the number of x values at which mu is sampled for bracketing
+		@return	a NumericXmu instance, whose memberships come from the kernel itself """
+		return cls(u, MuInversion(kernel, u, samples).refine(tolerance), kernel)
+	
+	def __repr__(self):
+		if self.parameters is not None:
+			return "%s(%r, %s)" % (type(self).__name__, self.u, ", ".join(repr(p) for p in self.parameters))
+		return "NumericXmu(%r, %r)" % (self.u, self.linear_xequals)
+	
+	def get_linear_xequals(self):
+		""" @return	the X-mu function, as a LinearXmuFunction """
+		return self.linear_xequals
+	
+	def get_mu_kernel(self):
+		""" @return	the membership function, taking and returning NumPy arrays """
+		return self.mu_kernel
+	
+	def mu_at(self, X):
+		""" Evaluates membership for many x values in one vectorized pass.
+		@param	X	a NumPy array (or anything array-like) of x values
+		@return	a NumPy array of memberships, of the same shape as X """
+		return self.mu_kernel(numpy.asarray(X, dtype=float))
+	
+	def alphaCut(self, alpha):
+		""" Gets the alpha-cut of this object.
+		@param	alpha	a float between 0.0 and 1.0
+		@return	a sorted list of (inf, sup) tuples """
+		return self.linear_xequals.cut(alpha)
+	
+	def alphaCuts(self, alphas):
+		""" Gets the alpha-cuts of this object at many alphas, as arrays of interval endpoints.
+		@param	alphas	a NumPy array of n alphas
+		@return	a tuple of NumPy arrays (lows, highs), each of shape (k, n). Missing intervals have NaN endpoints. """
+		return self.linear_xequals.endpoints(alphas)
+	
+	def setOperationX(self, target, operation):
+		""" Performs a set operation on the linear X-mu functions. Primarily used as a private method.
+		@param	target	a NumericXmu, or an Xmu with a linear X-mu function
+		@param	operation	the LinearXmuFunction method name: "union", "intersect" or "difference"
+		@return	a NumericXmu instance; or a DiscreteXmu, when the target is one (this object is sampled at its elements, see DiscreteXmu.from_xmu) """
+		if isinstance(target, DiscreteXmu):
+			return DiscreteXmu.from_xmu(self, target.u).setOperationX(target, operation)
+		linear = target.get_linear_xequals()
+		if linear is None:
+			raise ValueError("The target has no linear X-mu function; use to_xmu() to operate on it symbolically")
+		return self.derive(getattr(self.linear_xequals, operation)(linear).clipped(*self.u))
+	
+	def derive(self, linear):
+		""" Wraps the X-mu function of an operation's result. Primarily used as a private method.
+		@param	linear	a LinearXmuFunction
+		@return	a NumericXmu instance over the same universe """
+		return NumericXmu(self.u, linear)
+	
+	def unionX(self, target):
+		""" Performs X-mu set union (itself OR target), and returns the result.
+		@return	a NumericXmu instance """
+		return self.setOperationX(target, "union")
+	
+	def intersectX(self, target):
+		""" Performs X-mu set intersection (itself AND target), and returns the result.
+		@return	a NumericXmu instance """
+		return self.setOperationX(target, "intersect")
+	
+	def differenceX(self, target):
+		""" Performs X-mu set difference (itself - target), and returns the result.
+		@return	a NumericXmu instance """
+		return self.setOperationX(target, "difference")
+	
+	def negateX(self):
+		""" Performs X-mu set negation (the universe minus itself), and returns the result.
+		@return	a NumericXmu instance """
+		universe = LinearXmuFunction.from_interval((0.0, self.u[0]), (0.0, self.u[1]))
+		return self.derive(universe.difference(self.linear_xequals))
+	
+	def fuzzyArithmeticX(self, i2, operation, alphas=None):
+		""" Performs X-mu Fuzzy Arithmetic over the whole alpha range (see linear_arithmetic), and returns the result.
+		@param	i2	a NumericXmu, or an Xmu
+		@param	operation	One of the following: +, -, *, /, **
+		@param	alphas	the alphas to evaluate at when no closed form exists
+		@return	a NumericXmu instance """
+		return self.derive(linear_arithmetic(self, i2, operation, alphas))
+	
+	def addX(self, i2, alphas=None):
+		""" Performs X-mu Addition. See fuzzyArithmeticX. """
+		return self.fuzzyArithmeticX(i2, "+", alphas)
+	
+	def subX(self, i2, alphas=None):
+		""" Performs X-mu Subtraction. See fuzzyArithmeticX. """
+		return self.fuzzyArithmeticX(i2, "-", alphas)
+	
+	def multiplyX(self, i2, alphas=None):
+		""" Performs X-mu Multiplication. See fuzzyArithmeticX. """
+		return self.fuzzyArithmeticX(i2, "*", alphas)
+	
+	def divX(self, i2, alphas=None):
+		""" Performs X-mu Division. See fuzzyArithmeticX. """
+		return self.fuzzyArithmeticX(i2, "/", alphas)
+	
+	def powX(self, i2, alphas=None):
+		""" Performs X-mu Power. See fuzzyArithmeticX. """
+		return self.fuzzyArithmeticX(i2, "**", alphas)
+	
+	def compile(self):
+		""" Gets an immutable copy of this object, which can be shared between threads (see CompiledXmu).
+		@return	a CompiledXmu instance """
+		shape = (self.payload_name, self.parameters) if self.parameters is not None else None
+		return CompiledXmu(self.u, self.linear_xequals, self.mu_kernel, shape)
+	
+	def sigmaCount(self):
+		""" Gets the sigma-count (the area under the membership function), in closed form. See defuzzify.
+		@return	a float """
+		return defuzzify([self], "sigma_count")[0]
+	
+	def centroid(self):
+		""" Gets the centroid, in closed form. See defuzzify.
+		@return	a float, or NaN for an empty set """
+		return defuzzify([self], "centroid")[0]
+	
+	def meanOfMaxima(self):
+		""" Gets the mean of maxima. See defuzzify.
+		@return	a float, or NaN for an empty set """
+		return defuzzify([self], "mean_of_maxima")[0]
+	
+	def to_payload(self):
+		""" Gets a compact description of this object, in the format of Xmu.to_payload.
+		@return	a tuple: (class name, (u.inf, u.sup), parameters) or ("linear", (u.inf, u.sup), breakpoints, pieces) """
+		if self.parameters is not None:
+			return (self.payload_name, self.u, self.parameters)
+		return ("linear", self.u, self.linear_xequals.breakpoints, self.linear_xequals.pieces)
+	
+	def to_xmu(self):
+		""" Converts this object to the equivalent SymPy-based Xmu object. Imports SymPy on first use.
+		@return	an Xmu instance """
+		return symbolic().xmu_from_payload(self.to_payload())
+	
+	def get_xequals(self):
+		""" Gets the X-mu function in SymPy. Imports SymPy on first use.
+		@return	a sympy set, or a Piecewise of sympy sets """
+		return self.linear_xequals.to_sympy()
+	
+	def get_muequals(self):
+		""" Gets the mu function in SymPy. Imports SymPy on first use.
+		@return	a sympy function """
+		return self.to_xmu().get_muequals()
+
+class NumericUpwardGradientXmu(NumericXmu):
+	""" NumericUpwardGradientXmu is the float-only counterpart of UpwardGradientXmu. """
+	
+	__slots__ = ("a", "b")
+	
+	payload_name = "UpwardGradientXmu"
+	
+	def __init__(self, u, a, b):
+		""" Initialises the NumericUpwardGradientXmu.
+		@param	u	the universe, as an (inf, sup) tuple
+		@param	a	is the last point where mu is 0.0
+		@param	b	is the point where mu becomes 1.0
+		@return	an instance of NumericUpwardGradientXmu """
+		NumericXmu.__init__(self, u)
+		self.a = float(a)
+		self.b = float(b)
+		self.linear_xequals = LinearXmuFunction.from_interval((self.b - self.a, self.a), (0.0, self.u[1]))
+		self.mu_kernel = trapezoidal_kernel(self.a, self.b, float('inf'), float('inf'))
+		self.parameters = (self.a, self.b)
+
+class NumericDownwardGradientXmu(NumericXmu):
+	""" NumericDownwardGradientXmu is the float-only counterpart of DownwardGradientXmu. """
+	
+	__slots__ = ("a", "b")
+	
+	payload_name = "DownwardGradientXmu"
+	
+	def __init__(self, u, a, b):
+		""" Initialises the NumericDownwardGradientXmu.
+		@param	u	the universe, as an (inf, sup) tuple
+		@param	a	is the last point where mu is 1.0
+		@param	b	is the point where mu becomes 0.0
+		@return	an instance of NumericDownwardGradientXmu """
+		NumericXmu.__init__(self, u)
+		self.a = float(a)
+		self.b = float(b)
+		self.linear_xequals = LinearXmuFunction.from_interval((0.0, self.u[0]), (self.a - self.b, self.b))
+		self.mu_kernel = trapezoidal_kernel(float('-inf'), float('-inf'), self.a, self.b)
+		self.parameters = (self.a, self.b)
+
+class NumericTrapezoidalXmu(NumericXmu):
+	""" NumericTrapezoidalXmu is the float-only counterpart of TrapezoidalXmu. """
+	
+	__slots__ = ("a", "b", "c", "d")
+	
+	payload_name = "TrapezoidalXmu"
+	
+	def __init__(self, u, a, b, c, d):
+		""" Initialises the NumericTrapezoidalXmu.
+		@param	u	the universe, as an (inf, sup) tuple
+		@param	a	is the last point where mu is 0.0
+		@param	b	is the point where mu becomes 1.0
+		@param	c	is the last point where mu is 1.0
+		@param	d	is the point where mu becomes 0.0 again
+		@return	an instance of NumericTrapezoidalXmu """
+		NumericXmu.__init__(self, u)
+		self.a = float(a)
+		self.b = float(b)
+		self.c = float(c)
+		self.d = float(d)
+		self.linear_xequals = LinearXmuFunction.from_interval((self.b - self.a, self.a), (self.c - self.d, self.d))
+		self.mu_kernel = trapezoidal_kernel(self.a, self.b, self.c, self.d)
+		self.parameters = (self.a, self.b, self.c, self.d)
+
+class NumericTriangularXmu(NumericXmu):
+	""" NumericTriangularXmu is the float-only counterpart of TriangularXmu. """
+	
+	__slots__ = ("a", "b", "c")
+	
+	payload_name = "TriangularXmu"
+	
+	def __init__(self, u, a, b, c):
+		""" Initialises the NumericTriangularXmu.
+		@param	u	the universe, as an (inf, sup) tuple
+		@param	a	is the last point where mu is 0.0
+		@param	b	is the point where mu becomes 1.0
+		@param	c	is the point where mu becomes 0.0 again
+		@return	an instance of NumericTriangularXmu """
+		NumericXmu.__init__(self, u)
+		self.a = float(a)
+		self.b = float(b)
+		self.c = float(c)
+		self.linear_xequals = LinearXmuFunction.from_interval((self.b - self.a, self.a), (self.b - self.c, self.c))
+		self.mu_kernel = trapezoidal_kernel(self.a, self.b, self.b, self.c)
+		self.parameters = (self.a, self.b, self.c)
+
+class CompiledXmu(NumericXmu):
+	""" CompiledXmu is an immutable NumericXmu: its X-mu function and membership kernel are fixed when it is built (see Xmu.compile), its attributes cannot be set afterwards, and nothing is computed lazily or cached on the instance. It can therefore be shared between threads, e.g. by the requests of a web server, without locks. Operations return new CompiledXmu objects. """
+	
+	__slots__ = ("shape", "frozen")
+	
+	def __init__(self, u, linear, kernel=None, shape=None):
+		""" Initialises the CompiledXmu.
+		@param	u	the universe, as an (inf, sup) tuple (or anything with inf and sup attributes)
+		@param	linear	a LinearXmuFunction, which must not be changed afterwards
+		@param	kernel	a NumPy membership function without side effects; by default memberships are derived from the X-mu function
+		@param	shape	(the name of a standard shape, its parameters), kept for to_payload; or None
+		@return	an instantiated CompiledXmu object """
+		NumericXmu.__init__(self, u, linear, kernel)
+		self.shape = shape
+		if shape is not None:
+			self.parameters = tuple(shape[1])
+		self.frozen = True
+	
+	def __setattr__(self, name, value):
+		if getattr(self, "frozen", False):
+			raise AttributeError("CompiledXmu objects are immutable")
+		object.__setattr__(self, name, value)
+	
+	def __delattr__(self, name):
+		raise AttributeError("CompiledXmu objects are immutable")
+	
+	def __repr__(self):
+		if self.shape is not None:
+			return "CompiledXmu(%s%r)" % (self.shape[0], (self.u,) + self.parameters)
+		return "CompiledXmu(%r, %r)" % (self.u, self.linear_xequals)
+	
+	def derive(self, linear):
+		return CompiledXmu(self.u, linear)
+	
+	def compile(self):
+		return self
+	
+	def to_payload(self):
+		""" Gets a compact description of this object, in the format of Xmu.to_payload.
+		@return	a tuple """
+		if self.shape is not None:
+			return (self.shape[0], self.u, self.parameters)
+		return ("linear", self.u, self.linear_xequals.breakpoints, self.linear_xequals.pieces)
+
+NUMERIC_SHAPES = {
+	"UpwardGradientXmu": NumericUpwardGradientXmu,
+	"DownwardGradientXmu": NumericDownwardGradientXmu,
+	"TrapezoidalXmu": NumericTrapezoidalXmu,
+	"TriangularXmu": NumericTriangularXmu,
+}
+
+def numeric_from_payload(payload):
+	""" Builds a NumericXmu from a payload (see Xmu.to_payload), without SymPy.
+	@param	payload	a shape or "linear" payload
+	@return	a NumericXmu instance """
+	if payload[0] in NUMERIC_SHAPES:
+		return NUMERIC_SHAPES[payload[0]](payload[1], *payload[2])
+	if payload[0] == "linear":
+		return NumericXmu(payload[1], LinearXmuFunction(payload[2], payload[3]))
+	raise ValueError("Only shape and linear payloads can be built without SymPy, not: " + str(payload[0]))
+
+##### Fuzzy Set Banks ########################
+
+class FuzzySetBank(object):
+	""" FuzzySetBank stores many standard shapes over one universe as parallel NumPy arrays: a shape code, and the a, b, c, d points of each set written as a trapezoid (gradients have infinite outer points, as in trapezoidal_kernel, and triangles have b equal to c). Memberships, alpha-cuts, unions and intersections are computed for the whole bank at once. Single sets are only built as NumericXmu or Xmu objects on demand. """
+	
+	__slots__ = ("u", "codes", "a", "b", "c", "d")
+	
+	UPWARD = 0
+	DOWNWARD = 1
+	TRAPEZOIDAL = 2
+	TRIANGULAR = 3
+	
+	SHAPE_CODES = {
+		"UpwardGradientXmu": UPWARD,
+		"DownwardGradientXmu": DOWNWARD,
+		"TrapezoidalXmu": TRAPEZOIDAL,
+		"TriangularXmu": TRIANGULAR,
+	}
+	SHAPE_NAMES = dict((code, name) for name, code in SHAPE_CODES.items())
+	
+	def __init__(self, u, codes=(), a=(), b=(), c=(), d=(), dtype=numpy.float64):
+		""" Initialises the FuzzySetBank from its arrays. Most banks are easier to build with from_parameters or from_shapes.
+		@param	u	the universe, as an (inf, sup) tuple (or anything with inf and sup attributes, such as a sympy Interval)
+		@param	codes	an array of N shape codes (UPWARD, DOWNWARD, TRAPEZOIDAL or TRIANGULAR)
+		@param	a	an array of N points where mu stops being 0.0 (-inf for downward gradients)
+		@param	b	an array of N points where mu becomes 1.0 (-inf for downward gradients)
+		@param	c	an array of N points where mu stops being 1.0 (inf for upward gradients)
+		@param	d	an array of N points where mu becomes 0.0 again (inf for upward gradients)
+		@param	dtype	the float type of the points; numpy.float32 halves the memory used
+		@return	an instantiated FuzzySetBank object """
+		if hasattr(u, "inf"):
+			u = (u.inf, u.sup)
+		self.u = (float(u[0]), float(u[1]))
+		self.codes = numpy.asarray(codes, dtype=numpy.int8)
+		self.a = numpy.asarray(a, dtype=dtype)
+		self.b = numpy.asarray(b, dtype=dtype)
+		self.c = numpy.asarray(c, dtype=dtype)
+		self.d = numpy.asarray(d, dtype=dtype)
+	
+	def __len__(self):
+		return len(self.codes)
+	
+	def __repr__(self):
+		return "<FuzzySetBank of %d sets over %r>" % (len(self), self.u)
+	
+	@classmethod
+	def from_parameters(cls, u, shape, parameters, dtype=numpy.float64):
+		""" Creates a bank of sets which all have the same shape.
+		@param	u	the universe, as an (inf, sup) tuple
+		@param	shape	a shape code, or the name of a shape class (e.g. "TrapezoidalXmu")
+		@param	parameters	an array of shape (N, k) holding the parameters of each set, as passed to the shape class: (a, b) for gradients, (a, b, c, d) for trapezoids and (a, b, c) for triangles
+		@param	dtype	the float type of the points
+		@return	a FuzzySetBank """
+		code = cls.SHAPE_CODES.get(shape, shape)
+		parameters = numpy.asarray(parameters, dtype=float).reshape(-1, 4 if code == cls.TRAPEZOIDAL else 3 if code == cls.TRIANGULAR else 2)
+		infinite = numpy.full(len(parameters), numpy.inf)
+		if code == cls.UPWARD:
+			points = (parameters[:, 0], parameters[:, 1], infinite, infinite)
+		elif code == cls.DOWNWARD:
+			points = (-infinite, -infinite, parameters[:, 0], parameters[:, 1])
+		elif code == cls.TRAPEZOIDAL:
+			points = (parameters[:, 0], parameters[:, 1], parameters[:, 2], parameters[:, 3])
+		elif code == cls.TRIANGULAR:
+			points = (parameters[:, 0], parameters[:, 1], parameters[:, 1], parameters[:, 2])
+		else:
+			raise ValueError("Unknown shape: " + str(shape))
+		return cls(u, numpy.full(len(parameters), code), *points, dtype=dtype)
+	
+	@classmethod
+	def from_shapes(cls, u, shapes, dtype=numpy.float64):
+		""" Creates a bank from standard shape objects.
+		@param	u	the universe, as an (inf, sup) tuple
+		@param	shapes	a list of shape objects (UpwardGradientXmu, NumericTrapezoidalXmu, etc.)
+		@param	dtype	the float type of the points
+		@return	a FuzzySetBank """
+		groups = {}
+		for i, shape in enumerate(shapes):
+			payload = shape.to_payload()
+			if payload[0] not in cls.SHAPE_CODES:
+				raise ValueError("Only the standard shapes can be stored in a FuzzySetBank, not: " + str(payload[0]))
+			groups.setdefault(payload[0], []).append((i, payload[2]))
+		if len(groups) == 0:
+			return cls(u, dtype=dtype)
+		order = []
+		banks = []
+		for name, members in groups.items():
+			order.extend(i for i, parameters in members)
+			banks.append(cls.from_parameters(u, name, [parameters for i, parameters in members], dtype))
+		return cls.concatenate(banks).take(numpy.argsort(order))
+	
+	@classmethod
+	def concatenate(cls, banks):
+		""" Joins banks over the same universe into one.
+		@param	banks	a list of FuzzySetBank instances
+		@return	a FuzzySetBank """
+		first = banks[0]
+		return cls(first.u, *[numpy.concatenate([getattr(bank, name) for bank in banks]) for name in ("codes", "a", "b", "c", "d")], dtype=first.a.dtype)
+	
+	def take(self, indices):
+		""" Selects sets from the bank, e.g. to pair every set with every other set before a union.
+		@param	indices	an array of indices, a boolean mask or a slice
+		@return	a FuzzySetBank """
+		return FuzzySetBank(self.u, self.codes[indices], self.a[indices], self.b[indices], self.c[indices], self.d[indices], dtype=self.a.dtype)
+	
+	def __getitem__(self, index):
+		""" Gets one set of the bank as a NumericXmu, or several as a FuzzySetBank.
+		@param	index	an integer, or anything accepted by take
+		@return	a NumericXmu instance, or a FuzzySetBank """
+		if isinstance(index, (int, long, numpy.integer)):
+			return NUMERIC_SHAPES[self.SHAPE_NAMES[int(self.codes[index])]](self.u, *self.parameters(index))
+		return self.take(index)
+	
+	def parameters(self, index):
+		""" Gets the parameters of one set, as they would be passed to its shape class.
+		@param	index	an integer
+		@return	a tuple of floats """
+		code = self.codes[index]
+		a, b, c, d = float(self.a[index]), float(self.b[index]), float(self.c[index]), float(self.d[index])
+		if code == self.UPWARD:
+			return (a, b)
+		if code == self.DOWNWARD:
+			return (c, d)
+		if code == self.TRIANGULAR:
+			return (a, b, d)
+		return (a, b, c, d)
+	
+	def to_payload(self, index):
+		""" @return	the payload of one set (see Xmu.to_payload) """
+		return (self.SHAPE_NAMES[int(self.codes[index])], self.u, self.parameters(index))
+	
+	def to_xmu(self, index):
+		""" Builds one set of the bank as a full, SymPy-based Xmu object. Imports SymPy on first use.
+		@param	index	an integer
+		@return	an Xmu instance """
+		return symbolic().xmu_from_payload(self.to_payload(index))
+	
+	def nbytes(self):
+		""" @return	the number of bytes held by the bank's arrays """
+		return sum(array.nbytes for array in (self.codes, self.a, self.b, self.c, self.d))
+	
+	def points(self, ndim):
+		""" Gets the a, b, c, d arrays shaped as columns, to broadcast against an array of ndim dimensions. Primarily used as a private method.
+		@return	a tuple of four NumPy arrays """
+		shape = (-1,) + (1,) * ndim
+		return self.a.reshape(shape), self.b.reshape(shape), self.c.reshape(shape), self.d.reshape(shape)
+	
+	def mu_at(self, X):
+		""" Evaluates the membership of every set in the bank at many x values, in one vectorized pass.
+		@param	X	a NumPy array (or anything array-like) of x values
+		@return	a NumPy array of shape (N,) + X.shape """
+		X = numpy.asarray(X, dtype=float)
+		a, b, c, d = self.points(X.ndim)
+		with numpy.errstate(invalid='ignore', divide='ignore'):
+			rise = numpy.where(b > a, 1.0 / (b - a), 0.0)
+			fall = numpy.where(d > c, 1.0 / (d - c), 0.0)
+			return numpy.where((b <= X) & (X <= c), 1.0,
+				numpy.where((a < X) & (X < b), (X - a) * rise,
+				numpy.where((c < X) & (X < d), (d - X) * fall, 0.0)))
+	
+	def alphaCuts(self, alphas):
+		""" Gets the alpha-cut of every set in the bank. Each cut is a single interval; the cuts of gradients end at the universe.
+		@param	alphas	a float, or a NumPy array of alphas
+		@return	a tuple of NumPy arrays (lows, highs), each of shape (N,) + alphas.shape """
+		alphas = numpy.asarray(alphas, dtype=float)
+		a, b, c, d = self.points(alphas.ndim)
+		with numpy.errstate(invalid='ignore'):
+			lows = numpy.where(numpy.isinf(a), self.u[0], a + alphas * (b - a))
+			highs = numpy.where(numpy.isinf(d), self.u[1], d - alphas * (d - c))
+		return lows, highs
+	
+	def intersectCuts(self, other, alphas):
+		""" Intersects each set of this bank with the matching set of another bank (or with a bank holding one set), at the given alphas.
+		@param	other	a FuzzySetBank of the same length, or of length 1
+		@param	alphas	a float, or a NumPy array of alphas
+		@return	a tuple of NumPy arrays (lows, highs), each of shape (N,) + alphas.shape. Empty intersections have NaN endpoints.
+		@note	Cuts are closed, so cuts which only touch intersect in a single point (LinearXmuFunction drops such points). """
+		l1, h1 = self.alphaCuts(alphas)
+		l2, h2 = other.alphaCuts(alphas)
+		lows = numpy.maximum(l1, l2)
+		highs = numpy.minimum(h1, h2)
+		empty = lows > highs
+		return numpy.where(empty, numpy.nan, lows), numpy.where(empty, numpy.nan, highs)
+	
+	def unionCuts(self, other, alphas):
+		""" Unites each set of this bank with the matching set of another bank (or with a bank holding one set), at the given alphas.
+		@param	other	a FuzzySetBank of the same length, or of length 1
+		@param	alphas	a float, or a NumPy array of alphas
+		@return	a tuple of NumPy arrays (lows, highs), each of shape (2, N) + alphas.shape: the lower interval, then the upper interval, which has NaN endpoints where the two cuts overlap """
+		l1, h1 = self.alphaCuts(alphas)
+		l2, h2 = other.alphaCuts(alphas)
+		overlap = (l1 <= h2) & (l2 <= h1)
+		first = l1 <= l2
+		lows = numpy.array([numpy.minimum(l1, l2), numpy.where(overlap, numpy.nan, numpy.where(first, l2, l1))])
+		highs = numpy.array([numpy.where(overlap, numpy.maximum(h1, h2), numpy.where(first, h1, h2)), numpy.where(overlap, numpy.nan, numpy.where(first, h2, h1))])
+		return lows, highs
+	
+	def defuzzify(self, method="centroid"):
+		""" Defuzzifies every set in the bank in closed form: the endpoints of each cut are linear in alpha, so cuts at alpha 0.0, 0.5 and 1.0 are enough (see LinearXmuFunction.moments).
+		@param	method	"sigma_count", "centroid" or "mean_of_maxima"
+		@return	a NumPy array of N floats """
+		if method not in DEFUZZIFICATIONS:
+			raise ValueError("Unknown defuzzification: " + str(method))
+		lows, highs = self.alphaCuts(numpy.array([0.0, 0.5, 1.0]))
+		if method == "mean_of_maxima":
+			return (lows[:, 2] + highs[:, 2]) / 2.0
+		widths = highs - lows
+		areas = (widths[:, 0] + widths[:, 2]) / 2.0
+		if method == "sigma_count":
+			return areas
+		squares = (highs * highs - lows * lows) / 2.0
+		moments = (squares[:, 0] + 4.0 * squares[:, 1] + squares[:, 2]) / 6.0
+		with numpy.errstate(invalid='ignore', divide='ignore'):
+			return numpy.where(areas > 0.0, moments / areas, numpy.nan)
+	
+	def intersect_mu_at(self, other, X):
+		""" Evaluates the memberships of the pairwise intersections (see intersectCuts) at many x values.
+		@param	other	a FuzzySetBank of the same length, or of length 1
+		@param	X	a NumPy array of x values
+		@return	a NumPy array of shape (N,) + X.shape """
+		return numpy.minimum(self.mu_at(X), other.mu_at(X))
+	
+	def union_mu_at(self, other, X):
+		""" Evaluates the memberships of the pairwise unions (see unionCuts) at many x values.
+		@param	other	a FuzzySetBank of the same length, or of length 1
+		@param	X	a NumPy array of x values
+		@return	a NumPy array of shape (N,) + X.shape """
+		return numpy.maximum(self.mu_at(X), other.mu_at(X))
+
+##### Discrete Universes ####################
+# X-mu functions over a finite (e.g. categorical) universe. The memberships
+# of a DiscreteXmu are kept as a sorted array of levels and one packed bitset
+# (numpy.packbits, one bit per element of the universe) per level: the bitset
+# of level i is the alpha-cut for every alpha in (levels[i-1], levels[i]].
+# Alpha-cuts are then a binary search, and set operations are bitwise
+# operations on the bitsets of the merged levels. As with the continuous
+# X-mu functions, the cuts need not be nested (e.g. after a difference).
+
+POPCOUNT = numpy.array([bin(i).count("1") for i in range(256)], dtype=numpy.int64)
+
+class DiscreteUniverse(object):
+	""" DiscreteUniverse is a finite universe: an ordered sequence of hashable elements. Each element is given a position, which is its bit in the bitsets of a DiscreteXmu. """
+	
+	__slots__ = ("elements", "index")
+	
+	def __init__(self, elements):
+		""" Initialises the DiscreteUniverse.
+		@param	elements	a sequence of distinct, hashable elements (or a NumPy array)
+		@return	an instantiated DiscreteUniverse object """
+		self.elements = elements if isinstance(elements, numpy.ndarray) else tuple(elements)
+		self.index = None
+	
+	def __len__(self):
+		return len(self.elements)
+	
+	def __repr__(self):
+		return "<DiscreteUniverse of %d elements>" % len(self)
+	
+	def __eq__(self, other):
+		if self is other:
+			return True
+		return isinstance(other, DiscreteUniverse) and len(self) == len(other) and bool(numpy.all(numpy.asarray(self.elements) == numpy.asarray(other.elements)))
+	
+	def __ne__(self, other):
+		return not self == other
+	
+	__hash__ = object.__hash__
+	
+	def positions(self, elements):
+		""" Gets the positions of many elements. The position index is built on first use.
+		@param	elements	a sequence of elements of this universe
+		@return	a NumPy array of positions """
+		if self.index is None:
+			self.index = dict((element, i) for i, element in enumerate(self.elements))
+		index = self.index
+		try:
+			return numpy.fromiter((index[element] for element in elements), dtype=numpy.intp)
+		except KeyError as error:
+			raise KeyError("Not an element of the universe: " + repr(error.args[0]))
+	
+	def take(self, positions):
+		""" Gets the elements at many positions.
+		@param	positions	a sequence of positions
+		@return	a list of elements """
+		if isinstance(self.elements, numpy.ndarray):
+			return self.elements[positions].tolist()
+		return [self.elements[i] for i in positions]
+	
+	def bits(self, mask):
+		""" Packs a boolean mask over the universe into a bitset.
+		@param	mask	a NumPy array of len(self) booleans
+		@return	a NumPy array of uint8 """
+		return numpy.packbits(numpy.asarray(mask, dtype=bool))
+	
+	def mask(self, bits):
+		""" Unpacks a bitset into a boolean mask over the universe.
+		@param	bits	a NumPy array of uint8, or a 2-D array with one bitset per row
+		@return	a NumPy array of booleans, of shape bits.shape[:-1] + (len(self),) """
+		return numpy.unpackbits(bits, axis=-1)[..., :len(self)].astype(bool)
+
+class DiscreteXmu(object):
+	""" DiscreteXmu is an X-mu function over a DiscreteUniverse, held as sorted levels with one packed bitset per level (see above). It has the alphaCut, mu_at, unionX, intersectX, differenceX and negateX of Xmu, computed with NumPy alone. """
+	
+	__slots__ = ("u", "levels", "bits")
+	
+	def __init__(self, u, levels=(), bits=None):
+		""" Initialises the DiscreteXmu from its levels and bitsets. Most are easier to build with from_memberships.
+		@param	u	a DiscreteUniverse, or a sequence of elements
+		@param	levels	a sorted NumPy array of L distinct levels in (0.0, 1.0]
+		@param	bits	a NumPy array of uint8, of shape (L, (len(u) + 7) // 8): the bitset of each level
+		@return	an instantiated DiscreteXmu object """
+		if not isinstance(u, DiscreteUniverse):
+			u = DiscreteUniverse(u)
+		self.u = u
+		self.levels = numpy.asarray(levels, dtype=float)
+		if bits is None:
+			bits = numpy.zeros((len(self.levels), (len(u) + 7) // 8), dtype=numpy.uint8)
+		self.bits = numpy.asarray(bits, dtype=numpy.uint8)
+	
+	def __repr__(self):
+		return "<DiscreteXmu of %d levels over %r>" % (len(self.levels), self.u)
+	
+	@classmethod
+	def from_memberships(cls, u, memberships, resolution=None):
+		""" Builds a DiscreteXmu from the membership of each element. There is one bitset per distinct non-zero membership, so memberships which come from measurements are best rounded with resolution.
+		@param	u	a DiscreteUniverse, or a sequence of elements
+		@param	memberships	a NumPy array of len(u) memberships, in the order of the universe; or a dict of element: membership, with 0.0 for the elements left out
+		@param	resolution	if given, memberships are rounded to multiples of 1.0 / resolution (e.g. 255)
+		@return	a DiscreteXmu instance """
+		if not isinstance(u, DiscreteUniverse):
+			u = DiscreteUniverse(u)
+		if isinstance(memberships, dict):
+			mu = numpy.zeros(len(u))
+			mu[u.positions(memberships.keys())] = list(memberships.values())
+		else:
+			mu = numpy.asarray(memberships, dtype=float)
+			if mu.shape != (len(u),):
+				raise ValueError("Expected %d memberships, got %r" % (len(u), mu.shape))
+		mu = numpy.clip(mu, 0.0, 1.0)
+		if resolution is not None:
+			mu = numpy.round(mu * resolution) / float(resolution)
+		levels = numpy.unique(mu[mu > 0.0])
+		bits = numpy.empty((len(levels), (len(u) + 7) // 8), dtype=numpy.uint8)
+		for i, level in enumerate(levels):
+			bits[i] = numpy.packbits(mu >= level)
+		return cls(u, levels, bits)
+	
+	@classmethod
+	def from_xmu(cls, xmu, u, resolution=None):
+		""" Samples the memberships of an Xmu (or NumericXmu) object at the elements of a numeric universe.
+		@param	xmu	an Xmu or NumericXmu instance
+		@param	u	a DiscreteUniverse of numbers, or a sequence of numbers
+		@param	resolution	see from_memberships
+		@return	a DiscreteXmu instance """
+		if not isinstance(u, DiscreteUniverse):
+			u = DiscreteUniverse(u)
+		return cls.from_memberships(u, xmu.mu_at(numpy.asarray(u.elements, dtype=float)), resolution)
+	
+	def nbytes(self):
+		""" @return	the memory used by the levels and bitsets, in bytes """
+		return self.levels.nbytes + self.bits.nbytes
+	
+	def level_index(self, alpha):
+		""" Finds the bitset holding the alpha-cut. Primarily used as a private method.
+		@param	alpha	a float between 0.0 and 1.0
+		@return	an index into levels and bits, or len(levels) if the cut is empty """
+		return bisect.bisect_left(self.levels, alpha)
+	
+	def alphaCutBits(self, alpha):
+		""" Gets the alpha-cut as a bitset, without copying.
+		@param	alpha	a float between 0.0 and 1.0
+		@return	a read-only NumPy array of uint8 """
+		i = self.level_index(alpha)
+		if i == len(self.levels):
+			return numpy.zeros(self.bits.shape[1], dtype=numpy.uint8)
+		row = self.bits[i]
+		row.flags.writeable = False
+		return row
+	
+	def alphaCutMask(self, alpha):
+		""" Gets the alpha-cut as a boolean mask over the universe.
+		@param	alpha	a float between 0.0 and 1.0
+		@return	a NumPy array of len(u) booleans """
+		return self.u.mask(self.alphaCutBits(alpha))
+	
+	def alphaCut(self, alpha):
+		""" Gets the alpha-cut of this object.
+		@param	alpha	a float between 0.0 and 1.0
+		@return	a list of elements, in the order of the universe """
+		return self.u.take(numpy.flatnonzero(self.alphaCutMask(alpha)))
+	
+	def cardinalities(self):
+		""" @return	a NumPy array with the number of elements in the bitset of each level """
+		return POPCOUNT[self.bits].sum(axis=1)
+	
+	def memberships(self):
+		""" Gets the membership of every element of the universe: the largest level whose bitset holds it.
+		@return	a NumPy array of len(u) memberships """
+		mu = numpy.zeros(len(self.u))
+		for level, row in zip(self.levels, self.bits):
+			mu[self.u.mask(row)] = level
+		return mu
+	
+	def mu_at(self, X):
+		""" Evaluates membership for many elements.
+		@param	X	a sequence of elements of the universe
+		@return	a NumPy array of memberships """
+		return self.memberships()[self.u.positions(X)]
+	
+	def sigmaCount(self):
+		""" Gets the sigma-count: the integral over alpha of the size of the cuts, which for nested cuts is the sum of the memberships.
+		@return	a float """
+		widths = numpy.diff(numpy.concatenate(([0.0], self.levels)))
+		return float(numpy.dot(widths, self.cardinalities()))
+	
+	def setOperationX(self, target, operation):
+		""" Performs an X-mu set operation level by level: the levels of both operands are merged, and the bitsets of each merged level are combined bitwise. Primarily used as a private method.
+		@param	target	a DiscreteXmu over an equal universe, or an Xmu or NumericXmu (which is sampled at the elements, see from_xmu)
+		@param	operation	One of the following: union, intersect, difference
+		@return	a DiscreteXmu instance """
+		if not isinstance(target, DiscreteXmu):
+			target = DiscreteXmu.from_xmu(target, self.u)
+		elif target.u != self.u:
+			raise ValueError("DiscreteXmu set operations need equal universes")
+		levels = numpy.union1d(self.levels, target.levels)
+		bits1 = self.level_bits(levels)
+		bits2 = target.level_bits(levels)
+		if operation == "union":
+			bits = bits1 | bits2
+		elif operation == "intersect":
+			bits = bits1 & bits2
+		elif operation == "difference":
+			bits = bits1 & ~bits2
+		else:
+			raise ValueError("Unknown set operation: " + str(operation))
+		return DiscreteXmu(self.u, levels, bits).normalised()
+	
+	def level_bits(self, levels):
+		""" Gets the bitsets of the alpha-cuts at each of the given levels. Primarily used as a private method.
+		@param	levels	a sorted NumPy array of levels
+		@return	a NumPy array of uint8, of shape (len(levels), bytes) """
+		padded = numpy.vstack((self.bits, numpy.zeros((1, self.bits.shape[1]), dtype=numpy.uint8)))
+		return padded[numpy.searchsorted(self.levels, levels, side="left")]
+	
+	def normalised(self):
+		""" Drops levels which do not change the X-mu function: empty bitsets at the top, and each level whose bitset equals the next one.
+		@return	a DiscreteXmu instance """
+		filled = numpy.flatnonzero(self.bits.any(axis=1))
+		top = filled[-1] + 1 if len(filled) > 0 else 0
+		levels, bits = self.levels[:top], self.bits[:top]
+		keep = numpy.ones(top, dtype=bool)
+		if top > 1:
+			keep[:-1] = (bits[:-1] != bits[1:]).any(axis=1)
+		return DiscreteXmu(self.u, levels[keep], bits[keep])
+	
+	def unionX(self, target):
+		""" Performs X-mu set union (itself OR target), and returns the result.
+		@return	a DiscreteXmu instance """
+		return self.setOperationX(target, "union")
+	
+	def intersectX(self, target):
+		""" Performs X-mu set intersection (itself AND target), and returns the result.
+		@return	a DiscreteXmu instance """
+		return self.setOperationX(target, "intersect")
+	
+	def differenceX(self, target):
+		""" Performs X-mu set difference (itself - target), and returns the result.
+		@return	a DiscreteXmu instance """
+		return self.setOperationX(target, "difference")
+	
+	def negateX(self):
+		""" Performs X-mu set negation (the universe minus itself), and returns the result.
+		@return	a DiscreteXmu instance """
+		universe = DiscreteXmu(self.u, [1.0], [self.u.bits(numpy.ones(len(self.u), dtype=bool))])
+		return universe.differenceX(self)
+	
+	def get_xequals(self):
+		""" Gets the X-mu function in SymPy, as a Piecewise of FiniteSets. Imports SymPy on first use, and is only practical for small universes.
+		@return	a sympy Piecewise """
+		xmu = symbolic()
+		pieces = [(xmu.FiniteSet(*self.u.take(numpy.flatnonzero(self.u.mask(row)))), xmu.ALPHA <= level) for level, row in zip(self.levels, self.bits)]
+		return xmu.Piecewise(*(pieces + [(xmu.EmptySet(), True)]))
+
+##### Streaming Fitting ######################
+# Membership functions fitted to a stream of values in one pass. The values
+# are summarised by a StreamingHistogram (the streaming histogram of Ben-Haim
+# and Tom-Tov: at most max_bins (centroid, count) bins, where adding values
+# merges the closest bins), so memory does not grow with the stream. With a
+# decay below 1.0, old values fade out and the fit follows a drifting
+# distribution. Shapes are placed at quantiles of the histogram.
+
+class StreamingHistogram(object):
+	""" StreamingHistogram is a bounded-memory summary of a stream of values, from which quantiles can be estimated. """
+	
+	__slots__ = ("max_bins", "decay", "centroids", "counts", "minimum", "maximum")
+	
+	def __init__(self, max_bins=64, decay=1.0):
+		""" Initialises an empty StreamingHistogram.
+		@param	max_bins	the largest number of bins kept; more bins give closer quantiles
+		@param	decay	the factor by which the weight of every value is multiplied for each later value (e.g. 0.9999 forgets with a half-life of about 7000 values); 1.0 never forgets
+		@return	an instantiated StreamingHistogram object """
+		if max_bins < 2:
+			raise ValueError("A StreamingHistogram needs at least 2 bins")
+		if not 0.0 < decay <= 1.0:
+			raise ValueError("The decay must be in (0.0, 1.0]")
+		self.max_bins = int(max_bins)
+		self.decay = float(decay)
+		self.centroids = numpy.zeros(0)
+		self.counts = numpy.zeros(0)
+		self.minimum = float("inf")
+		self.maximum = float("-inf")
+	
+	def __len__(self):
+		return len(self.centroids)
+	
+	def __repr__(self):
+		return "<StreamingHistogram of %d bins, count %g>" % (len(self), self.count())
+	
+	def count(self):
+		""" @return	the (decayed) number of values seen """
+		return float(self.counts.sum())
+	
+	def update(self, values):
+		""" Adds a chunk of values. Chunks of many values are much cheaper than single values: a chunk is first summarised into max_bins equal-weight bins, which are then merged into the histogram.
+		@param	values	a number, or a NumPy array (or anything array-like) of numbers; NaNs are ignored
+		@return	this StreamingHistogram """
+		values = numpy.asarray(values, dtype=float).ravel()
+		values = values[~numpy.isnan(values)]
+		n = len(values)
+		if n == 0:
+			return self
+		if self.decay < 1.0:
+			self.counts = self.counts * self.decay ** n
+			weights = self.decay ** numpy.arange(n - 1, -1, -1, dtype=float)
+		else:
+			weights = numpy.ones(n)
+		if n > self.max_bins:
+			order = numpy.argsort(values, kind="mergesort")
+			values, weights = values[order], weights[order]
+			starts = numpy.unique(numpy.linspace(0, n, self.max_bins + 1).astype(int)[:-1])
+			sums = numpy.add.reduceat(values * weights, starts)
+			weights = numpy.add.reduceat(weights, starts)
+			chunk = sums / weights
+		else:
+			chunk = values
+		self.add_bins(chunk, weights, values.min(), values.max())
+		return self
+	
+	def merge(self, other):
+		""" Adds the bins of another StreamingHistogram (e.g. one filled by another process), as if its values had been added here.
+		@param	other	a StreamingHistogram
+		@return	this StreamingHistogram """
+		if len(other) > 0:
+			self.add_bins(other.centroids, other.counts, other.minimum, other.maximum)
+		return self
+	
+	def add_bins(self, centroids, counts, minimum, maximum):
+		""" Adds bins, then merges the closest pairs of bins until at most max_bins remain. Primarily used as a private method.
+		@param	centroids	a NumPy array of bin centroids
+		@param	counts	a NumPy array of bin counts
+		@param	minimum	the smallest value in the new bins
+		@param	maximum	the largest value in the new bins """
+		centroids = numpy.concatenate((self.centroids, centroids))
+		counts = numpy.concatenate((self.counts, counts))
+		kept = counts > 0.0
+		centroids, counts = centroids[kept], counts[kept]
+		order = numpy.argsort(centroids, kind="mergesort")
+		centroids, counts = centroids[order], counts[order]
+		while len(centroids) > self.max_bins:
+			i = numpy.argmin(numpy.diff(centroids))
+			count = counts[i] + counts[i + 1]
+			centroids[i] = (centroids[i] * counts[i] + centroids[i + 1] * counts[i + 1]) / count
+			counts[i] = count
+			centroids = numpy.delete(centroids, i + 1)
+			counts = numpy.delete(counts, i + 1)
+		self.centroids, self.counts = centroids, counts
+		if self.decay < 1.0:
+			# the old extremes fade out with their values, so only the outermost bins hold them
+			self.minimum = min(minimum, centroids[0])
+			self.maximum = max(maximum, centroids[-1])
+		else:
+			self.minimum = min(self.minimum, minimum)
+			self.maximum = max(self.maximum, maximum)
+	
+	def quantiles(self, q):
+		""" Estimates quantiles: half of each bin's count is taken to lie on either side of its centroid, and the cumulative count is interpolated linearly between centroids (and the extremes).
+		@param	q	a float, or a NumPy array of floats, between 0.0 and 1.0
+		@return	a float, or a NumPy array of the same shape as q """
+		if len(self) == 0:
+			raise ValueError("No values have been added")
+		total = self.counts.sum()
+		cumulative = numpy.concatenate(([0.0], numpy.cumsum(self.counts) - self.counts / 2.0, [total]))
+		points = numpy.concatenate(([self.minimum], self.centroids, [self.maximum]))
+		result = numpy.interp(numpy.asarray(q, dtype=float) * total, cumulative, points)
+		return float(result) if numpy.ndim(result) == 0 else result
+
+FITTED_PERCENTILES = {
+	"UpwardGradientXmu": (0.5, 0.9),
+	"DownwardGradientXmu": (0.1, 0.5),
+	"TriangularXmu": (0.1, 0.5, 0.9),
+	"TrapezoidalXmu": (0.1, 0.25, 0.75, 0.9),
+}
+
+class StreamingFitter(object):
+	""" StreamingFitter fits the standard shapes to an unbounded stream of values in one pass, using a StreamingHistogram. Values can be added at any time, and fit or partition called again, without rescanning earlier values. """
+	
+	__slots__ = ("histogram",)
+	
+	def __init__(self, max_bins=64, decay=1.0):
+		""" Initialises the StreamingFitter.
+		@param	max_bins	see StreamingHistogram
+		@param	decay	see StreamingHistogram
+		@return	an instantiated StreamingFitter object """
+		self.histogram = StreamingHistogram(max_bins, decay)
+	
+	def update(self, values):
+		""" Adds a chunk of values (see StreamingHistogram.update).
+		@return	this StreamingFitter """
+		self.histogram.update(values)
+		return self
+	
+	def consume(self, values, chunksize=65536):
+		""" Adds a (possibly unbounded) stream of values in chunks, so memory use depends on chunksize rather than on the size of the input.
+		@param	values	a NumPy array (including a numpy.memmap), or any iterable of numbers or numeric strings
+		@param	chunksize	the number of values per chunk
+		@return	this StreamingFitter """
+		if hasattr(values, "shape") and hasattr(values, "__getitem__"):
+			for i in xrange(0, len(values), chunksize):
+				self.histogram.update(values[i:i + chunksize])
+			return self
+		iterator = iter(values)
+		while True:
+			chunk = numpy.fromiter((float(v) for v in itertools.islice(iterator, chunksize)), dtype=float)
+			if chunk.size == 0:
+				return self
+			self.histogram.update(chunk)
+	
+	def quantiles(self, q):
+		""" @return	the estimated quantiles of the values seen (see StreamingHistogram.quantiles) """
+		return self.histogram.quantiles(q)
+	
+	def universe(self, u=None):
+		""" Gets the universe of the fitted terms. Primarily used as a private method.
+		@param	u	an (inf, sup) tuple or sympy Interval, or None for the extremes of the values seen
+		@return	an (inf, sup) tuple """
+		if u is None:
+			if len(self.histogram) == 0:
+				raise ValueError("No values have been added")
+			return (self.histogram.minimum, self.histogram.maximum)
+		if hasattr(u, "inf"):
+			return (float(u.inf), float(u.sup))
+		return (float(u[0]), float(u[1]))
+	
+	def fit(self, shape, percentiles=None, u=None, numeric=True):
+		""" Fits one of the standard shapes, with its points at percentiles of the values seen so far.
+		@param	shape	"UpwardGradientXmu", "DownwardGradientXmu", "TriangularXmu" or "TrapezoidalXmu"
+		@param	percentiles	the quantiles (between 0.0 and 1.0) for the points of the shape, in order; by default those in FITTED_PERCENTILES
+		@param	u	the universe (see universe)
+		@param	numeric	if True, a NumericXmu (no SymPy); otherwise the SymPy-based Xmu
+		@return	an instance of the shape """
+		if shape not in FITTED_PERCENTILES:
+			raise ValueError("Unknown shape: " + str(shape))
+		if percentiles is None:
+			percentiles = FITTED_PERCENTILES[shape]
+		if len(percentiles) != len(FITTED_PERCENTILES[shape]):
+			raise ValueError("%s needs %d percentiles" % (shape, len(FITTED_PERCENTILES[shape])))
+		points = tuple(float(p) for p in self.quantiles(numpy.asarray(percentiles, dtype=float)))
+		if points[0] >= points[-1]:
+			raise ValueError("The values seen have no spread at these percentiles")
+		return from_payload((shape, self.universe(u), points), numeric)
+	
+	def partition(self, names, low=0.05, high=0.95, u=None, numeric=True):
+		""" Fits a partition of terms: a downward gradient, triangles, then an upward gradient, peaking at equally spaced percentiles from low to high. Neighbouring terms cross at 0.5, and the memberships of every value sum to 1.0.
+		@param	names	the names of the terms, from the smallest values to the largest (at least two)
+		@param	low	the percentile where the first term stops being 1.0
+		@param	high	the percentile where the last term becomes 1.0
+		@param	u	the universe (see universe)
+		@param	numeric	if True, NumericXmu terms (no SymPy); otherwise SymPy-based Xmu terms
+		@return	a list of (name, term) pairs, as taken by LinguisticVariable """
+		names = list(names)
+		if len(names) < 2:
+			raise ValueError("A partition needs at least two terms")
+		peaks = self.quantiles(numpy.linspace(low, high, len(names)))
+		if numpy.any(numpy.diff(peaks) <= 0.0):
+			raise ValueError("The values seen have too little spread for %d terms" % len(names))
+		u = self.universe(u)
+		peaks = [float(p) for p in peaks]
+		payloads = [("DownwardGradientXmu", u, (peaks[0], peaks[1]))]
+		for i in range(1, len(names) - 1):
+			payloads.append(("TriangularXmu", u, (peaks[i - 1], peaks[i], peaks[i + 1])))
+		payloads.append(("UpwardGradientXmu", u, (peaks[-2], peaks[-1])))
+		return [(name, from_payload(payload, numeric)) for name, payload in zip(names, payloads)]
+
+##### Serialization ##########################
+# A compact format for the standard shapes and for piecewise-linear X-mu
+# functions (e.g. the results of set operations), built on their payloads
+# (see Xmu.to_payload). X-mu functions which are neither have no compact form.
+#
+# Binary record (little-endian, unpadded):
+#	uint8	kind: 0 UpwardGradientXmu, 1 DownwardGradientXmu, 2 TrapezoidalXmu,
+#		3 TriangularXmu, 4 linear
+#	float64 x2	the universe (inf, sup)
+#	shapes:	float64 x k	the parameters (k = 2, 2, 4 or 3)
+#	linear:	uint32	n, the number of segments
+#		float64 x (n+1)	the alpha breakpoints
+#		uint32 x n	the number of intervals in each segment
+#		float64 x 4m	the (lo_slope, lo_intercept, hi_slope, hi_intercept)
+#			of every interval, segment by segment (m intervals in all)
+#
+# JSON object: {"kind": name or "linear", "u": [inf, sup], and either
+# "parameters": [...] or "breakpoints": [...], "pieces": [[[4 floats], ...], ...]}.
+# Infinite values are written as the strings "inf" and "-inf".
+#
+# Store file (see XmuStore):
+#	header (32 bytes): "XMUSTORE", uint32 version (1), uint32 count,
+#		uint64 index offset, uint64 names offset
+#	records, one after another
+#	index: count x (uint64 record offset, uint32 record length,
+#		uint32 name offset, uint32 name length), names relative to the names offset
+#	names: UTF-8, one after another
+
+PAYLOAD_CODES = {
+	"UpwardGradientXmu": 0,
+	"DownwardGradientXmu": 1,
+	"TrapezoidalXmu": 2,
+	"TriangularXmu": 3,
+	"linear": 4,
+}
+PAYLOAD_NAMES = dict((code, name) for name, code in PAYLOAD_CODES.items())
+PAYLOAD_ARITY = {0: 2, 1: 2, 2: 4, 3: 3}
+
+STORE_MAGIC = b"XMUSTORE"
+STORE_VERSION = 1
+STORE_HEADER = struct.Struct("<8sIIQQ")
+STORE_INDEX = numpy.dtype([("offset", "<u8"), ("length", "<u4"), ("name_offset", "<u4"), ("name_length", "<u4")])
+
+def pack_payload(payload):
+	""" Encodes a payload in the binary format.
+	@param	payload	a shape or "linear" payload (see Xmu.to_payload)
+	@return	a byte string """
+	if payload[0] not in PAYLOAD_CODES:
+		raise ValueError("Only shapes and linear X-mu functions have a compact form, not: " + str(payload[0]))
+	code = PAYLOAD_CODES[payload[0]]
+	header = struct.pack("<Bdd", code, payload[1][0], payload[1][1])
+	if code in PAYLOAD_ARITY:
+		return header + struct.pack("<%dd" % PAYLOAD_ARITY[code], *payload[2])
+	breakpoints, pieces = payload[2], payload[3]
+	counts = [len(intervals) for intervals in pieces]
+	values = [value for intervals in pieces for interval in intervals for value in interval]
+	return header + struct.pack("<I", len(pieces)) + struct.pack("<%dd%dI%dd" % (len(breakpoints), len(counts), len(values)), *(list(breakpoints) + counts + values))
+
+def unpack_payload(data, offset=0):
+	""" Decodes a payload from the binary format.
+	@param	data	a byte string, or any buffer (such as an mmap)
+	@param	offset	the position of the record in data
+	@return	a payload """
+	code, inf, sup = struct.unpack_from("<Bdd", data, offset)
+	offset += 17
+	if code in PAYLOAD_ARITY:
+		return (PAYLOAD_NAMES[code], (inf, sup), struct.unpack_from("<%dd" % PAYLOAD_ARITY[code], data, offset))
+	if code != PAYLOAD_CODES["linear"]:
+		raise ValueError("Unknown record kind: " + str(code))
+	n = struct.unpack_from("<I", data, offset)[0]
+	offset += 4
+	breakpoints = numpy.frombuffer(data, "<f8", n + 1, offset).tolist()
+	offset += 8 * (n + 1)
+	counts = numpy.frombuffer(data, "<u4", n, offset).tolist()
+	offset += 4 * n
+	values = numpy.frombuffer(data, "<f8", 4 * sum(counts), offset).reshape(-1, 4).tolist()
+	pieces = []
+	start = 0
+	for count in counts:
+		pieces.append(tuple(tuple(interval) for interval in values[start:start + count]))
+		start += count
+	return ("linear", (inf, sup), breakpoints, pieces)
+
+def json_float(value):
+	""" @return	value as a float, or as the string "inf" or "-inf" """
+	value = float(value)
+	if numpy.isinf(value):
+		return "inf" if value > 0 else "-inf"
+	return value
+
+def payload_to_json(payload):
+	""" Converts a payload to its JSON object.
+	@param	payload	a shape or "linear" payload
+	@return	a dict, ready for json.dumps """
+	if payload[0] not in PAYLOAD_CODES:
+		raise ValueError("Only shapes and linear X-mu functions have a compact form, not: " + str(payload[0]))
+	result = {"kind": payload[0], "u": [json_float(payload[1][0]), json_float(payload[1][1])]}
+	if payload[0] == "linear":
+		result["breakpoints"] = [json_float(b) for b in payload[2]]
+		result["pieces"] = [[[json_float(v) for v in interval] for interval in intervals] for intervals in payload[3]]
+	else:
+		result["parameters"] = [json_float(p) for p in payload[2]]
+	return result
+
+def payload_from_json(obj):
+	""" Converts a JSON object back to a payload.
+	@param	obj	a dict from payload_to_json (or json.loads)
+	@return	a payload """
+	u = (float(obj["u"][0]), float(obj["u"][1]))
+	if obj["kind"] == "linear":
+		pieces = [tuple(tuple(float(v) for v in interval) for interval in intervals) for intervals in obj["pieces"]]
+		return ("linear", u, [float(b) for b in obj["breakpoints"]], pieces)
+	if obj["kind"] not in PAYLOAD_CODES:
+		raise ValueError("Unknown kind: " + str(obj["kind"]))
+	return (str(obj["kind"]), u, tuple(float(p) for p in obj["parameters"]))
+
+def from_payload(payload, numeric):
+	""" Builds an object from a payload. Primarily used as a private method.
+	@param	numeric	if True, a NumericXmu (no SymPy); otherwise the SymPy-based Xmu """
+	if numeric:
+		return numeric_from_payload(payload)
+	return symbolic().xmu_from_payload(payload)
+
+def dump_xmu(xmu, format="binary"):
+	""" Serializes a shape or piecewise-linear X-mu object (an Xmu or a NumericXmu).
+	@param	xmu	the object to serialize
+	@param	format	"binary" or "json"
+	@return	a byte string (binary) or a string (json) """
+	payload = xmu.to_payload()
+	if format == "json":
+		return json.dumps(payload_to_json(payload), sort_keys=True)
+	return pack_payload(payload)
+
+def load_xmu(data, numeric=False):
+	""" Deserializes an object written by dump_xmu. JSON is recognised by its leading brace.
+	@param	data	a byte string or a JSON string
+	@param	numeric	if True, return a NumericXmu without loading SymPy; otherwise the equivalent Xmu object
+	@return	a NumericXmu or Xmu instance """
+	if data[:1] in ("{", b"{"):
+		return from_payload(payload_from_json(json.loads(data)), numeric)
+	return from_payload(unpack_payload(data), numeric)
+
+class XmuStore(object):
+	""" XmuStore is a read-only file of many named X-mu objects in the binary format. Opening a store maps the file into memory and reads only its header; each set is decoded when it is first requested, so a store with thousands of sets opens instantly. Write a store with XmuStore.write.
+	Use a store as a context manager (or call close) to unmap the file; after that, every method except close raises ValueError. """
+	
+	def __init__(self, path, numeric=False):
+		""" Opens a store.
+		@param	path	the file name
+		@param	numeric	if True, sets are returned as NumericXmu objects without loading SymPy; otherwise as Xmu objects
+		@return	an instantiated XmuStore object """
+		self.numeric = numeric
+		self.data = None
+		self.index = None
+		self.positions = None
+		self.file = open(path, "rb")
+		try:
+			self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+		except Exception:
+			self.file.close()
+			raise
+		magic, version, count, index_offset, names_offset = STORE_HEADER.unpack_from(self.data, 0)
+		if magic != STORE_MAGIC or version != STORE_VERSION:
+			self.close()
+			raise ValueError("Not an X-mu store (or an unsupported version): " + str(path))
+		self.index = numpy.frombuffer(self.data, STORE_INDEX, count, index_offset)
+		self.names_offset = names_offset
+		self.positions = None
+	
+	@staticmethod
+	def write(path, items):
+		""" Writes a store.
+		@param	path	the file name
+		@param	items	a list of (name, object) pairs, or a dict; each object must have a compact form (see pack_payload)
+		@return	the number of sets written """
+		if isinstance(items, dict):
+			items = sorted(items.items())
+		records = []
+		names = []
+		for name, xmu in items:
+			records.append(pack_payload(xmu.to_payload()))
+			names.append(name if isinstance(name, bytes) else name.encode("utf-8"))
+		index = numpy.zeros(len(records), STORE_INDEX)
+		offset = STORE_HEADER.size
+		name_offset = 0
+		for i, (record, name) in enumerate(zip(records, names)):
+			index[i] = (offset, len(record), name_offset, len(name))
+			offset += len(record)
+			name_offset += len(name)
+		with open(path, "wb") as output:
+			output.write(STORE_HEADER.pack(STORE_MAGIC, STORE_VERSION, len(records), offset, offset + index.nbytes))
+			for record in records:
+				output.write(record)
+			output.write(index.tobytes())
+			output.write(b"".join(names))
+		return len(records)
+	
+	def __enter__(self):
+		return self
+	
+	def __exit__(self, kind, value, trace):
+		self.close()
+		return False
+	
+	def __len__(self):
+		self.check_open()
+		return len(self.index)
+	
+	def close(self):
+		""" Closes the store. Objects already loaded stay usable, as decoding copies everything out of the file. Closing twice does nothing. """
+		if self.data is None:
+			return
+		# self.index is a view on the mapped file: it must be gone before the file is unmapped
+		self.index = None
+		self.positions = None
+		data, self.data = self.data, None
+		data.close()
+		self.file.close()
+	
+	def check_open(self):
+		""" Raises ValueError if the store has been closed. Primarily used as a private method. """
+		if self.data is None:
+			raise ValueError("I/O operation on closed store")
+	
+	def name(self, position):
+		""" @return	the name of the set at a position """
+		self.check_open()
+		entry = self.index[position]
+		start = self.names_offset + int(entry["name_offset"])
+		return self.data[start:start + int(entry["name_length"])].decode("utf-8")
+	
+	def names(self):
+		""" @return	the list of names, in file order """
+		self.check_open()
+		if len(self) == 0:
+			return []
+		starts = self.index["name_offset"].tolist()
+		lengths = self.index["name_length"].tolist()
+		blob = self.data[self.names_offset:self.names_offset + starts[-1] + lengths[-1]]
+		return [blob[start:start + length].decode("utf-8") for start, length in zip(starts, lengths)]
+	
+	def position(self, name):
+		""" Finds a set by name. The name lookup table is built on first use.
+		@param	name	a set name
+		@return	its position in the store """
+		self.check_open()
+		if self.positions is None:
+			self.positions = dict((n, i) for i, n in enumerate(self.names()))
+		if isinstance(name, bytes):
+			name = name.decode("utf-8")
+		if name not in self.positions:
+			raise KeyError(name)
+		return self.positions[name]
+	
+	def __contains__(self, name):
+		try:
+			self.position(name)
+			return True
+		except KeyError:
+			return False
+	
+	def payload(self, key):
+		""" Decodes the payload of one set.
+		@param	key	a set name, or an integer position
+		@return	a payload """
+		self.check_open()
+		position = key if isinstance(key, (int, long, numpy.integer)) else self.position(key)
+		return unpack_payload(self.data, int(self.index[position]["offset"]))
+	
+	def __getitem__(self, key):
+		""" Loads one set.
+		@param	key	a set name, or an integer position
+		@return	a NumericXmu or Xmu instance (see __init__) """
+		return from_payload(self.payload(key), self.numeric)